@@ -3,6 +3,9 @@ ASGI config for jersey_store_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with an ASGI server, e.g. ``uvicorn jersey_store_backend.asgi:application``,
+to get the non-blocking ``api/async/`` read endpoints from ``store.async_views``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -44,11 +44,13 @@ INSTALLED_APPS = [
     'store', # Added for store app
     'corsheaders', # Added for CORS
     'django_extensions', # Added for Django Extensions
+    'django_filters', # Filter form templates for the browsable API
 ]
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +81,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'idempotency-key',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -136,22 +139,58 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'store.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'store.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'store.throttling.AnonThrottle',
+        'store.throttling.UserThrottle',
+        'store.throttling.ScopedThrottle'
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        'login': '10/min',
+        'checkout': '30/hour'
     }
 }
 
+# Caches. With REDIS_URL set, every worker shares the same cache, which the
+# rate limits, token cache and cart totals need in multi-worker deployments.
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'throttle',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'throttle',
+        },
+    }
+
+THROTTLE_CACHE = 'throttle'
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -200,3 +239,62 @@ LOGGING = {
         },
     },
 }
+
+# Per-size stock holds created when checkout starts
+STOCK_RESERVATION_MINUTES = 15
+
+# Seconds a priced cart summary stays cached; sale and price changes invalidate it earlier
+CART_SUMMARY_TTL = 60
+
+# Seconds a user's wishlist jersey IDs stay cached; wishlist writes invalidate them
+WISHLIST_IDS_TTL = 60 * 5
+
+# Per-user dashboard fragments: seconds they stay cached, and threads building missing ones
+DASHBOARD_FRAGMENT_TTL = 60 * 5
+DASHBOARD_WORKERS = 3
+
+# Columnar sales snapshot behind /api/admin/analytics/ (python manage.py build_analytics)
+ANALYTICS_DIR = BASE_DIR / 'analytics'
+ANALYTICS_REFRESH_SECONDS = 60 * 60
+
+# Static catalog export (python manage.py export_catalog) and jerseys per list page
+CATALOG_EXPORT_DIR = BASE_DIR / 'catalog_export'
+CATALOG_EXPORT_PAGE_SIZE = 48
+
+# Bulk imports (/api/admin/imports/, python manage.py import_jerseys): uploads
+# directory, image-processing threads and the longest side imported images keep
+IMPORT_UPLOAD_DIR = BASE_DIR / 'imports'
+IMPORT_WORKERS = 4
+IMPORT_IMAGE_MAX_SIZE = 1600
+
+# Change feed: seconds readers wait at a missing id for its transaction to
+# commit before treating it as rolled back, and days read changes are kept
+CHANGE_FEED_GAP_TIMEOUT = 300
+CHANGE_LOG_RETENTION_DAYS = 7
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+
+# Idempotency-Key records for checkout, returns and wishlist writes
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # seconds
+IDEMPOTENCY_WAIT_SECONDS = 10
+# An unfinished claim older than this is abandoned and a retry may take it over;
+# keep it well above IDEMPOTENCY_WAIT_SECONDS and the slowest guarded request
+IDEMPOTENCY_CLAIM_TIMEOUT = 60
+
+# Background task queue (python manage.py run_tasks)
+TASK_RETRY_BACKOFF = 5  # seconds, doubled on every attempt
+TASK_TIMEOUT = 300  # seconds without a heartbeat before a running task is considered abandoned
+TASK_HEARTBEAT_INTERVAL = 30  # seconds between heartbeats of a running task
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Token -> user cache used by CachedTokenAuthentication
+AUTH_TOKEN_CACHE_TTL = 300  # seconds in the shared cache
+AUTH_TOKEN_LRU_SIZE = 10000  # tokens kept in each process
+AUTH_TOKEN_LRU_TTL = 30  # seconds before a process re-checks the shared cache
+
+# Bounded pool that runs password hashing for login and signup
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_QUEUE = 16  # extra requests allowed to wait for a worker
+PASSWORD_HASHING_WAIT = 2  # seconds to wait for a slot before answering 503
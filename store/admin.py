@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Team, Player, Jersey, Customization, Sale, JerseyImage
+from .models import Team, Player, Jersey, Customization, Sale, SaleTarget, SaleTransition, JerseyImage, JerseyStock, ChangeCursor, ImportJob
+from .pricing import set_sale_targets
 
 admin.site.register(Team)
 admin.site.register(Player)
@@ -9,18 +10,53 @@ class JerseyImageInline(admin.TabularInline):
     extra = 1
     fields = ['image', 'is_primary', 'order']
 
+class JerseyStockInline(admin.TabularInline):
+    model = JerseyStock
+    extra = 0
+    fields = ['size', 'quantity', 'reserved']
+    readonly_fields = ['reserved']
+
 @admin.register(Jersey)
 class JerseyAdmin(admin.ModelAdmin):
     list_display = ['player', 'price', 'stock', 'is_low_stock']
     search_fields = ['player__name', 'player__team__name']
     list_filter = ['player__team__league']
-    inlines = [JerseyImageInline]
+    inlines = [JerseyImageInline, JerseyStockInline]
 
 admin.site.register(Customization)
 
+class SaleTargetInline(admin.TabularInline):
+    model = SaleTarget
+    extra = 0
+    raw_id_fields = ('player', 'team')
+
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
     list_display = ('sale_type', 'target_value', 'discount_type', 'discount_value', 'start_date', 'end_date', 'is_active')
     list_filter = ('sale_type', 'discount_type', 'is_active')
     search_fields = ('target_value',)
     ordering = ('-created_at',)
+    readonly_fields = ('target_value',)
+    inlines = [SaleTargetInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        sale = form.instance
+        # Refresh the target_value label from the edited targets
+        set_sale_targets(sale, [target.player_id or target.team_id or target.league for target in sale.targets.all()])
+
+@admin.register(SaleTransition)
+class SaleTransitionAdmin(admin.ModelAdmin):
+    list_display = ('boundary', 'kind', 'sale', 'jerseys_repriced', 'applied_at')
+    list_filter = ('kind',)
+    readonly_fields = ('sale', 'kind', 'boundary', 'jerseys_repriced', 'applied_at')
+
+@admin.register(ChangeCursor)
+class ChangeCursorAdmin(admin.ModelAdmin):
+    list_display = ('name', 'position', 'updated_at')
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'created_by', 'processed_rows', 'total_rows', 'jerseys_created', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('errors',)
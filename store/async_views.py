@@ -0,0 +1,149 @@
+"""Async versions of the hot read endpoints, served under ``api/async/``.
+
+They use Django's async ORM directly instead of DRF, so under an ASGI server
+(``uvicorn jersey_store_backend.asgi:application``) a slow query no longer
+pins a worker thread. They still work under WSGI, just without the benefit.
+The cache is synchronous, so token lookups and the REST framework's default
+throttles run through ``sync_to_async`` rather than on the event loop.
+"""
+import asyncio
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import Max, Min
+from django.http import HttpResponse, JsonResponse
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+
+from . import dashboard as dashboard_fragments
+from .authentication import cached_user, remember
+from .models import Jersey, JerseyPrice, Review
+from .renderers import dumps
+from .serializers import JerseySerializer, jersey_context
+
+
+async def authenticate(request):
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword != 'Token' or not key:
+        return None
+    key = key.strip()
+    user = await sync_to_async(cached_user)(key)
+    if user is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            return None
+        user = token.user
+        await sync_to_async(remember)(key, user)
+    return user if user.is_active else None
+
+
+def throttle_wait(request, view):
+    """Apply the default throttles as DRF would; seconds to wait if refused, else None."""
+    waits = [
+        throttle.wait() for throttle in (cls() for cls in api_settings.DEFAULT_THROTTLE_CLASSES)
+        if not throttle.allow_request(request, view)
+    ]
+    if not waits:
+        return None
+    return max((wait for wait in waits if wait is not None), default=0)
+
+
+def async_api(auth_required=True):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return JsonResponse({'error': 'Method not allowed'}, status=405)
+            request.user = await authenticate(request)
+            if auth_required and request.user is None:
+                return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            wait = await sync_to_async(throttle_wait)(request, view)
+            if wait is not None:
+                response = JsonResponse(
+                    {'detail': f'Request was throttled. Expected available in {math.ceil(wait)} seconds.'},
+                    status=429
+                )
+                response['Retry-After'] = str(math.ceil(wait))
+                return response
+            data = await view(request, *args, **kwargs)
+            if isinstance(data, HttpResponse):
+                return data
+            return HttpResponse(dumps(data), content_type='application/json')
+        return wrapper
+    return decorator
+
+
+def in_own_thread(func):
+    """Run a blocking ORM function on its own thread and connection.
+
+    Lets independent queries run concurrently instead of queueing on the
+    single thread-sensitive executor.
+    """
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connection.close()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+@async_api(auth_required=False)
+async def filter_metadata(request):
+    jerseys = Jersey.objects.all()
+    players, leagues, teams, prices = await asyncio.gather(
+        in_own_thread(lambda: list(jerseys.values_list('player__name', flat=True).distinct()))(),
+        in_own_thread(lambda: list(jerseys.values_list('player__team__league', flat=True).distinct()))(),
+        in_own_thread(lambda: list(jerseys.values_list('player__team__name', flat=True).distinct()))(),
+        JerseyPrice.objects.aaggregate(min=Min('effective_price'), max=Max('effective_price')),
+    )
+    return {
+        'players': players,
+        'leagues': leagues,
+        'teams': teams,
+        'price_range': prices,
+    }
+
+
+@async_api()
+async def wishlist(request):
+    # Newest first, as in the sync wishlist
+    jerseys = [
+        jersey async for jersey in
+        Jersey.objects.filter(wishlist_items__user_id=request.user.pk).select_related(
+            'player__team'
+        ).prefetch_related('images').order_by('-wishlist_items__created_at')
+    ]
+    return await sync_to_async(
+        lambda: JerseySerializer(jerseys, many=True, context=jersey_context(jerseys, request)).data
+    )()
+
+
+@async_api()
+async def reviews(request, jersey_id):
+    return [
+        {
+            'id': review['id'],
+            'user_name': review['user__username'],
+            'rating': review['rating'],
+            'comment': review['comment'],
+            'created_at': review['created_at'],
+            'jersey': review['jersey_id'],
+        }
+        async for review in Review.objects.filter(jersey_id=jersey_id).order_by('-created_at').values(
+            'id', 'user__username', 'rating', 'comment', 'created_at', 'jersey_id'
+        )
+    ]
+
+
+@async_api()
+async def dashboard(request):
+    if request.user.is_staff:
+        return JsonResponse({
+            'redirect': 'admin',
+            'message': 'Please use the admin dashboard endpoint'
+        }, status=303)
+
+    return await in_own_thread(dashboard_fragments.build)(request.user, request)
@@ -0,0 +1,158 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Model
+from django.db.models.base import ModelState
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class LRUCache:
+    """A small thread-safe LRU map whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Per-process hot set. Entries live for a short TTL so a token revoked in
+# another process stops working here soon after, even without a broadcast.
+hot_tokens = LRUCache(
+    maxsize=getattr(settings, 'AUTH_TOKEN_LRU_SIZE', 10000),
+    ttl=getattr(settings, 'AUTH_TOKEN_LRU_TTL', 30)
+)
+
+
+def shared_key(key):
+    # Never put raw tokens into cache keys
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class CachedUser(SimpleLazyObject):
+    """A user known from the token cache.
+
+    The id and the flags permission checks use are answered from the cache;
+    anything else loads the User row on first use. It passes for a saved User
+    without loading one, so ``Order(user=request.user)``, ``filter(user=...)``
+    and ``order.user == request.user`` only ever need the id.
+    """
+
+    def __init__(self, data):
+        self.__dict__['_cached'] = data
+        super().__init__(lambda: User.objects.get(pk=data['id']))
+
+    pk = id = property(lambda self: self._cached['id'])
+    is_active = property(lambda self: self._cached['is_active'])
+    is_staff = property(lambda self: self._cached['is_staff'])
+    is_authenticated = True
+    is_anonymous = False
+    # What foreign key assignment, lookups and Model.__eq__ inspect
+    __class__ = property(lambda self: User)
+    _meta = User._meta
+
+    @property
+    def _state(self):
+        state = ModelState()
+        state.adding, state.db = False, router.db_for_read(User)
+        return state
+
+    def _is_pk_set(self):
+        return True
+
+    def __getattr__(self, name):
+        # ORM probes such as hasattr(value, 'resolve_expression') must not
+        # load the row just to learn that a User has no such attribute
+        if self._wrapped is empty and not hasattr(User, name):
+            raise AttributeError(name)
+        return super().__getattr__(name)
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        if not isinstance(other, Model):
+            return NotImplemented
+        return other._meta.concrete_model is User and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+def cached_user(key):
+    """Return the user for a token from the local LRU or the shared cache, or None."""
+    data = hot_tokens.get(key)
+    if data is None:
+        data = cache.get(shared_key(key))
+        if data is None:
+            return None
+        hot_tokens.set(key, data)
+    return CachedUser(data)
+
+
+def remember(key, user):
+    # Only what authentication needs: no password hash or profile in the cache
+    data = {'id': user.pk, 'is_active': user.is_active, 'is_staff': user.is_staff}
+    cache.set(shared_key(key), data, getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300))
+    hot_tokens.set(key, data)
+
+
+def forget(key):
+    hot_tokens.pop(key)
+    cache.delete(shared_key(key))
+
+
+def forget_user(user_id):
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        forget(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the Token/User query for recently seen tokens."""
+
+    def authenticate_credentials(self, key):
+        user = cached_user(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            remember(key, user)
+            return (user, token)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        return (user, Token(key=key, user_id=user.pk))
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import changes, inventory, money, pricing
+from .constants import CURRENCY
+from .models import Cart, CartItem, Jersey, Order, OrderItem
+
+TYPES = [value for value, _ in CartItem._meta.get_field('type').choices]
+
+
+def get_cart(user):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    return cart
+
+
+def summary_cache_key(cart_id):
+    # The pricing version is part of the key, so any sale or price change
+    # invalidates every cached cart at once.
+    return f'cart:{cart_id}:summary:v{pricing.pricing_version()}'
+
+
+def invalidate(cart):
+    cache.delete(summary_cache_key(cart.id))
+    Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
+
+
+def price_cart(cart):
+    """Price every line of a cart in one batched pass.
+
+    Three queries regardless of cart size: the lines with their jerseys, the
+    active sales, and the per-size availability.
+    """
+    items = list(cart.items.select_related('jersey__player__team'))
+    jerseys = {item.jersey_id: item.jersey for item in items}
+    sale_prices = pricing.sale_prices(jerseys.values())
+    availability = inventory.available_by_size(list(jerseys))
+
+    lines = []
+    subtotal = 0
+    total = 0
+    for item in items:
+        jersey = item.jersey
+        sale_price = sale_prices.get(jersey.id)
+        unit_price = sale_price if sale_price is not None else jersey.price
+        unit_minor = money.to_minor(unit_price)
+        sizes = availability.get(jersey.id)
+        available = sizes.get(item.size, 0) if sizes is not None else None
+        subtotal += money.line_total(money.to_minor(jersey.price), item.quantity)
+        total += money.line_total(unit_minor, item.quantity)
+        lines.append({
+            'id': item.id,
+            'jersey_id': jersey.id,
+            'name': jersey.player.name,
+            'player_name': item.player_name,
+            'team_name': jersey.player.team.name,
+            'size': item.size,
+            'type': item.type,
+            'quantity': item.quantity,
+            'price': jersey.price,
+            'unit_price': unit_price,
+            'line_total': money.from_minor(money.line_total(unit_minor, item.quantity)),
+            'on_sale': sale_price is not None,
+            'available': available,
+            'in_stock': available is None or available >= item.quantity,
+        })
+
+    return {
+        'id': cart.id,
+        'items': lines,
+        'item_count': sum(line['quantity'] for line in lines),
+        'subtotal': money.from_minor(subtotal),
+        'discount': money.from_minor(subtotal - total),
+        'total': money.from_minor(total),
+        'currency': CURRENCY,
+    }
+
+
+def cart_summary(cart):
+    key = summary_cache_key(cart.id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = price_cart(cart)
+        cache.set(key, summary, getattr(settings, 'CART_SUMMARY_TTL', 60))
+    return summary
+
+
+def add_item(cart, jersey_id, size='M', quantity=1, type='regular', player_name=''):
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1")
+    inventory.check_size(size)
+    if type not in TYPES:
+        raise ValueError(f"Invalid type: {type}. Must be one of: {', '.join(TYPES)}")
+    if not Jersey.objects.filter(id=jersey_id).exists():
+        raise Jersey.DoesNotExist(f"Jersey with id {jersey_id} not found")
+    with transaction.atomic():
+        item, created = CartItem.objects.get_or_create(
+            cart=cart,
+            jersey_id=jersey_id,
+            size=size,
+            type=type,
+            player_name=player_name,
+            defaults={'quantity': quantity}
+        )
+        if not created:
+            CartItem.objects.filter(id=item.id).update(quantity=F('quantity') + quantity)
+    invalidate(cart)
+    return item
+
+
+def update_item(cart, item_id, quantity):
+    if quantity < 1:
+        raise ValueError("Quantity must be at least 1")
+    updated = CartItem.objects.filter(cart=cart, id=item_id).update(quantity=quantity)
+    if updated:
+        invalidate(cart)
+    return bool(updated)
+
+
+def remove_item(cart, item_id):
+    deleted, _ = CartItem.objects.filter(cart=cart, id=item_id).delete()
+    if deleted:
+        invalidate(cart)
+    return bool(deleted)
+
+
+def clear(cart):
+    cart.items.all().delete()
+    invalidate(cart)
+
+
+def checkout(user, cart):
+    """Turn a cart into an order. Must run inside a transaction.
+
+    The cart is repriced here rather than read from the summary cache, which
+    can predate a scheduled sale starting or ending.
+    """
+    summary = price_cart(cart)
+    if not summary['items']:
+        raise ValueError("Cart is empty")
+    held = inventory.held_by(user)
+    for line in summary['items']:
+        # The user's own checkout holds count towards what they can buy
+        available = line['available']
+        if available is not None and available + held.get((line['jersey_id'], line['size']), 0) < line['quantity']:
+            raise inventory.InsufficientStock(line['jersey_id'], line['size'], line['quantity'])
+
+    order = Order.objects.create(
+        user=user,
+        total_price=summary['total'],
+        status='processing'
+    )
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            jersey_id=line['jersey_id'],
+            quantity=line['quantity'],
+            price=line['unit_price'],
+            size=line['size'],
+            type=line['type'],
+            player_name=line['player_name']
+        )
+        for line in summary['items']
+    ])
+    changes.record(OrderItem, [item.id for item in items], 'create')
+    inventory.commit_order_items(user, order, summary['items'])
+    CartItem.objects.filter(id__in=[line['id'] for line in summary['items']]).delete()
+    transaction.on_commit(lambda: invalidate(cart))
+    return order
@@ -0,0 +1,44 @@
+"""Compact catalog representations for grid tiles and sparse field requests."""
+from . import money
+from .order_history import media_url, thumbnail_subquery
+from .serializers import JerseySerializer
+
+
+def jersey_fields(param):
+    """Parse ``?fields=a,b`` against JerseySerializer's fields.
+
+    Returns None when no fields were asked for; raises ValueError naming
+    any field that does not exist.
+    """
+    if not param:
+        return None
+    fields = [field.strip() for field in param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in JerseySerializer.Meta.fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(JerseySerializer.Meta.fields)}")
+    return fields
+
+
+def cards(queryset, request=None):
+    """One query: the columns a grid tile shows, as plain dicts.
+
+    Sale prices come from the JerseyPrice snapshots rather than resolving
+    sales per request, as in ``jersey_context``.
+    """
+    rows = queryset.select_related(None).prefetch_related(None).annotate(
+        thumbnail=thumbnail_subquery('id')
+    ).values_list(
+        'id', 'player__name', 'player__team__name', 'price',
+        'price_snapshot__effective_price', 'price_snapshot__sale_id', 'thumbnail'
+    )
+    return [
+        {
+            'id': jersey_id,
+            'name': name,
+            'team': team,
+            'price': money.as_float(price),
+            'sale_price': money.as_float(effective) if sale_id is not None else None,
+            'thumbnail': media_url(thumbnail, request),
+        }
+        for jersey_id, name, team, price, effective, sale_id, thumbnail in rows
+    ]
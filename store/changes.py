@@ -0,0 +1,148 @@
+"""Change feed over the catalog and order tables.
+
+Every insert, update and delete of a jersey, sale, order, order item, review
+or return appends a ``ChangeLog`` row in the writer's transaction: model
+signals cover ordinary saves and deletes, and code that writes with
+``update()`` or ``bulk_create()`` calls ``record()`` itself. Readers page
+through the log by id, either over ``GET /api/admin/changes/?since=`` or as
+a registered consumer whose position is kept in ``ChangeCursor``::
+
+    @changes.consumer('search-index', models=['jersey'])
+    def reindex(batch):
+        index(changes.object_ids(batch, 'jersey'))
+
+``python manage.py consume_changes --loop`` runs the consumers.
+
+Ids are handed out when rows are written but become visible only when their
+transaction commits, so a missing id may belong to a writer that is still
+open. Readers never move past such a gap: they stop before it until it fills,
+or until it is ``CHANGE_FEED_GAP_TIMEOUT`` seconds old, by which time its
+transaction is taken to have rolled back.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ChangeCursor, ChangeLog
+
+TRACKED = ('jersey', 'sale', 'order', 'orderitem', 'review', 'return')
+DEFAULT_BATCH_SIZE = 500
+MAX_PAGE_SIZE = 1000
+# Ids examined per read when looking for the committed frontier
+SCAN_SIZE = 10000
+
+_consumers = {}
+
+
+def record(model, ids, action='update'):
+    """Log a change to many rows of ``model`` (a model class or its model_name)."""
+    if not isinstance(model, str):
+        model = model._meta.model_name
+    now = timezone.now()
+    ChangeLog.objects.bulk_create([
+        ChangeLog(model=model, object_id=object_id, action=action, changed_at=now)
+        for object_id in ids
+    ])
+
+
+def frontier(since=0, known=0):
+    """The highest id up to which every change after ``since`` is readable.
+
+    A gap is passed only once the row after it was written more than
+    ``CHANGE_FEED_GAP_TIMEOUT`` seconds ago: the gap's id was handed out
+    before that row's, so its writer has been open at least that long.
+    ``known`` is a frontier found earlier; the scan starts from it.
+    """
+    timeout = timedelta(seconds=getattr(settings, 'CHANGE_FEED_GAP_TIMEOUT', 300))
+    expired = timezone.now() - timeout
+    position = max(since, known)
+    rows = ChangeLog.objects.filter(id__gt=since).order_by('id').values_list('id', 'changed_at')[:SCAN_SIZE]
+    for row_id, changed_at in rows:
+        if row_id != position + 1 and changed_at > expired:
+            break
+        position = row_id
+    return position
+
+
+def fetch(since=0, models=None, limit=DEFAULT_BATCH_SIZE, end=None):
+    """Committed changes after ``since``, oldest first, stopping at the first open gap.
+
+    ``end`` is the frontier to read up to, when the caller already has it.
+    Returns (rows, position): ``position`` is where the next read should
+    start, past any rows of other models that were skipped.
+    """
+    if models is not None:
+        unknown = set(models) - set(TRACKED)
+        if unknown:
+            raise ValueError('Unknown models: ' + ', '.join(sorted(unknown)) + '. Tracked: ' + ', '.join(TRACKED))
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if end is None:
+        end = frontier(since)
+    rows = ChangeLog.objects.filter(id__gt=since, id__lte=end)
+    if models is not None:
+        rows = rows.filter(model__in=models)
+    rows = list(rows.order_by('id').values('id', 'model', 'object_id', 'action', 'changed_at')[:limit])
+    if len(rows) == limit:
+        return rows, rows[-1]['id']
+    # Nothing more for these models up to the frontier: skip ahead to it
+    return rows, end
+
+
+def object_ids(batch, model, actions=None):
+    """Distinct ids of ``model`` rows in a batch, optionally only for some actions."""
+    return sorted({
+        row['object_id'] for row in batch
+        if row['model'] == model and (actions is None or row['action'] in actions)
+    })
+
+
+def consumer(name, models=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Register ``func(batch)`` to receive every change to ``models`` in order."""
+    def decorator(func):
+        _consumers[name] = (func, models, batch_size)
+        return func
+    return decorator
+
+
+def consume(name, max_batches=None):
+    """Feed pending changes to one consumer; returns how many it processed.
+
+    The cursor moves only after a batch is handled, in the same transaction,
+    so a failing consumer sees the same batch again on the next run.
+    """
+    func, models, batch_size = _consumers[name]
+    processed = batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            cursor, _ = ChangeCursor.objects.select_for_update().get_or_create(name=name)
+            end = frontier(cursor.position, cursor.frontier)
+            rows, position = fetch(cursor.position, models, batch_size, end=end)
+            if rows:
+                func(rows)
+            if (position, end) != (cursor.position, cursor.frontier):
+                cursor.position, cursor.frontier = position, end
+                cursor.save(update_fields=['position', 'frontier', 'updated_at'])
+        processed += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return processed
+
+
+def registered():
+    return list(_consumers)
+
+
+def prune():
+    """Drop log rows every consumer has read and that are past retention."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'CHANGE_LOG_RETENTION_DAYS', 7))
+    rows = ChangeLog.objects.filter(changed_at__lt=cutoff)
+    positions = ChangeCursor.objects.filter(name__in=list(_consumers)).values_list('position', flat=True)
+    if _consumers:
+        if len(positions) < len(_consumers):
+            return 0
+        rows = rows.filter(id__lte=min(positions))
+    deleted, _ = rows.delete()
+    return deleted
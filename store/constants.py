@@ -1,4 +1,14 @@
 CURRENCY = {
     'symbol': '₹',
     'code': 'INR'
-} 
\ No newline at end of file
+}
+
+SIZE_CHOICES = [
+    ('XS', 'Extra Small'),
+    ('S', 'Small'),
+    ('M', 'Medium'),
+    ('L', 'Large'),
+    ('XL', 'Extra Large'),
+    ('XXL', 'Double Extra Large'),
+    ('XXXL', 'Triple Extra Large')
+]
@@ -0,0 +1,101 @@
+"""The personal dashboard, assembled from independently cached fragments.
+
+Each fragment is cached per user and dropped by its own trigger: order
+writes clear recent orders (and the purchase flags shown on jerseys),
+wishlist writes clear the wishlist and recommendations, and the pricing
+version in the jersey fragment keys retires them on any sale or price change.
+Missing fragments are built concurrently on a small thread pool, so a cold
+dashboard costs the slowest fragment rather than the sum of all three.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import pricing
+from .models import Jersey, Order, Wishlist
+from .serializers import JerseySerializer, OrderSerializer, jersey_context
+
+RECENT_ORDERS = 5
+RECOMMENDATIONS = 5
+JERSEY_FRAGMENTS = ('wishlist', 'recommendations')
+
+_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DASHBOARD_WORKERS', 3),
+    thread_name_prefix='dashboard'
+)
+
+
+def recent_orders(user, request):
+    orders = Order.objects.filter(user=user).select_related('user').prefetch_related(
+        'items'
+    ).order_by('-created_at', '-id')[:RECENT_ORDERS]
+    return OrderSerializer(orders, many=True).data
+
+
+def wishlist(user, request):
+    jerseys = list(Jersey.objects.filter(wishlist_items__user=user).select_related(
+        'player__team'
+    ).prefetch_related('images').order_by('-wishlist_items__created_at'))
+    return JerseySerializer(jerseys, many=True, context=jersey_context(jerseys, request)).data
+
+
+def recommendations(user, request):
+    """Jerseys from teams the user has wishlisted, topped up from the catalog."""
+    wished = Wishlist.objects.filter(user=user).values('jersey_id')
+    candidates = Jersey.objects.exclude(id__in=wished).select_related('player__team').prefetch_related('images')
+    jerseys = list(candidates.filter(
+        player__team_id__in=Jersey.objects.filter(id__in=wished).values('player__team_id')
+    )[:RECOMMENDATIONS])
+    if len(jerseys) < RECOMMENDATIONS:
+        jerseys += candidates.exclude(id__in=[jersey.id for jersey in jerseys])[:RECOMMENDATIONS - len(jerseys)]
+    return JerseySerializer(jerseys, many=True, context=jersey_context(jerseys, request)).data
+
+
+FRAGMENTS = {
+    'recent_orders': recent_orders,
+    'wishlist': wishlist,
+    'recommendations': recommendations,
+}
+
+
+def fragment_keys(user_id, names=FRAGMENTS):
+    version = pricing.pricing_version()
+    return {
+        name: f'dashboard:{user_id}:{name}' + (f':v{version}' if name in JERSEY_FRAGMENTS else '')
+        for name in names
+    }
+
+
+def invalidate(user_id, *names):
+    keys = list(fragment_keys(user_id, names or FRAGMENTS).values())
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _build(name, user, request):
+    try:
+        return FRAGMENTS[name](user, request)
+    finally:
+        connection.close()
+
+
+def build(user, request=None):
+    """Return {fragment: data}, computing only the fragments not in the cache."""
+    keys = fragment_keys(user.id)
+    cached = cache.get_many(keys.values())
+    data = {name: cached[key] for name, key in keys.items() if key in cached}
+    missing = [name for name in FRAGMENTS if name not in data]
+
+    if len(missing) == 1:
+        data[missing[0]] = FRAGMENTS[missing[0]](user, request)
+    elif missing:
+        futures = {name: _pool.submit(_build, name, user, request) for name in missing}
+        data.update((name, future.result()) for name, future in futures.items())
+
+    if missing:
+        cache.set_many(
+            {keys[name]: data[name] for name in missing},
+            getattr(settings, 'DASHBOARD_FRAGMENT_TTL', 300)
+        )
+    return {name: data[name] for name in FRAGMENTS}
@@ -0,0 +1,263 @@
+"""Static, content-hashed JSON export of the public catalog.
+
+``python manage.py export_catalog`` writes, under ``CATALOG_EXPORT_DIR``:
+
+- ``list/<facet>/<page>.<hash>.json``: card-view pages for every facet (all
+  jerseys, in stock, each league and each team), in catalog order
+- ``jerseys/<id>.<hash>.json``: the public detail of each jersey
+- ``metadata.<hash>.json``: filter metadata with jersey counts per facet
+- ``manifest.json``: the unhashed entry point mapping each logical path
+  (``list/all/1.json``, ``jerseys/7.json``) to its current hashed file
+
+Hashed files never change, so a CDN can cache them forever and only
+``manifest.json`` needs a short TTL. Anything missing from the manifest is
+left to the API. After the first export, runs read the change feed and
+re-render only the detail pages of changed jerseys and the list pages of the
+facets they left or joined; pages whose bytes come out the same keep their
+file. Rendering is split across a thread pool.
+"""
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import catalog, changes, price_schedule
+from .models import Jersey, JerseyPrice, Review
+from .renderers import dumps
+from .serializers import JerseySerializer, jersey_context
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+STATE = '.export-state.json'
+DETAIL_CHUNK = 200
+# Detail pages are shared by every visitor, so per-user fields are left out
+DETAIL_FIELDS = [field for field in JerseySerializer.Meta.fields if field != 'user_has_purchased']
+
+
+def export_dir():
+    return Path(getattr(settings, 'CATALOG_EXPORT_DIR', Path(settings.BASE_DIR) / 'catalog_export'))
+
+
+def page_size():
+    return getattr(settings, 'CATALOG_EXPORT_PAGE_SIZE', 48)
+
+
+def facets_of(jersey):
+    """Facet keys a jersey is listed under, from (id, league, team, stock)."""
+    _, league, team, stock = jersey
+    keys = ['all', f'league/{slugify(league)}', f'team/{slugify(team)}']
+    if stock > 0:
+        keys.append('in_stock')
+    return keys
+
+
+def facet_queryset(key):
+    jerseys = Jersey.objects.order_by('id')
+    if key == 'all':
+        return jerseys
+    if key == 'in_stock':
+        return jerseys.filter(stock__gt=0)
+    kind, slug = key.split('/', 1)
+    field = 'player__team__league' if kind == 'league' else 'player__team__name'
+    names = [name for name in jerseys.values_list(field, flat=True).distinct() if slugify(name) == slug]
+    return jerseys.filter(**{f'{field}__in': names})
+
+
+def _write(root, logical, data):
+    """Write ``data`` under its content hash (if not already there); returns the hashed path."""
+    body = dumps(data)
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    stem, suffix = os.path.splitext(logical)
+    hashed = f'{stem}.{digest}{suffix}'
+    path = root / hashed
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(path.name + '.tmp')
+        temp.write_bytes(body)
+        os.replace(temp, path)
+    return hashed
+
+
+def render_facet(root, key):
+    """Every page of one facet; returns ({logical: hashed}, page count)."""
+    try:
+        cards = catalog.cards(facet_queryset(key))
+        size = page_size()
+        pages = max(1, -(-len(cards) // size))
+        files = {}
+        for number in range(1, pages + 1):
+            files[f'list/{key}/{number}.json'] = _write(root, f'list/{key}/{number}.json', {
+                # Totals live in the manifest and metadata, so adding a jersey
+                # only rewrites the pages it lands on
+                'results': cards[(number - 1) * size:number * size],
+                'page': number,
+                'next': f'list/{key}/{number + 1}.json' if number < pages else None,
+            })
+        return files, pages
+    finally:
+        connection.close()
+
+
+def render_details(root, jersey_ids):
+    try:
+        jerseys = list(Jersey.objects.filter(id__in=jersey_ids).select_related(
+            'player__team'
+        ).prefetch_related('images'))
+        context = jersey_context(jerseys, fields=DETAIL_FIELDS)
+        return {
+            f'jerseys/{jersey.id}.json': _write(
+                root, f'jerseys/{jersey.id}.json', JerseySerializer(jersey, context=context).data
+            )
+            for jersey in jerseys
+        }
+    finally:
+        connection.close()
+
+
+def render_metadata(root, counts):
+    prices = JerseyPrice.objects.values_list('effective_price', flat=True)
+    return _write(root, 'metadata.json', {
+        'leagues': sorted(Jersey.objects.values_list('player__team__league', flat=True).distinct()),
+        'teams': sorted(Jersey.objects.values_list('player__team__name', flat=True).distinct()),
+        'price_range': {
+            'min': prices.order_by('effective_price').first(),
+            'max': prices.order_by('-effective_price').first(),
+        },
+        'facets': counts,
+    })
+
+
+def _load(root, name):
+    try:
+        with open(root / name) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save(root, name, data):
+    temp = root / f'{name}.tmp'
+    temp.write_text(json.dumps(data))
+    os.replace(temp, root / name)
+
+
+def pending_changes(since, known=0):
+    """Jersey ids changed after ``since``, the feed position after them and the frontier."""
+    jersey_ids, review_ids = set(), set()
+    position = since
+    end = changes.frontier(since, known)
+    while True:
+        rows, position = changes.fetch(
+            position, models=['jersey', 'review'], limit=changes.MAX_PAGE_SIZE, end=end
+        )
+        jersey_ids.update(changes.object_ids(rows, 'jersey'))
+        review_ids.update(changes.object_ids(rows, 'review'))
+        if len(rows) < changes.MAX_PAGE_SIZE:
+            break
+    # A review changes its jersey's rating; deleting one also logs its jersey
+    jersey_ids.update(Review.objects.filter(id__in=review_ids).values_list('jersey_id', flat=True))
+    return jersey_ids, position, end
+
+
+def export(full=False, workers=4):
+    """Render the catalog; returns counts of what was rendered and written."""
+    # Apply any sale boundary the schedule loop has not reached yet
+    price_schedule.run()
+    root = export_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = _load(root, MANIFEST)
+    state = _load(root, STATE)
+    full = full or manifest is None or state is None
+
+    if full:
+        since = known = 0
+        files = {}
+        facet_pages = {}
+    else:
+        since, known = state['position'], state.get('frontier', 0)
+        files = dict(manifest['files'])
+        facet_pages = dict(manifest['facets'])
+    previous_files = set(manifest['files'].values()) if manifest else set()
+    jersey_facets = {} if full else {int(key): value for key, value in state['jersey_facets'].items()}
+
+    # Rendering reads the catalog as it is now, so changes logged before this
+    # point are covered; anything later is picked up by the next run
+    changed, position, end = pending_changes(since, known)
+    if full:
+        changed = set(Jersey.objects.values_list('id', flat=True))
+    elif not changed:
+        return {'jerseys': 0, 'facets': 0, 'files_written': 0}
+
+    current = {
+        row[0]: facets_of(row)
+        for row in Jersey.objects.filter(id__in=changed).values_list(
+            'id', 'player__team__league', 'player__team__name', 'stock'
+        ).iterator(chunk_size=2000)
+    }
+    affected = {key for jersey_id in changed for key in jersey_facets.get(jersey_id, [])}
+    affected |= {key for keys in current.values() for key in keys}
+    deleted = changed - set(current)
+
+    for jersey_id in deleted:
+        files.pop(f'jerseys/{jersey_id}.json', None)
+        jersey_facets.pop(jersey_id, None)
+    jersey_facets.update(current)
+
+    ids = sorted(current)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        detail_jobs = [
+            pool.submit(render_details, root, ids[start:start + DETAIL_CHUNK])
+            for start in range(0, len(ids), DETAIL_CHUNK)
+        ]
+        facet_jobs = {key: pool.submit(render_facet, root, key) for key in sorted(affected)}
+        for job in detail_jobs:
+            files.update(job.result())
+        for key, job in facet_jobs.items():
+            pages, count = job.result()
+            # Drop pages past the end when a facet shrank
+            for number in range(count + 1, facet_pages.get(key, 0) + 1):
+                files.pop(f'list/{key}/{number}.json', None)
+            files.update(pages)
+            facet_pages[key] = count
+
+    live = {key for keys in jersey_facets.values() for key in keys}
+    for key in set(facet_pages) - live:
+        for number in range(1, facet_pages.pop(key) + 1):
+            files.pop(f'list/{key}/{number}.json', None)
+    counts = Counter(key for keys in jersey_facets.values() for key in keys)
+    files['metadata.json'] = render_metadata(root, dict(sorted(counts.items())))
+
+    written = set(files.values()) - previous_files
+    _save(root, MANIFEST, {'generated_at': timezone.now().isoformat(), 'files': files, 'facets': facet_pages})
+    _save(root, STATE, {'position': position, 'frontier': end, 'jersey_facets': jersey_facets})
+    removed = _collect_garbage(root, set(files.values()) | previous_files)
+    logger.info(
+        f"Exported {len(ids)} jerseys and {len(affected)} facets; "
+        f"{len(written)} files written, {removed} removed"
+    )
+    return {'jerseys': len(ids), 'facets': len(affected), 'files_written': len(written)}
+
+
+def _collect_garbage(root, keep):
+    """Delete hashed files referenced by neither this manifest nor the last one.
+
+    Files of the previous manifest stay for one more run, so clients that
+    fetched it just before the swap can still load its pages.
+    """
+    removed = 0
+    for path in root.rglob('*.json'):
+        relative = path.relative_to(root).as_posix()
+        if relative in (MANIFEST, STATE) or relative in keep:
+            continue
+        path.unlink()
+        removed += 1
+    return removed
@@ -0,0 +1,54 @@
+"""Catalog filters, each a predicate on an indexed column."""
+import django_filters
+from django.db.models import Exists, F, OuterRef, Q
+
+from .constants import SIZE_CHOICES
+from .models import Jersey, JerseyStock
+
+ORDERINGS = {
+    'price': ('price_snapshot__effective_price', 'id'),
+    '-price': ('-price_snapshot__effective_price', '-id'),
+    'rating': (F('rating_summary__average_rating').desc(nulls_last=True), '-id'),
+    'newest': ('-created_at', '-id'),
+}
+
+
+class JerseyFilter(django_filters.FilterSet):
+    # Prices are effective prices (after sales) from the JerseyPrice snapshots
+    min_price = django_filters.NumberFilter(field_name='price_snapshot__effective_price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price_snapshot__effective_price', lookup_expr='lte')
+    in_stock = django_filters.BooleanFilter(method='filter_in_stock')
+    size = django_filters.CharFilter(method='filter_size')
+    ordering = django_filters.ChoiceFilter(
+        choices=[(value, value) for value in ORDERINGS],
+        method='filter_ordering'
+    )
+
+    class Meta:
+        model = Jersey
+        fields = {
+            'player__team__league': ['exact'],
+            'player__team__name': ['exact'],
+        }
+
+    def filter_in_stock(self, queryset, name, value):
+        return queryset.filter(stock__gt=0) if value else queryset
+
+    def filter_size(self, queryset, name, value):
+        """?size=M or ?size=M,L: jerseys with any of the sizes available.
+
+        Jerseys without per-size stock rows sell every size from their total.
+        """
+        sizes = [size.strip().upper() for size in value.split(',') if size.strip()]
+        valid = dict(SIZE_CHOICES)
+        sizes = [size for size in sizes if size in valid]
+        if not sizes:
+            return queryset.none()
+        size_stock = JerseyStock.objects.filter(jersey=OuterRef('pk'))
+        return queryset.filter(
+            Exists(size_stock.filter(size__in=sizes, quantity__gt=F('reserved'))) |
+            (~Exists(size_stock) & Q(stock__gt=0))
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
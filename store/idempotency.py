@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def _digest(*parts):
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _encode(data):
+    # Store exactly what the JSON renderer would have sent
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def _claim(key_hash, request_hash):
+    """Insert an in-progress record. Returns None if another request owns the key.
+
+    A claim left unfinished for IDEMPOTENCY_CLAIM_TIMEOUT seconds belongs to a
+    request that died without releasing it, so it is taken over.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'IDEMPOTENCY_CLAIM_TIMEOUT', 60))
+    IdempotencyKey.objects.filter(key_hash=key_hash).filter(
+        Q(expires_at__lt=now) | Q(completed=False, created_at__lt=stale)
+    ).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                key_hash=key_hash,
+                request_hash=request_hash,
+                expires_at=now + timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+            )
+    except IntegrityError:
+        return None
+
+
+def _replay(record):
+    return Response(record.response_body, status=record.status_code, headers={REPLAY_HEADER: 'true'})
+
+
+def purge_expired(now=None):
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lt=now or timezone.now()).delete()
+    return deleted
+
+
+def idempotent(scope):
+    """Make an APIView method safe to retry with an ``Idempotency-Key`` header.
+
+    The first request with a key runs the view and stores its response; later
+    requests with the same key get the stored response back. A duplicate that
+    arrives while the first is still running waits for it instead of racing.
+    Only final answers are stored: 5xx responses and exceptions release the
+    key, so views must report unexpected failures as 500, not 400.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or not request.user.is_authenticated:
+                return func(view, request, *args, **kwargs)
+            if len(key) > 255:
+                return Response(
+                    {'error': f'{HEADER} must be at most 255 characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            key_hash = _digest(request.user.pk, scope, request.path, key)
+            request_hash = _digest(json.dumps(_encode(request.data), sort_keys=True))
+            deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+
+            while True:
+                record = _claim(key_hash, request_hash)
+                if record is not None:
+                    break
+                existing = IdempotencyKey.objects.filter(key_hash=key_hash).first()
+                if existing is None:
+                    # The first request failed and released the key; try again
+                    continue
+                if existing.request_hash != request_hash:
+                    return Response(
+                        {'error': f'{HEADER} was already used with a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if existing.completed:
+                    return _replay(existing)
+                if time.monotonic() >= deadline:
+                    return Response(
+                        {'error': 'A request with this key is still being processed'},
+                        status=status.HTTP_409_CONFLICT,
+                        headers={'Retry-After': '1'}
+                    )
+                time.sleep(0.05)
+
+            try:
+                response = func(view, request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if response.status_code >= 500:
+                # Server errors are not final; let the client retry for real
+                record.delete()
+            else:
+                IdempotencyKey.objects.filter(id=record.id).update(
+                    status_code=response.status_code,
+                    response_body=_encode(response.data),
+                    completed=True
+                )
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,301 @@
+"""Bulk import of jerseys, their players and teams, stock and images.
+
+A manifest is CSV or JSON Lines, one jersey per row::
+
+    player,team,league,price,stock,sizes,images
+    Bukayo Saka,Arsenal,Premier League,89.99,,M:10;L:4,saka-front.jpg;saka-back.jpg
+
+``sizes`` (per-size stock) takes precedence over ``stock``; the first image
+becomes the primary one. Images are read from a directory or a zip archive,
+verified and downscaled by a thread pool, and saved through the default
+storage. Teams and players are matched by name (and league/team) or created
+in bulk, and jerseys, stock rows and images are inserted ``BATCH_SIZE`` rows
+at a time, so no per-row saves or signals run. ``ImportJob`` records
+progress after every batch, and bad rows are reported there rather than
+failing the import.
+"""
+import csv
+import io
+import json
+import logging
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+
+from . import changes, price_schedule
+from .constants import SIZE_CHOICES
+from .models import ImportJob, Jersey, JerseyImage, JerseyStock, Player, Team
+from .pricing import bump_pricing_version
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_ERRORS = 1000
+REQUIRED = ('player', 'team', 'league', 'price')
+PRICE_FIELD = Jersey._meta.get_field('price')
+MAX_PRICE = Decimal(10) ** (PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places)
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_manifest(path):
+    """Yield raw row dicts from a .csv or .jsonl manifest."""
+    path = Path(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.suffix.lower() == '.csv':
+            yield from csv.DictReader(f)
+            return
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield RowError(f'Invalid JSON: {e}')
+
+
+def _split(value):
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or '').split(';') if item.strip()]
+
+
+def parse_row(raw):
+    """Validate one manifest row into the values the importer needs."""
+    if isinstance(raw, RowError):
+        raise raw
+    missing = [field for field in REQUIRED if not str(raw.get(field) or '').strip()]
+    if missing:
+        raise RowError(f"Missing {', '.join(missing)}")
+    try:
+        price = Decimal(str(raw['price']).strip())
+    except InvalidOperation:
+        raise RowError(f"Invalid price: {raw['price']}")
+    if not price.is_finite() or not 0 <= price < MAX_PRICE or price != price.quantize(Decimal('0.01')):
+        raise RowError(f"Invalid price: {raw['price']}")
+
+    sizes = raw.get('sizes') or {}
+    if not isinstance(sizes, dict):
+        sizes = {size: quantity for size, _, quantity in (item.partition(':') for item in _split(sizes))}
+    valid_sizes = dict(SIZE_CHOICES)
+    try:
+        sizes = {str(size).strip().upper(): int(quantity) for size, quantity in sizes.items()}
+        stock = sum(sizes.values()) if sizes else int(raw.get('stock') or 0)
+    except (TypeError, ValueError):
+        raise RowError('Stock quantities must be whole numbers')
+    unknown = [size for size in sizes if size not in valid_sizes]
+    if unknown:
+        raise RowError(f"Unknown sizes: {', '.join(unknown)}")
+    if stock < 0 or any(quantity < 0 for quantity in sizes.values()):
+        raise RowError('Stock cannot be negative')
+
+    return {
+        'player': str(raw['player']).strip(),
+        'team': str(raw['team']).strip(),
+        'league': str(raw['league']).strip(),
+        'price': price,
+        'stock': stock,
+        'sizes': sizes,
+        'images': _split(raw.get('images')),
+    }
+
+
+class ImageSource:
+    """Image files from a directory or a zip archive, safe to read from many threads."""
+
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self.is_archive = bool(self.path) and zipfile.is_zipfile(self.path)
+        self._local = threading.local()
+
+    def read(self, name):
+        if self.path is None:
+            raise FileNotFoundError(name)
+        if self.is_archive:
+            # ZipFile objects must not be shared between threads
+            archive = getattr(self._local, 'archive', None)
+            if archive is None:
+                archive = self._local.archive = zipfile.ZipFile(self.path)
+            try:
+                return archive.read(name)
+            except KeyError:
+                raise FileNotFoundError(name)
+        root = self.path.resolve()
+        path = (root / name).resolve()
+        if root not in path.parents or not path.is_file():
+            raise FileNotFoundError(name)
+        return path.read_bytes()
+
+
+def process_image(source, name):
+    """Verify and downscale one image and store it; returns its storage name."""
+    data = source.read(name)
+    max_size = getattr(settings, 'IMPORT_IMAGE_MAX_SIZE', 1600)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            if max(image.size) > max_size:
+                format = image.format
+                image.thumbnail((max_size, max_size))
+                buffer = io.BytesIO()
+                image.save(buffer, format=format, **({'quality': 85} if format == 'JPEG' else {}))
+                data = buffer.getvalue()
+    except (UnidentifiedImageError, OSError) as e:
+        raise RowError(f'Unreadable image {name}: {e}')
+    return default_storage.save(f'jersey_images/{Path(name).name}', ContentFile(data))
+
+
+def _ensure_teams(rows):
+    """{(name, league): team id}, creating the teams that do not exist."""
+    wanted = {(row['team'], row['league']) for row in rows}
+
+    def existing():
+        return {
+            (name, league): team_id
+            for team_id, name, league in Team.objects.filter(
+                name__in={name for name, _ in wanted}
+            ).values_list('id', 'name', 'league')
+        }
+
+    teams = existing()
+    missing = wanted - set(teams)
+    if missing:
+        Team.objects.bulk_create([Team(name=name, league=league) for name, league in sorted(missing)], batch_size=BATCH_SIZE)
+        teams = existing()
+    return teams
+
+
+def _ensure_players(rows, teams):
+    """{(name, team id): player id}, creating the players that do not exist."""
+    wanted = {(row['player'], teams[row['team'], row['league']]) for row in rows}
+
+    def existing():
+        return {
+            (name, team_id): player_id
+            for player_id, name, team_id in Player.objects.filter(
+                team_id__in={team_id for _, team_id in wanted}
+            ).values_list('id', 'name', 'team_id')
+        }
+
+    players = existing()
+    missing = wanted - set(players)
+    if missing:
+        Player.objects.bulk_create(
+            [Player(name=name, team_id=team_id) for name, team_id in sorted(missing)],
+            batch_size=BATCH_SIZE
+        )
+        players = existing()
+    return players
+
+
+def _import_batch(batch, players, teams, source, pool):
+    """Insert one batch of parsed rows; returns (jerseys, images, errors)."""
+    errors = []
+    with transaction.atomic():
+        jerseys = Jersey.objects.bulk_create([
+            Jersey(
+                player_id=players[row['player'], teams[row['team'], row['league']]],
+                price=row['price'],
+                stock=row['stock']
+            )
+            for _, row in batch
+        ])
+        JerseyStock.objects.bulk_create([
+            JerseyStock(jersey=jersey, size=size, quantity=quantity)
+            for jersey, (_, row) in zip(jerseys, batch)
+            for size, quantity in row['sizes'].items()
+        ])
+        # bulk_create skips the Jersey signals: log and price the batch in the
+        # same transaction, so no committed jersey lacks either
+        ids = [jersey.id for jersey in jerseys]
+        changes.record(Jersey, ids, 'create')
+        price_schedule.refresh(ids)
+
+    futures = [
+        (number, jersey, order, pool.submit(process_image, source, name))
+        for jersey, (number, row) in zip(jerseys, batch)
+        for order, name in enumerate(row['images'])
+    ]
+    images = []
+    primary_set = set()
+    for number, jersey, order, future in futures:
+        try:
+            stored = future.result()
+        except (RowError, FileNotFoundError) as e:
+            errors.append({'row': number, 'error': str(e) if isinstance(e, RowError) else f'Image not found: {e}'})
+            continue
+        # The first image that made it in is the primary one; set here, so no
+        # per-image save has to clear the flag on the others
+        images.append(JerseyImage(
+            jersey=jersey, image=stored, order=order, is_primary=jersey.id not in primary_set
+        ))
+        primary_set.add(jersey.id)
+    JerseyImage.objects.bulk_create(images)
+    return len(jerseys), len(images), errors
+
+
+def run(job, batch_size=BATCH_SIZE, workers=None, progress=None):
+    """Run a queued ImportJob to completion, recording progress as it goes.
+
+    A job that is not queued (already running, or run before) is left alone,
+    so a retried task cannot import the same rows twice.
+    """
+    workers = workers or getattr(settings, 'IMPORT_WORKERS', 4)
+    started_at = timezone.now()
+    if not ImportJob.objects.filter(id=job.id, status='queued').update(status='running', started_at=started_at):
+        job.refresh_from_db()
+        logger.warning(f"Import #{job.id} is {job.status}, not queued; not running it again")
+        return job
+    job.status, job.started_at = 'running', started_at
+    errors = []
+
+    def report(**fields):
+        for field, value in fields.items():
+            setattr(job, field, value)
+        job.errors = errors[:MAX_ERRORS]
+        job.save(update_fields=[*fields, 'errors'])
+        if progress:
+            progress(job)
+
+    try:
+        parsed = []
+        for number, raw in enumerate(read_manifest(job.manifest), start=1):
+            try:
+                parsed.append((number, parse_row(raw)))
+            except RowError as e:
+                errors.append({'row': number, 'error': str(e)})
+        report(total_rows=len(parsed) + len(errors), processed_rows=len(errors))
+
+        rows = [row for _, row in parsed]
+        teams = _ensure_teams(rows)
+        players = _ensure_players(rows, teams)
+
+        source = ImageSource(job.images)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(parsed), batch_size):
+                created, images, batch_errors = _import_batch(
+                    parsed[start:start + batch_size], players, teams, source, pool
+                )
+                errors.extend(batch_errors)
+                report(
+                    processed_rows=job.processed_rows + created,
+                    jerseys_created=job.jerseys_created + created,
+                    images_created=job.images_created + images
+                )
+        bump_pricing_version()
+        report(status='done', finished_at=timezone.now())
+    except Exception as e:
+        logger.exception(f"Import #{job.id} failed")
+        errors.append({'row': None, 'error': str(e)})
+        report(status='failed', finished_at=timezone.now())
+    return job
@@ -0,0 +1,240 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from . import changes
+from .constants import SIZE_CHOICES
+from .models import Jersey, JerseyStock, StockReservation
+
+logger = logging.getLogger(__name__)
+
+SIZES = {size for size, _ in SIZE_CHOICES}
+
+
+class InsufficientStock(ValueError):
+    def __init__(self, jersey_id, size, requested):
+        self.jersey_id = jersey_id
+        self.size = size
+        self.requested = requested
+        super().__init__(f"Not enough stock for jersey {jersey_id} in size {size}")
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_MINUTES', 15))
+
+
+def check_size(size):
+    if size not in SIZES:
+        raise ValueError(f"Invalid size: {size}. Must be one of: {', '.join(size for size, _ in SIZE_CHOICES)}")
+    return size
+
+
+def merge_lines(items, check_sizes=True):
+    """Collapse cart/checkout items into {(jersey_id, size): quantity}."""
+    lines = defaultdict(int)
+    for item in items:
+        quantity = int(item.get('quantity', 1))
+        if quantity < 1:
+            raise ValueError("Quantity must be at least 1")
+        size = item.get('size', 'M')
+        lines[(int(item['jersey_id']), check_size(size) if check_sizes else size)] += quantity
+    return dict(lines)
+
+
+def available_by_size(jersey_ids):
+    """Return {jersey_id: {size: available}} for a page of jerseys in one query."""
+    availability = defaultdict(dict)
+    rows = JerseyStock.objects.filter(jersey_id__in=jersey_ids).annotate(
+        available=F('quantity') - F('reserved')
+    ).values_list('jersey_id', 'size', 'available')
+    for jersey_id, size, available in rows:
+        availability[jersey_id][size] = available
+    return dict(availability)
+
+
+def held_by(user):
+    """{(jersey_id, size): quantity} the user currently holds."""
+    held = defaultdict(int)
+    for jersey_id, size, quantity in StockReservation.objects.filter(user=user, status='held').values_list(
+        'jersey_id', 'size', 'quantity'
+    ):
+        held[(jersey_id, size)] += quantity
+    return dict(held)
+
+
+def _is_tracked(jersey_id):
+    # Jerseys without any per-size rows keep the old, untracked behaviour; on
+    # a tracked jersey a size without a row has no stock.
+    return JerseyStock.objects.filter(jersey_id=jersey_id).exists()
+
+
+def _hold(jersey_id, size, quantity):
+    updated = JerseyStock.objects.filter(
+        jersey_id=jersey_id,
+        size=size,
+        quantity__gte=F('reserved') + quantity
+    ).update(reserved=F('reserved') + quantity)
+    if not updated and _is_tracked(jersey_id):
+        raise InsufficientStock(jersey_id, size, quantity)
+    return bool(updated)
+
+
+def _take(jersey_id, size, quantity):
+    updated = JerseyStock.objects.filter(
+        jersey_id=jersey_id,
+        size=size,
+        quantity__gte=F('reserved') + quantity
+    ).update(quantity=F('quantity') - quantity)
+    if not updated and _is_tracked(jersey_id):
+        raise InsufficientStock(jersey_id, size, quantity)
+    return bool(updated)
+
+
+def sync_jersey_totals(jersey_ids):
+    """Recompute Jersey.stock as the sum of its per-size quantities."""
+    totals = JerseyStock.objects.filter(jersey=OuterRef('pk')).values('jersey').annotate(
+        total=Sum('quantity')
+    ).values('total')
+    tracked = set(JerseyStock.objects.filter(jersey_id__in=jersey_ids).values_list('jersey_id', flat=True))
+    Jersey.objects.filter(id__in=tracked).update(stock=Subquery(totals))
+    changes.record(Jersey, sorted(tracked))
+
+
+def set_size_stock(jersey, sizes):
+    """Upsert absolute per-size quantities for a jersey, e.g. {'M': 10, 'L': 4}."""
+    for size in sizes:
+        check_size(size)
+    with transaction.atomic():
+        for size, quantity in sizes.items():
+            stock, created = JerseyStock.objects.select_for_update().get_or_create(
+                jersey=jersey, size=size, defaults={'quantity': quantity}
+            )
+            if not created:
+                if quantity < stock.reserved:
+                    raise ValueError(
+                        f"Cannot set {size} stock below the {stock.reserved} units currently reserved"
+                    )
+                stock.quantity = quantity
+                stock.save(update_fields=['quantity', 'updated_at'])
+        sync_jersey_totals([jersey.id])
+
+
+def release_holds(user):
+    """Release every active hold for a user, e.g. when checkout is restarted."""
+    with transaction.atomic():
+        holds = list(StockReservation.objects.select_for_update().filter(user=user, status='held'))
+        _release(holds)
+    return len(holds)
+
+
+def reserve_items(user, items):
+    """Create time-limited holds for a checkout that is about to start."""
+    lines = merge_lines(items)
+    expires_at = timezone.now() + reservation_ttl()
+    with transaction.atomic():
+        release_holds(user)
+        reservations = [
+            StockReservation(
+                user=user,
+                jersey_id=jersey_id,
+                size=size,
+                quantity=quantity,
+                expires_at=expires_at
+            )
+            for (jersey_id, size), quantity in sorted(lines.items())
+            if _hold(jersey_id, size, quantity)
+        ]
+        return StockReservation.objects.bulk_create(reservations)
+
+
+def commit_order_items(user, order, items):
+    """Convert the user's holds into sold stock for an order.
+
+    Lines without a hold fall back to a direct conditional decrement, so a
+    checkout that skipped the reservation step still cannot oversell.
+    """
+    lines = merge_lines(items)
+    holds = defaultdict(list)
+    for hold in StockReservation.objects.filter(
+        user=user,
+        status='held',
+        jersey_id__in={jersey_id for jersey_id, _ in lines}
+    ).order_by('created_at'):
+        holds[(hold.jersey_id, hold.size)].append(hold)
+
+    touched = set()
+    for (jersey_id, size), quantity in sorted(lines.items()):
+        remaining = quantity
+        for hold in holds.get((jersey_id, size), []):
+            if remaining <= 0:
+                break
+            converted = StockReservation.objects.filter(id=hold.id, status='held').update(
+                status='converted', order=order
+            )
+            if not converted:
+                # Released by the sweeper in the meantime
+                continue
+            used = min(hold.quantity, remaining)
+            JerseyStock.objects.filter(jersey_id=jersey_id, size=size).update(
+                quantity=F('quantity') - used,
+                reserved=F('reserved') - hold.quantity
+            )
+            remaining -= used
+            touched.add(jersey_id)
+        if remaining > 0 and _take(jersey_id, size, remaining):
+            touched.add(jersey_id)
+
+    if touched:
+        sync_jersey_totals(touched)
+
+
+def restock_items(items):
+    """Put units back on the shelf, e.g. for an approved return."""
+    # Older orders may carry sizes that were never stocked; they have nothing to restock
+    lines = merge_lines(items, check_sizes=False)
+    touched = set()
+    for (jersey_id, size), quantity in sorted(lines.items()):
+        if JerseyStock.objects.filter(jersey_id=jersey_id, size=size).update(
+            quantity=F('quantity') + quantity
+        ):
+            touched.add(jersey_id)
+    if touched:
+        sync_jersey_totals(touched)
+
+
+def _release(holds):
+    released = defaultdict(int)
+    for hold in holds:
+        released[(hold.jersey_id, hold.size)] += hold.quantity
+    StockReservation.objects.filter(id__in=[hold.id for hold in holds], status='held').update(
+        status='released'
+    )
+    for (jersey_id, size), quantity in released.items():
+        JerseyStock.objects.filter(jersey_id=jersey_id, size=size).update(
+            reserved=F('reserved') - quantity
+        )
+
+
+def release_expired(now=None, batch_size=500):
+    """Release holds past their expiry. Returns the number of holds released."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            holds = list(
+                StockReservation.objects.select_for_update(skip_locked=True).filter(
+                    status='held',
+                    expires_at__lt=now
+                ).order_by('id')[:batch_size]
+            )
+            if not holds:
+                break
+            _release(holds)
+        total += len(holds)
+        logger.info(f"Released {len(holds)} expired stock reservations")
+    return total
@@ -0,0 +1,236 @@
+import asyncio
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from rest_framework.renderers import JSONRenderer
+from store import middleware, money, pricing
+from store.models import Jersey
+from store.renderers import FastJSONRenderer
+from store.serializers import JerseySerializer, jersey_context
+from store.throttling import SlidingWindowThrottle
+
+SCENARIOS = {}
+
+
+def scenario(name, description):
+    def decorator(func):
+        SCENARIOS[name] = (func, description)
+        return func
+    return decorator
+
+
+def summarize(timings, elapsed):
+    timings = sorted(timings) or [0]
+    return {
+        'requests': len(timings),
+        'rps': len(timings) / elapsed if elapsed else 0,
+        'p50_ms': statistics.median(timings) * 1000,
+        'p99_ms': timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000,
+    }
+
+
+def run_wsgi(path, requests, concurrency, headers):
+    def call(_):
+        client = Client(**headers)
+        started = time.perf_counter()
+        client.get(path)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(call, range(requests)))
+    return summarize(timings, time.perf_counter() - started)
+
+
+def run_asgi(path, requests, concurrency, headers):
+    async def main():
+        gate = asyncio.Semaphore(concurrency)
+        client = AsyncClient(**headers)
+
+        async def call():
+            async with gate:
+                started = time.perf_counter()
+                await client.get(path)
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        timings = await asyncio.gather(*(call() for _ in range(requests)))
+        return summarize(timings, time.perf_counter() - started)
+    return asyncio.run(main())
+
+
+@scenario('asgi', 'In-process: sync DRF read endpoints on a thread pool vs the async endpoints on one event loop')
+def sync_vs_async_views(command, options):
+    """Compare the sync and async views through Django's test clients.
+
+    No WSGI or ASGI server and no sockets are involved: this measures view
+    and ORM time under threads vs an event loop, not server throughput. For
+    that, run gunicorn and uvicorn and point an HTTP load tool at them.
+    """
+    endpoints = [('/api/metadata/', '/api/async/metadata/')]
+    if options['token']:
+        endpoints += [
+            ('/api/wishlist/', '/api/async/wishlist/'),
+            ('/api/dashboard/', '/api/async/dashboard/'),
+        ]
+    for sync_path, async_path in endpoints:
+        for label, runner, path in [('sync', run_wsgi, sync_path), ('async', run_asgi, async_path)]:
+            result = runner(path, options['requests'], options['concurrency'], command.client_headers(options))
+            command.report(f'{label:5} {path}', result)
+
+
+@scenario('login-storm', 'Catalog latency on its own and during a concurrent login storm')
+def login_storm(command, options):
+    if not (options['username'] and options['password']):
+        raise CommandError('login-storm needs --username and --password')
+    headers = command.client_headers(options)
+    catalog = '/api/jerseys/'
+    command.report(f'catalog alone {catalog}', run_wsgi(catalog, options['requests'], options['concurrency'], headers))
+
+    credentials = {'username': options['username'], 'password': options['password']}
+    storming = threading.Event()
+    storm_timings = []
+
+    def login_loop():
+        client = Client(**headers)
+        while not storming.is_set():
+            started = time.perf_counter()
+            client.post('/api/login/', credentials, content_type='application/json')
+            storm_timings.append(time.perf_counter() - started)
+
+    storm_started = time.perf_counter()
+    threads = [threading.Thread(target=login_loop) for _ in range(options['concurrency'])]
+    for thread in threads:
+        thread.start()
+    try:
+        result = run_wsgi(catalog, options['requests'], options['concurrency'], headers)
+    finally:
+        storming.set()
+        for thread in threads:
+            thread.join()
+    command.report(f'catalog during storm {catalog}', result)
+    command.report('logins during storm', summarize(storm_timings, time.perf_counter() - storm_started))
+
+
+@scenario('catalog-views', 'Catalog list: full serializer vs ?fields= vs ?view=card (payload size and latency)')
+def catalog_views(command, options):
+    headers = command.client_headers(options)
+    variants = [
+        ('full', '/api/jerseys/'),
+        ('fields', '/api/jerseys/?fields=id,price,sale_price,primary_image'),
+        ('card', '/api/jerseys/?view=card'),
+    ]
+    for label, path in variants:
+        size = len(Client(**headers).get(path).content)
+        command.stdout.write(f"{label:6} {path}: {size} bytes")
+        command.report(f'{label:6} {path}', run_wsgi(path, options['requests'], options['concurrency'], headers))
+
+
+@scenario('render', 'Encode time and wire size of a 500-jersey list: stdlib vs fast renderer, gzip vs brotli')
+def render_payload(command, options):
+    jerseys = list(Jersey.objects.select_related('player', 'player__team').prefetch_related('images')[:500])
+    if not jerseys:
+        raise CommandError('render needs some jerseys in the database')
+    data = JerseySerializer(jerseys, many=True, context=jersey_context(jerseys)).data
+    # Repeat rows so the payload is 500 jerseys however small the catalog is
+    data = (list(data) * (500 // len(data) + 1))[:500]
+    rounds = max(1, options['requests'] // 50)
+
+    for label, renderer in [('stdlib', JSONRenderer()), ('fast', FastJSONRenderer())]:
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            body = renderer.render(data)
+            timings.append(time.perf_counter() - started)
+        command.stdout.write(
+            f"{label:6} encode  p50 {statistics.median(timings) * 1000:8.2f} ms  {len(body)} bytes"
+        )
+
+    for encoding in ['gzip', 'br']:
+        if encoding == 'br' and middleware.brotli is None:
+            command.stdout.write('br     skipped (brotli is not installed)')
+            continue
+        started = time.perf_counter()
+        size = len(middleware.compress(body, encoding))
+        command.stdout.write(
+            f"{encoding:6} compress {(time.perf_counter() - started) * 1000:7.2f} ms  {size} bytes "
+            f"({size / len(body):.1%} of raw)"
+        )
+
+
+@scenario('money', 'Discount throughput: Decimal per price vs integer minor units, and sale resolution per batch')
+def money_math(command, options):
+    rng = random.Random(0)
+    prices = [Decimal(rng.randrange(50000, 1000000)).scaleb(-2) for _ in range(10000)]
+    percent = Decimal('17.50')
+    rounds = max(1, options['requests'] // 100)
+
+    def per_price_decimal():
+        return [max(Decimal('0'), price - (percent / 100) * price).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                for price in prices]
+
+    def minor_units():
+        return money.discount_many(money.to_minor_many(prices), 'PERCENTAGE', money.to_minor(percent))
+
+    minor = money.to_minor_many(prices)
+    variants = [
+        ('decimal', per_price_decimal),
+        ('minor incl. conversion', minor_units),
+        ('minor', lambda: money.discount_many(minor, 'PERCENTAGE', money.to_minor(percent))),
+    ]
+    if money.to_minor_many(per_price_decimal()) != minor_units():
+        raise CommandError('Decimal and minor-unit results differ')
+    for label, func in variants:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        per_price = (time.perf_counter() - started) / (rounds * len(prices))
+        command.stdout.write(f"{label:24} {1 / per_price:12,.0f} prices/s")
+
+    jerseys = list(Jersey.objects.select_related('player__team')[:500])
+    if jerseys:
+        sales = pricing.active_sales(jerseys=jerseys)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            pricing.resolve(jerseys, sales)
+        elapsed = (time.perf_counter() - started) / rounds
+        command.stdout.write(f"resolve {len(jerseys)} jerseys x {len(sales)} sales  {elapsed * 1000:8.2f} ms")
+
+
+class Command(BaseCommand):
+    help = 'Run an in-process API benchmark scenario against the configured database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--token', help='Auth token for endpoints that need a user')
+        parser.add_argument('--username', help='Existing user for login scenarios')
+        parser.add_argument('--password', help='Password of --username')
+
+    def client_headers(self, options):
+        headers = {'HTTP_HOST': 'localhost'}
+        if options['token']:
+            headers['HTTP_AUTHORIZATION'] = f"Token {options['token']}"
+        return headers
+
+    def report(self, label, result):
+        self.stdout.write(
+            f"{label:45} {result['requests']:6d} req  {result['rps']:9.1f} req/s  "
+            f"p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms"
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        # Benchmarks would otherwise trip the per-user and per-IP rate limits
+        SlidingWindowThrottle.allow_request = lambda self, request, view: True
+        func, description = SCENARIOS[options['scenario']]
+        self.stdout.write(self.style.MIGRATE_HEADING(description))
+        func(self, options)
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store import analytics
+
+class Command(BaseCommand):
+    help = 'Extract order lines into the columnar snapshot used by the admin analytics endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep rebuilding on an interval')
+        parser.add_argument(
+            '--interval', type=int, default=getattr(settings, 'ANALYTICS_REFRESH_SECONDS', 3600),
+            help='Seconds between rebuilds with --loop'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            manifest = analytics.build()
+            self.stdout.write(
+                f"Snapshot of {manifest['rows']} order lines built in {time.perf_counter() - started:.2f}s"
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
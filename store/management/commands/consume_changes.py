@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from store import changes
+
+class Command(BaseCommand):
+    help = 'Feed logged catalog and order changes to the registered change consumers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('consumers', nargs='*', help='Consumers to run (default: all)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new changes')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        names = options['consumers'] or changes.registered()
+        unknown = set(names) - set(changes.registered())
+        if unknown:
+            raise CommandError(f"Unknown consumers: {', '.join(sorted(unknown))}")
+
+        while True:
+            for name in names:
+                try:
+                    processed = changes.consume(name)
+                except Exception as e:
+                    self.stderr.write(f"{name}: failed ({e}); will retry")
+                    continue
+                if processed:
+                    self.stdout.write(f"{name}: {processed} changes")
+            pruned = changes.prune()
+            if pruned:
+                self.stdout.write(f"Pruned {pruned} old change log rows")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
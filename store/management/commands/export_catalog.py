@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from store import export
+
+class Command(BaseCommand):
+    help = 'Render the public catalog to content-hashed static JSON files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Re-render everything instead of only changed jerseys')
+        parser.add_argument('--workers', type=int, default=4, help='Rendering threads')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive')
+        started = time.perf_counter()
+        result = export.export(full=options['full'], workers=options['workers'])
+        self.stdout.write(
+            f"Rendered {result['jerseys']} jerseys and {result['facets']} facets into {export.export_dir()}; "
+            f"{result['files_written']} files written in {time.perf_counter() - started:.2f}s"
+        )
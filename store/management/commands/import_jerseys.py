@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from store import importer
+from store.models import ImportJob
+
+class Command(BaseCommand):
+    help = 'Import jerseys, players, teams, stock and images from a CSV or JSON Lines manifest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help='Path to a .csv or .jsonl manifest')
+        parser.add_argument('--images', default='', help='Directory or zip archive holding the images the manifest names')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE, help='Rows inserted per batch')
+        parser.add_argument('--workers', type=int, default=None, help='Threads processing images')
+
+    def handle(self, *args, **options):
+        job = ImportJob.objects.create(manifest=options['manifest'], images=options['images'])
+        job = importer.run(
+            job,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            progress=lambda job: self.stdout.write(f"{job.processed_rows}/{job.total_rows} rows")
+        )
+        for error in job.errors:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+        if job.status == 'failed':
+            raise CommandError(f"Import #{job.id} failed")
+        self.stdout.write(self.style.SUCCESS(
+            f"Import #{job.id}: {job.jerseys_created} jerseys and {job.images_created} images created"
+        ))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from store.idempotency import purge_expired
+
+class Command(BaseCommand):
+    help = 'Delete expired Idempotency-Key records'
+
+    def handle(self, *args, **kwargs):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from store import inventory
+
+class Command(BaseCommand):
+    help = 'Release expired checkout stock reservations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping instead of running once')
+        parser.add_argument('--interval', type=int, default=60, help='Seconds between sweeps with --loop')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        while True:
+            released = inventory.release_expired(batch_size=options['batch_size'])
+            self.stdout.write(f"Released {released} expired reservations")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
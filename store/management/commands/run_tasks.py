@@ -0,0 +1,65 @@
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store import queue, tasks  # noqa: F401  (registers the task functions)
+
+
+def _init_process():
+    # Forked children must not share the parent's database connections
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Run the background task worker pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Size of the worker pool')
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when idle')
+        parser.add_argument('--once', action='store_true', help='Drain the due tasks and exit')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if options['mode'] == 'process':
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_process)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='task-worker')
+
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Task worker started with {workers} {options['mode']} workers")
+        in_flight = set()
+        last_sweep = 0
+        try:
+            while not stopping:
+                if time.monotonic() - last_sweep > 60:
+                    queue.requeue_stale()
+                    last_sweep = time.monotonic()
+
+                in_flight = {future for future in in_flight if not future.done()}
+                free = workers - len(in_flight)
+                claimed = queue.claim(free) if free > 0 else []
+                for task_id in claimed:
+                    in_flight.add(executor.submit(queue.run, task_id))
+
+                if options['once'] and not claimed and not in_flight:
+                    break
+                if not claimed:
+                    queue.wakeup.wait(options['poll_interval'])
+                    queue.wakeup.clear()
+        finally:
+            executor.shutdown(wait=True)
+            self.stdout.write("Task worker stopped")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from store import price_schedule
+
+class Command(BaseCommand):
+    help = 'Refresh effective-price snapshots at sale start and end boundaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running, waking at each sale boundary')
+        parser.add_argument('--max-sleep', type=int, default=60, help='Longest wait between checks with --loop')
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every snapshot before starting')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            changes = price_schedule.refresh()
+            self.stdout.write(f"Rebuilt snapshots; {len(changes)} jerseys changed")
+
+        while True:
+            for transition in price_schedule.run():
+                self.stdout.write(
+                    f"{transition.get_kind_display()} (sale {transition.sale_id}) at {transition.boundary}: "
+                    f"{transition.jerseys_repriced} jerseys repriced"
+                )
+            if not options['loop']:
+                break
+            now = timezone.now()
+            upcoming = price_schedule.next_boundary(now)
+            wait = options['max_sleep']
+            if upcoming is not None:
+                wait = min(wait, max((upcoming - now).total_seconds(), 0) + 0.5)
+            time.sleep(wait)
@@ -0,0 +1,87 @@
+"""Negotiated gzip/brotli compression for API responses.
+
+Django's GZipMiddleware only speaks gzip and compresses every body, however
+small. This picks the best encoding the client accepts (``br`` when the
+optional ``brotli`` package is installed, else ``gzip``), skips bodies under
+``COMPRESSION_MIN_SIZE`` bytes where the framing costs more than it saves,
+and leaves images and already-encoded responses alone.
+"""
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(header):
+    """Map each encoding in an Accept-Encoding header to its q-value."""
+    encodings = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        try:
+            encodings[name] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            encodings[name] = 0.0
+    return encodings
+
+
+def choose_encoding(header):
+    encodings = accepted_encodings(header)
+    supported = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best = None
+    for name in supported:
+        quality = encodings.get(name, encodings.get('*', 0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (name, quality)
+    return best[0] if best else None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    # Random gzip padding (as in GZipMiddleware) mitigates BREACH
+    return compress_string(content, max_random_bytes=100)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # The body differs per encoding, so a strong ETag no longer matches it byte for byte
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:30
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_jerseystock_stockreservation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cart', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(choices=[('XS', 'Extra Small'), ('S', 'Small'), ('M', 'Medium'), ('L', 'Large'), ('XL', 'Extra Large'), ('XXL', 'Double Extra Large'), ('XXXL', 'Triple Extra Large')], default='M', max_length=4)),
+                ('quantity', models.IntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('type', models.CharField(choices=[('regular', 'Regular'), ('custom', 'Custom')], default='regular', max_length=10)),
+                ('player_name', models.CharField(blank=True, max_length=100)),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+                ('cart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='store.cart')),
+                ('jersey', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_items', to='store.jersey')),
+            ],
+            options={
+                'ordering': ['added_at'],
+                'unique_together': {('cart', 'jersey', 'size', 'type', 'player_name')},
+            },
+        ),
+    ]
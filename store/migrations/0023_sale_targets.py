@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def split_target_values(apps, schema_editor):
+    Sale = apps.get_model('store', 'Sale')
+    SaleTarget = apps.get_model('store', 'SaleTarget')
+    Player = apps.get_model('store', 'Player')
+    Team = apps.get_model('store', 'Team')
+
+    player_ids = set(Player.objects.values_list('id', flat=True))
+    team_ids = set(Team.objects.values_list('id', flat=True))
+    targets = []
+    for sale in Sale.objects.exclude(sale_type='ALL'):
+        values = {value.strip() for value in sale.target_value.split(',') if value.strip()}
+        if sale.sale_type == 'LEAGUE':
+            targets += [SaleTarget(sale_id=sale.id, league=league) for league in values]
+            continue
+        ids = {int(value) for value in values if value.isdigit()}
+        if sale.sale_type == 'PLAYER':
+            targets += [SaleTarget(sale_id=sale.id, player_id=pk) for pk in ids & player_ids]
+        elif sale.sale_type == 'TEAM':
+            targets += [SaleTarget(sale_id=sale.id, team_id=pk) for pk in ids & team_ids]
+    SaleTarget.objects.bulk_create(targets, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_review_ratings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('league', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='target_value',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['is_active', 'start_date', 'end_date'], name='sale_window_idx'),
+        ),
+        migrations.AddField(
+            model_name='saletarget',
+            name='player',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sale_targets', to='store.player'),
+        ),
+        migrations.AddField(
+            model_name='saletarget',
+            name='sale',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='targets', to='store.sale'),
+        ),
+        migrations.AddField(
+            model_name='saletarget',
+            name='team',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sale_targets', to='store.team'),
+        ),
+        migrations.AddIndex(
+            model_name='saletarget',
+            index=models.Index(fields=['player', 'sale'], name='saletarget_player_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saletarget',
+            index=models.Index(fields=['team', 'sale'], name='saletarget_team_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saletarget',
+            index=models.Index(fields=['league', 'sale'], name='saletarget_league_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='saletarget',
+            constraint=models.UniqueConstraint(fields=('sale', 'player'), name='saletarget_unique_player'),
+        ),
+        migrations.AddConstraint(
+            model_name='saletarget',
+            constraint=models.UniqueConstraint(fields=('sale', 'team'), name='saletarget_unique_team'),
+        ),
+        migrations.AddConstraint(
+            model_name='saletarget',
+            constraint=models.UniqueConstraint(condition=models.Q(('league', ''), _negated=True), fields=('sale', 'league'), name='saletarget_unique_league'),
+        ),
+        migrations.RunPython(split_target_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0023_sale_targets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JerseyPrice',
+            fields=[
+                ('jersey', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='price_snapshot', serialize=False, to='store.jersey')),
+                ('base_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('effective_price', models.DecimalField(db_index=True, decimal_places=2, max_digits=10)),
+                ('computed_at', models.DateTimeField()),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='store.sale')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SaleTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('start', 'Sale started'), ('end', 'Sale ended'), ('change', 'Sale changed'), ('rebuild', 'Full rebuild')], max_length=10)),
+                ('boundary', models.DateTimeField(db_index=True)),
+                ('jerseys_repriced', models.PositiveIntegerField(default=0)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transitions', to='store.sale')),
+            ],
+            options={
+                'ordering': ['-boundary', '-id'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_jersey_price_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='stacking',
+            field=models.CharField(choices=[('best', 'Best discount wins'), ('exclusive', 'Exclusive'), ('stackable', 'Stacks on other sales')], default='best', max_length=10),
+        ),
+    ]
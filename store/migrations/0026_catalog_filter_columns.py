@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:50
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def backfill(apps, schema_editor):
+    JerseyRatingSummary = apps.get_model('store', 'JerseyRatingSummary')
+    Jersey = apps.get_model('store', 'Jersey')
+    JerseyPrice = apps.get_model('store', 'JerseyPrice')
+
+    JerseyRatingSummary.objects.filter(review_count__gt=0).update(
+        average_rating=Cast('rating_total', models.FloatField()) / models.F('review_count')
+    )
+    # Base prices for jerseys the price scheduler has not seen yet; its next
+    # run (schedule_prices --rebuild) applies any sales
+    now = django.utils.timezone.now()
+    JerseyPrice.objects.bulk_create([
+        JerseyPrice(jersey_id=jersey_id, base_price=price, effective_price=price, computed_at=now)
+        for jersey_id, price in Jersey.objects.filter(price_snapshot__isnull=True).values_list('id', 'price')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_sale_priority_stacking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jersey',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='jerseyratingsummary',
+            name='average_rating',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='jersey',
+            name='stock',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0029_task_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changecursor',
+            name='frontier',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -2,7 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from .constants import CURRENCY
+from . import money
+from .constants import CURRENCY, SIZE_CHOICES
 from django.utils import timezone
 
 class Team(models.Model):
@@ -41,8 +42,9 @@ class JerseyImage(models.Model):
 class Jersey(models.Model):
     player = models.ForeignKey('Player', on_delete=models.CASCADE)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    stock = models.IntegerField(default=0)
+    stock = models.IntegerField(default=0, db_index=True)
     low_stock_threshold = models.IntegerField(default=100)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         verbose_name_plural = "Jerseys"
@@ -56,40 +58,9 @@ class Jersey(models.Model):
 
     @property
     def sale_price(self):
-        active_sales = Sale.objects.filter(
-            is_active=True,
-            start_date__lte=timezone.now(),
-            end_date__gte=timezone.now()
-        )
-        
-        applicable_sale = None
-        for sale in active_sales:
-            if sale.sale_type == 'ALL':
-                applicable_sale = sale
-            elif sale.sale_type == 'PLAYER':
-                target_player_ids = [int(id) for id in sale.target_value.split(',') if id]
-                if self.player.id in target_player_ids:
-                    applicable_sale = sale
-            elif sale.sale_type == 'TEAM':
-                target_team_ids = [int(id) for id in sale.target_value.split(',') if id]
-                if self.player.team.id in target_team_ids:
-                    applicable_sale = sale
-            elif sale.sale_type == 'LEAGUE':
-                target_leagues = sale.target_value.split(',')
-                if self.player.team.league in target_leagues:
-                    applicable_sale = sale
-            
-            if applicable_sale:
-                break
-        
-        if not applicable_sale:
-            return None
-            
-        if applicable_sale.discount_type == 'FLAT':
-            return max(0, float(self.price) - float(applicable_sale.discount_value))
-        else:  # PERCENTAGE
-            discount = (float(applicable_sale.discount_value) / 100) * float(self.price)
-            return max(0, float(self.price) - discount)
+        from .pricing import resolve_minor, sales_for_jersey
+        sale_price, applied = resolve_minor(money.to_minor(self.price), list(sales_for_jersey(self)))
+        return money.as_float(sale_price) if applied else None
 
     @property
     def primary_image(self):
@@ -172,6 +143,11 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_history_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
@@ -198,14 +174,45 @@ class Review(models.Model):
     jersey = models.ForeignKey(Jersey, on_delete=models.CASCADE, related_name='reviews')
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField(blank=True)
+    helpful_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('user', 'jersey')  # Ensure one review per user per jersey
+        indexes = [
+            models.Index(fields=['jersey', '-created_at', '-id'], name='review_newest_idx'),
+            models.Index(fields=['jersey', '-helpful_count', '-id'], name='review_helpful_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s review of {self.jersey.player.name} jersey"
 
+class ReviewVote(models.Model):
+    """One 'helpful' vote per user per review; backs Review.helpful_count."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='votes')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'review')
+
+class JerseyRatingSummary(models.Model):
+    """Star histogram per jersey, maintained incrementally as reviews change."""
+    jersey = models.OneToOneField(Jersey, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    # rating_total / review_count, stored so the catalog can sort and filter on it
+    average_rating = models.FloatField(default=0, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ratings for jersey {self.jersey_id}"
+
 class Sale(models.Model):
     SALE_TYPE_CHOICES = [
         ('PLAYER', 'Player'),
@@ -219,18 +226,91 @@ class Sale(models.Model):
         ('PERCENTAGE', 'Percentage')
     ]
 
+    STACKING_CHOICES = [
+        ('best', 'Best discount wins'),
+        ('exclusive', 'Exclusive'),
+        ('stackable', 'Stacks on other sales')
+    ]
+
     sale_type = models.CharField(max_length=10, choices=SALE_TYPE_CHOICES)
-    target_value = models.CharField(max_length=100)  # Player name, team name, or league name
+    # Display label (comma-separated player IDs, team IDs or league names); SaleTarget rows are authoritative
+    target_value = models.TextField(blank=True)
     discount_type = models.CharField(max_length=10, choices=DISCOUNT_TYPE_CHOICES)
     discount_value = models.DecimalField(max_digits=10, decimal_places=2)
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
+    # Higher priority wins among exclusive sales and stacks first
+    priority = models.IntegerField(default=0)
+    stacking = models.CharField(max_length=10, choices=STACKING_CHOICES, default='best')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'start_date', 'end_date'], name='sale_window_idx'),
+        ]
+
     def __str__(self):
         return f"{self.get_sale_type_display()} Sale - {self.target_value}"
 
+class SaleTarget(models.Model):
+    """One player, team or league a sale applies to, matching the sale's type."""
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='targets')
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, null=True, blank=True, related_name='sale_targets')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, null=True, blank=True, related_name='sale_targets')
+    league = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['player', 'sale'], name='saletarget_player_idx'),
+            models.Index(fields=['team', 'sale'], name='saletarget_team_idx'),
+            models.Index(fields=['league', 'sale'], name='saletarget_league_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['sale', 'player'], name='saletarget_unique_player'),
+            models.UniqueConstraint(fields=['sale', 'team'], name='saletarget_unique_team'),
+            models.UniqueConstraint(
+                fields=['sale', 'league'],
+                condition=~models.Q(league=''),
+                name='saletarget_unique_league'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sale_id}: {self.player_id or self.team_id or self.league}"
+
+class JerseyPrice(models.Model):
+    """A jersey's materialized price, refreshed by the price scheduler at sale boundaries."""
+    jersey = models.OneToOneField(Jersey, on_delete=models.CASCADE, primary_key=True, related_name='price_snapshot')
+    base_price = models.DecimalField(max_digits=10, decimal_places=2)
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, db_index=True)
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Jersey {self.jersey_id}: {self.effective_price}"
+
+class SaleTransition(models.Model):
+    """Audit record of a repricing run and which sale caused it."""
+    KIND_CHOICES = [
+        ('start', 'Sale started'),
+        ('end', 'Sale ended'),
+        ('change', 'Sale changed'),
+        ('rebuild', 'Full rebuild'),
+    ]
+
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='transitions')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    boundary = models.DateTimeField(db_index=True)
+    jerseys_repriced = models.PositiveIntegerField(default=0)
+    applied_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-boundary', '-id']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} at {self.boundary}"
+
 class Return(models.Model):
     RETURN_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -252,3 +332,176 @@ class Return(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+
+class JerseyStock(models.Model):
+    jersey = models.ForeignKey(Jersey, on_delete=models.CASCADE, related_name='size_stock')
+    size = models.CharField(max_length=4, choices=SIZE_CHOICES)
+    quantity = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    reserved = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('jersey', 'size')
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(reserved__gte=0) & models.Q(reserved__lte=models.F('quantity')),
+                name='jerseystock_reserved_within_quantity'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.jersey.player.name}'s Jersey ({self.size}): {self.available} available"
+
+    @property
+    def available(self):
+        return self.quantity - self.reserved
+
+class StockReservation(models.Model):
+    STATUS_CHOICES = [
+        ('held', 'Held'),
+        ('converted', 'Converted'),
+        ('released', 'Released')
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    jersey = models.ForeignKey(Jersey, on_delete=models.CASCADE, related_name='reservations')
+    size = models.CharField(max_length=4, choices=SIZE_CHOICES)
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='held')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+            models.Index(fields=['user', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x {self.size} held for {self.user.username} ({self.status})"
+
+class Cart(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cart of {self.user.username}"
+
+class CartItem(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
+    jersey = models.ForeignKey(Jersey, on_delete=models.CASCADE, related_name='cart_items')
+    size = models.CharField(max_length=4, choices=SIZE_CHOICES, default='M')
+    quantity = models.IntegerField(default=1, validators=[MinValueValidator(1)])
+    type = models.CharField(max_length=10, choices=[
+        ('regular', 'Regular'),
+        ('custom', 'Custom')
+    ], default='regular')
+    player_name = models.CharField(max_length=100, blank=True)
+    added_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('cart', 'jersey', 'size', 'type', 'player_name')
+        ordering = ['added_at']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.jersey.player.name}'s Jersey (Size: {self.size})"
+
+class IdempotencyKey(models.Model):
+    # sha256 of user, scope and client key, so arbitrary client keys stay compact
+    key_hash = models.CharField(max_length=64, unique=True)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.IntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency key {self.key_hash[:12]} ({'completed' if self.completed else 'in progress'})"
+
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"Task #{self.id} {self.name} ({self.status})"
+
+class ChangeLog(models.Model):
+    """Outbox of row changes, read in id order by the change feed and its consumers."""
+    ACTION_CHOICES = [
+        ('create', 'Created'),
+        ('update', 'Updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    model = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'id'], name='changelog_model_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.model} {self.object_id} {self.action}"
+
+class ChangeCursor(models.Model):
+    """How far a change consumer has read."""
+    name = models.CharField(max_length=100, primary_key=True)
+    position = models.BigIntegerField(default=0)
+    # Highest id known to have no open gaps below it, so reads scan from here
+    frontier = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at #{self.position}"
+
+class ImportJob(models.Model):
+    """A bulk jersey import and its progress."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    manifest = models.CharField(max_length=500)
+    images = models.CharField(max_length=500, blank=True)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    jerseys_created = models.PositiveIntegerField(default=0)
+    images_created = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import #{self.id} ({self.status})"
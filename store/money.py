@@ -0,0 +1,87 @@
+"""Money arithmetic in integer minor units (paise for INR).
+
+Prices are stored as two-place Decimals. Converting each one to an int once
+and doing discounts, line totals and averages in integers avoids per-step
+Decimal contexts and float round-trips, and rounds in exactly one way:
+half up, away from zero, to the nearest minor unit. Convert back with
+``from_minor`` for storage and ``as_float`` for JSON.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+MINOR_UNITS = 100
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+# Percentages are held in hundredths of a percent, so 12.5% is 1250
+BASIS = 100 * MINOR_UNITS
+
+
+def to_minor(amount):
+    """Decimal, int or numeric string to integer minor units."""
+    if amount is None:
+        return None
+    if isinstance(amount, int):
+        return amount * MINOR_UNITS
+    if isinstance(amount, float):
+        amount = repr(amount)
+    return int((Decimal(amount) * MINOR_UNITS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_minor_many(amounts):
+    return [to_minor(amount) for amount in amounts]
+
+
+def from_minor(minor):
+    """Integer minor units back to a two-place Decimal."""
+    if minor is None:
+        return None
+    return Decimal(minor).scaleb(-2).quantize(CENT)
+
+
+def as_float(amount):
+    """A Decimal or minor-unit int as a float for JSON, or None."""
+    if amount is None:
+        return None
+    if isinstance(amount, int):
+        return amount / MINOR_UNITS
+    return to_minor(amount) / MINOR_UNITS
+
+
+def divide(minor, divisor):
+    """``minor / divisor`` rounded half up; 0 when there is nothing to divide by."""
+    if not divisor:
+        return 0
+    quotient, remainder = divmod(abs(minor), divisor)
+    if remainder * 2 >= divisor:
+        quotient += 1
+    return quotient if minor >= 0 else -quotient
+
+
+def discount(minor, discount_type, value_minor):
+    """Price after one discount, never below zero.
+
+    ``value_minor`` is the discount in minor units for 'FLAT', or the
+    percentage in hundredths of a percent for 'PERCENTAGE'.
+    """
+    if discount_type == 'FLAT':
+        return max(0, minor - value_minor)
+    return max(0, divide(minor * (BASIS - value_minor), BASIS))
+
+
+def discount_many(prices, discount_type, value_minor):
+    """``discount`` over a list of minor-unit prices."""
+    if discount_type == 'FLAT':
+        return [max(0, price - value_minor) for price in prices]
+    factor = BASIS - value_minor
+    if factor <= 0:
+        return [0] * len(prices)
+    half = BASIS // 2
+    return [(price * factor + half) // BASIS for price in prices]
+
+
+def line_total(unit_minor, quantity):
+    return unit_minor * quantity
+
+
+def total(lines):
+    """Sum of (unit price, quantity) pairs in minor units."""
+    return sum(unit_minor * quantity for unit_minor, quantity in lines)
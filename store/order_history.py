@@ -0,0 +1,104 @@
+"""Read model for a user's order history.
+
+A page costs two queries however many orders the user has: one keyset query
+for the orders (served by ``order_user_history_idx``) and one for their items,
+with the jersey name and thumbnail joined in. Rows stay as ``values()`` dicts
+and are shaped directly, without model instances or DRF field objects.
+"""
+import base64
+from datetime import datetime
+
+from django.core.files.storage import default_storage
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import JerseyImage, Order, OrderItem
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(order):
+    raw = f"{order['created_at'].isoformat()}|{order['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def thumbnail_subquery(jersey_ref='jersey_id'):
+    return Subquery(
+        JerseyImage.objects.filter(jersey_id=OuterRef(jersey_ref)).order_by(
+            '-is_primary', 'order', 'id'
+        ).values('image')[:1]
+    )
+
+
+def media_url(name, request=None):
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def fetch_items(order_ids, request=None):
+    """Return {order_id: [item dicts]} for many orders in a single query."""
+    items_by_order = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return items_by_order
+    items = OrderItem.objects.filter(order_id__in=order_ids).annotate(
+        jersey_name=F('jersey__player__name'),
+        thumbnail=thumbnail_subquery()
+    ).values_list(
+        'order_id', 'jersey_id', 'jersey_name', 'thumbnail',
+        'quantity', 'price', 'size', 'type', 'player_name'
+    )
+    for order_id, jersey_id, jersey_name, thumbnail, quantity, price, size, type, player_name in items:
+        items_by_order[order_id].append({
+            'jersey': jersey_id,
+            'jersey_name': jersey_name,
+            'thumbnail': media_url(thumbnail, request),
+            'quantity': quantity,
+            'price': price,
+            'size': size,
+            'type': type,
+            'player_name': player_name,
+        })
+    return items_by_order
+
+
+def fetch_page(user, cursor=None, limit=DEFAULT_PAGE_SIZE, request=None):
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    orders = Order.objects.filter(user=user)
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        orders = orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        )
+    orders = list(orders.order_by('-created_at', '-id').values(
+        'id', 'status', 'total_price', 'created_at', 'updated_at'
+    )[:limit + 1])
+
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+
+    items_by_order = fetch_items([order['id'] for order in orders], request)
+
+    return {
+        'results': [
+            {
+                'id': order['id'],
+                'status': order['status'],
+                'total_price': order['total_price'],
+                'created_at': order['created_at'],
+                'updated_at': order['updated_at'],
+                'items': items_by_order[order['id']],
+            }
+            for order in orders
+        ],
+        'next_cursor': encode_cursor(orders[-1]) if has_more else None,
+    }
@@ -0,0 +1,114 @@
+"""The order status state machine shared by every status-changing endpoint."""
+from collections import defaultdict
+
+from django.utils import timezone
+
+from . import changes, dashboard
+from .models import Order
+
+TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': {'return_pending'},
+    'return_pending': {'return_approved', 'return_rejected'},
+    'return_approved': {'return_completed'},
+    'return_rejected': set(),
+    'return_completed': set(),
+    'cancelled': set(),
+}
+
+# What a customer may do to their own order; staff may make any valid transition
+CUSTOMER_TRANSITIONS = {
+    ('pending', 'cancelled'),
+    ('processing', 'cancelled'),
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+class TransitionNotAllowed(InvalidTransition):
+    pass
+
+
+def check(current, new_status, user=None):
+    """Raise if ``user`` may not move an order from ``current`` to ``new_status``.
+
+    ``user=None`` means the system itself (e.g. the returns flow).
+    """
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition('Invalid status')
+    if user is not None and not user.is_staff:
+        if new_status != 'cancelled':
+            raise TransitionNotAllowed('Users can only cancel orders')
+        if (current, new_status) not in CUSTOMER_TRANSITIONS:
+            raise InvalidTransition('Can only cancel pending or processing orders')
+    if new_status not in TRANSITIONS.get(current, set()):
+        if current == 'delivered':
+            raise InvalidTransition('Cannot modify delivered orders')
+        raise InvalidTransition(f'Cannot change order status from {current} to {new_status}')
+
+
+def transition(order, new_status, user=None):
+    """Validate and apply a single transition with a conditional UPDATE."""
+    check(order.status, new_status, user)
+    now = timezone.now()
+    updated = Order.objects.filter(id=order.id, status=order.status).update(
+        status=new_status,
+        updated_at=now
+    )
+    if not updated:
+        raise InvalidTransition('Order status was changed by another request')
+    order.status = new_status
+    order.updated_at = now
+    changes.record(Order, [order.id])
+    dashboard.invalidate(order.user_id)
+    return order
+
+
+def bulk_transition(order_ids, new_status):
+    """Apply a staff transition to many orders.
+
+    Runs one conditional UPDATE per distinct source status. Returns the ids
+    that moved and, for the rest, why they were skipped.
+    """
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition('Invalid status')
+
+    order_ids = set(order_ids)
+    by_status = defaultdict(list)
+    for order_id, current in Order.objects.filter(id__in=order_ids).values_list('id', 'status'):
+        by_status[current].append(order_id)
+
+    found = {order_id for ids in by_status.values() for order_id in ids}
+    skipped = [{'id': order_id, 'reason': 'Order not found'} for order_id in sorted(order_ids - found)]
+    updated = []
+    now = timezone.now()
+
+    for current, ids in by_status.items():
+        if current == new_status:
+            skipped += [{'id': order_id, 'reason': f'Already {new_status}'} for order_id in ids]
+            continue
+        if new_status not in TRANSITIONS.get(current, set()):
+            reason = f'Cannot change order status from {current} to {new_status}'
+            skipped += [{'id': order_id, 'reason': reason} for order_id in ids]
+            continue
+
+        count = Order.objects.filter(id__in=ids, status=current).update(status=new_status, updated_at=now)
+        if count == len(ids):
+            updated += ids
+            continue
+        # Some orders moved under us between the read and the update
+        moved = set(Order.objects.filter(id__in=ids, status=new_status, updated_at=now).values_list('id', flat=True))
+        updated += [order_id for order_id in ids if order_id in moved]
+        skipped += [
+            {'id': order_id, 'reason': 'Order status was changed by another request'}
+            for order_id in ids if order_id not in moved
+        ]
+
+    changes.record(Order, updated)
+    for user_id in Order.objects.filter(id__in=updated).values_list('user_id', flat=True).distinct():
+        dashboard.invalidate(user_id)
+    return {'updated': sorted(updated), 'skipped': sorted(skipped, key=lambda row: row['id'])}
@@ -0,0 +1,79 @@
+"""Password hashing on a small bounded pool.
+
+PBKDF2 spends tens of milliseconds of CPU per hash. Running every hash on a
+dedicated pool of ``PASSWORD_HASHING_WORKERS`` threads caps how many run at
+once, so a login storm cannot take every core from the threads serving
+catalog traffic. It does not free the request thread: the login or signup
+request still blocks on the result, and when the pool and its queue are full
+callers get ``HashingBusy`` instead of queueing without limit.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+WORKERS = getattr(settings, 'PASSWORD_HASHING_WORKERS', 2)
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='password-hasher')
+_slots = threading.BoundedSemaphore(WORKERS + getattr(settings, 'PASSWORD_HASHING_QUEUE', 16))
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _run(func, *args):
+    """Run ``func`` on the pool and wait for it on the calling thread."""
+    if not _slots.acquire(timeout=getattr(settings, 'PASSWORD_HASHING_WAIT', 2)):
+        raise HashingBusy("Too many password checks in progress")
+    try:
+        future = _pool.submit(func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def _verify(password, encoded):
+    needs_rehash = []
+    valid = check_password(password, encoded, setter=needs_rehash.append)
+    return valid, bool(needs_rehash)
+
+
+def hash_password(password):
+    return _run(make_password, password)
+
+
+def authenticate(username, password):
+    """Return the active user for these credentials, or None.
+
+    Unknown and inactive users still pay for one hash, so response time does
+    not reveal which usernames exist.
+    """
+    user = User.objects.filter(username=username).first()
+    if user is None or not user.is_active:
+        hash_password(password)
+        return None
+
+    valid, needs_rehash = _run(_verify, password, user.password)
+    if not valid:
+        return None
+    if needs_rehash:
+        # Hasher or iteration count changed since this password was stored
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return user
+
+
+def create_user(username, password):
+    encoded = hash_password(password)
+    with transaction.atomic():
+        # The manager normalizes the username; the password is hashed above
+        user = User.objects.create_user(username)
+        user.password = encoded
+        user.save(update_fields=['password'])
+    return user
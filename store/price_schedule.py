@@ -0,0 +1,191 @@
+"""Effective-price snapshots, refreshed at sale boundaries.
+
+``JerseyPrice`` holds each jersey's current price and the sale behind it, so
+catalog filters and sorting can use an indexed column instead of resolving
+sales per row. ``run()`` reprices the catalog when a sale window opens or
+closes and records a ``SaleTransition`` for each boundary it crossed;
+``python manage.py schedule_prices --loop`` calls it and sleeps until the next
+boundary. Catalog reads only read the snapshots, so the loop must be running
+for sale windows to open and close on time. Jersey edits reprice their
+jerseys when their transaction commits; sale and sale target edits queue a
+catalog reprice on the task worker.
+"""
+import logging
+import threading
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import pricing
+from .changes import record as record_changes
+from .models import Jersey, JerseyPrice, Sale, SaleTransition
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+_pending = threading.local()
+
+
+def refresh(jersey_ids=None, now=None, batch_size=BATCH_SIZE):
+    """Recompute snapshots and write the ones that changed.
+
+    Returns a list of (jersey_id, old_sale_id, new_sale_id) for every jersey
+    whose price or sale changed.
+    """
+    now = now or timezone.now()
+    jerseys = Jersey.objects.select_related('player__team').order_by('id')
+    if jersey_ids is not None:
+        jerseys = jerseys.filter(id__in=jersey_ids)
+        sales = pricing.active_sales(now, jerseys=list(jerseys))
+    else:
+        sales = pricing.active_sales(now)
+
+    changes = []
+    last_id = 0
+    while True:
+        batch = list(jerseys.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        existing = JerseyPrice.objects.in_bulk([jersey.id for jersey in batch])
+        to_create, to_update = [], []
+
+        resolved = pricing.resolve(batch, sales)
+        for jersey in batch:
+            effective, applied = resolved[jersey.id]
+            # Stacked sales are recorded by the first (base) sale applied
+            sale_id = applied[0].id if applied else None
+            snapshot = existing.get(jersey.id)
+            if snapshot is None:
+                to_create.append(JerseyPrice(
+                    jersey_id=jersey.id, base_price=jersey.price, effective_price=effective,
+                    sale_id=sale_id, computed_at=now
+                ))
+                changes.append((jersey.id, None, sale_id))
+            elif (snapshot.base_price, snapshot.effective_price, snapshot.sale_id) != (jersey.price, effective, sale_id):
+                changes.append((jersey.id, snapshot.sale_id, sale_id))
+                snapshot.base_price, snapshot.effective_price = jersey.price, effective
+                snapshot.sale_id, snapshot.computed_at = sale_id, now
+                to_update.append(snapshot)
+
+        JerseyPrice.objects.bulk_create(to_create)
+        JerseyPrice.objects.bulk_update(to_update, ['base_price', 'effective_price', 'sale', 'computed_at'])
+        # A repriced jersey has changed as far as change consumers are concerned
+        record_changes(Jersey, [snapshot.jersey_id for snapshot in to_update])
+    return changes
+
+
+def last_boundary():
+    return SaleTransition.objects.filter(kind__in=['start', 'end', 'rebuild']).aggregate(
+        last=Max('boundary')
+    )['last']
+
+
+def next_boundary(now=None):
+    """The next time a sale window opens or closes, or None."""
+    now = now or timezone.now()
+    upcoming = Sale.objects.filter(is_active=True)
+    return min(
+        filter(None, [
+            upcoming.filter(start_date__gt=now).order_by('start_date').values_list('start_date', flat=True).first(),
+            upcoming.filter(end_date__gt=now).order_by('end_date').values_list('end_date', flat=True).first(),
+        ]),
+        default=None
+    )
+
+
+def run(now=None):
+    """Reprice for every sale boundary crossed since the last run.
+
+    The first run, with nothing recorded yet, rebuilds every snapshot.
+    Returns the transitions it recorded.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        since = last_boundary()
+        if since is None:
+            changes = refresh(now=now)
+            transitions = [SaleTransition.objects.create(kind='rebuild', boundary=now, jerseys_repriced=len(changes))]
+            transaction.on_commit(pricing.bump_pricing_version)
+            return transitions
+
+        sales = Sale.objects.filter(is_active=True)
+        due = [
+            (sale_id, 'start', boundary) for sale_id, boundary in
+            sales.filter(start_date__gt=since, start_date__lte=now).values_list('id', 'start_date')
+        ] + [
+            (sale_id, 'end', boundary) for sale_id, boundary in
+            sales.filter(end_date__gt=since, end_date__lte=now).values_list('id', 'end_date')
+        ]
+        if not due:
+            return []
+
+        changes = refresh(now=now)
+        gained = Counter(new for _, _, new in changes)
+        lost = Counter(old for _, old, _ in changes)
+        transitions = SaleTransition.objects.bulk_create([
+            SaleTransition(
+                sale_id=sale_id,
+                kind=kind,
+                boundary=boundary,
+                jerseys_repriced=gained[sale_id] if kind == 'start' else lost[sale_id]
+            )
+            for sale_id, kind, boundary in sorted(due, key=lambda row: row[2])
+        ])
+    if changes:
+        pricing.bump_pricing_version()
+    logger.info(f"Repriced {len(changes)} jerseys for {len(transitions)} sale boundaries")
+    return transitions
+
+
+def record_sale_change(sale_ids):
+    """Reprice everything after sales were created, edited or deleted.
+
+    The catalog is repriced rather than the sales' jerseys, as a sale's old
+    targets are gone by now; only snapshots that changed are written.
+    """
+    with transaction.atomic():
+        changes = refresh()
+        existing = set(Sale.objects.filter(id__in=sale_ids).values_list('id', flat=True))
+        SaleTransition.objects.bulk_create([
+            SaleTransition(
+                sale_id=sale_id if sale_id in existing else None,
+                kind='change',
+                boundary=timezone.now(),
+                jerseys_repriced=len(changes)
+            )
+            for sale_id in sorted(sale_ids)
+        ])
+    return changes
+
+
+def reprice_on_commit(jersey_ids=(), sale_id=None):
+    """Reprice once the current transaction commits.
+
+    Requests made during one transaction are merged: any sale change queues
+    a catalog reprice, otherwise only the given jerseys are repriced here.
+    """
+    pending = getattr(_pending, 'value', None)
+    if pending is None:
+        pending = _pending.value = {'sales': set(), 'jerseys': set()}
+    if sale_id is not None:
+        pending['sales'].add(sale_id)
+    pending['jerseys'].update(jersey_ids)
+    # Every request registers a callback, as a rolled back transaction drops
+    # its callbacks; the first to run does the work and the rest find nothing
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    pending = getattr(_pending, 'value', None)
+    _pending.value = None
+    if pending is None:
+        return
+    if pending['sales']:
+        from .tasks import reprice_sales
+        reprice_sales.delay(sale_ids=sorted(pending['sales']))
+    elif pending['jerseys'] and refresh(sorted(pending['jerseys'])):
+        pricing.bump_pricing_version()
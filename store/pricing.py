@@ -0,0 +1,302 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from . import changes, money
+from .models import Jersey, JerseyPrice, OrderItem, Player, Sale, SaleTarget, Team
+
+PRICING_VERSION_KEY = 'pricing:version'
+
+
+def pricing_version():
+    """Global counter bumped whenever a price or sale changes."""
+    return cache.get_or_set(PRICING_VERSION_KEY, 1, timeout=None)
+
+
+def bump_pricing_version():
+    try:
+        cache.incr(PRICING_VERSION_KEY)
+    except ValueError:
+        cache.set(PRICING_VERSION_KEY, 2, timeout=None)
+
+
+def active_sales_query(now=None):
+    now = now or timezone.now()
+    return Sale.objects.filter(
+        is_active=True,
+        start_date__lte=now,
+        end_date__gte=now
+    )
+
+
+def active_sales(now=None, jerseys=None):
+    """Active sales with their targets attached as sets.
+
+    With ``jerseys`` only the targets matching those jerseys' players, teams
+    and leagues are loaded, so a sale naming thousands of players costs no
+    more than one naming a few.
+    """
+    sales = list(active_sales_query(now).order_by('id'))
+    for sale in sales:
+        sale.player_ids, sale.team_ids, sale.leagues = set(), set(), set()
+    if not sales:
+        return sales
+
+    targets = SaleTarget.objects.filter(sale_id__in=[sale.id for sale in sales if sale.sale_type != 'ALL'])
+    if jerseys is not None:
+        targets = targets.filter(
+            Q(player_id__in={jersey.player_id for jersey in jerseys}) |
+            Q(team_id__in={jersey.player.team_id for jersey in jerseys}) |
+            Q(league__in={jersey.player.team.league for jersey in jerseys})
+        )
+    by_id = {sale.id: sale for sale in sales}
+    for sale_id, player_id, team_id, league in targets.values_list('sale_id', 'player_id', 'team_id', 'league'):
+        sale = by_id[sale_id]
+        if player_id:
+            sale.player_ids.add(player_id)
+        elif team_id:
+            sale.team_ids.add(team_id)
+        elif league:
+            sale.leagues.add(league)
+    return sales
+
+
+def on_sale(now=None, jersey_ref=''):
+    """A filter for jerseys covered by an active sale, as indexed EXISTS joins."""
+    active = active_sales_query(now)
+    targets = SaleTarget.objects.filter(sale__in=active)
+    return (
+        Exists(active.filter(sale_type='ALL')) |
+        Exists(targets.filter(sale__sale_type='PLAYER', player_id=OuterRef(f'{jersey_ref}player_id'))) |
+        Exists(targets.filter(sale__sale_type='TEAM', team_id=OuterRef(f'{jersey_ref}player__team_id'))) |
+        Exists(targets.filter(sale__sale_type='LEAGUE', league=OuterRef(f'{jersey_ref}player__team__league')))
+    )
+
+
+def sales_for_jersey(jersey, now=None):
+    """Active sales that apply to one jersey, in a single query."""
+    team = jersey.player.team
+    return active_sales_query(now).filter(
+        Q(sale_type='ALL') |
+        Q(sale_type='PLAYER', targets__player_id=jersey.player_id) |
+        Q(sale_type='TEAM', targets__team_id=team.id) |
+        Q(sale_type='LEAGUE', targets__league=team.league)
+    ).distinct().order_by('id')
+
+
+def parse_targets(sale_type, values):
+    """Normalise target values (list or comma-separated string) for a sale type.
+
+    Raises ValueError naming the first value that is not a known player or team.
+    """
+    if isinstance(values, str):
+        values = values.split(',')
+    values = list(dict.fromkeys(str(value).strip() for value in values if str(value).strip()))
+    if sale_type == 'ALL':
+        return []
+    if sale_type == 'LEAGUE':
+        return values
+    model = Player if sale_type == 'PLAYER' else Team
+    try:
+        ids = [int(value) for value in values]
+    except ValueError as e:
+        raise ValueError(f'{sale_type.title()} targets must be IDs') from e
+    missing = set(ids) - set(model.objects.filter(id__in=ids).values_list('id', flat=True))
+    if missing:
+        raise ValueError(f'Unknown {sale_type.lower()} ID: {min(missing)}')
+    return ids
+
+
+def set_sale_targets(sale, targets):
+    """Replace a sale's targets with already-parsed ``targets``."""
+    SaleTarget.objects.filter(sale=sale).delete()
+    field = {'PLAYER': 'player_id', 'TEAM': 'team_id', 'LEAGUE': 'league'}.get(sale.sale_type)
+    if field:
+        SaleTarget.objects.bulk_create(
+            [SaleTarget(sale=sale, **{field: target}) for target in targets],
+            batch_size=1000
+        )
+    label = ','.join(map(str, targets))
+    if sale.target_value != label:
+        sale.target_value = label
+        Sale.objects.filter(id=sale.id).update(target_value=label)
+    changes.record(Sale, [sale.id])
+    bump_pricing_version()
+    # Bulk-created targets send no signals
+    from .price_schedule import reprice_on_commit
+    reprice_on_commit(sale_id=sale.id)
+
+
+def apply_sale(price, sale, discount=None):
+    """One sale applied to a price in minor units."""
+    if discount is None:
+        discount = money.to_minor(sale.discount_value)
+    return money.discount(price, sale.discount_type, discount)
+
+
+def _sale_order(sale):
+    # Unsaved (previewed) sales lose ties to existing ones
+    return sale.id if sale.id is not None else float('inf')
+
+
+def resolve_minor(price, sales, discounts=None):
+    """Apply the stacking rules to the sales that cover one jersey.
+
+    - An exclusive sale replaces every other sale; among several, the
+      highest priority wins.
+    - Otherwise the 'best' sale giving the lowest price applies, and every
+      stackable sale is then applied on top, highest priority first.
+
+    Ties fall back to priority and then sale id, so the result never depends
+    on query order. ``price`` is in minor units and ``discounts`` optionally
+    maps id(sale) to its converted discount. Returns (price, sales applied
+    in order).
+    """
+    discounts = discounts or {}
+
+    def apply(price, sale):
+        return apply_sale(price, sale, discounts.get(id(sale)))
+
+    exclusive = [sale for sale in sales if sale.stacking == 'exclusive']
+    if exclusive:
+        sale = min(exclusive, key=lambda sale: (-sale.priority, apply(price, sale), _sale_order(sale)))
+        return apply(price, sale), [sale]
+
+    applied = []
+    best = [sale for sale in sales if sale.stacking == 'best']
+    if best:
+        sale = min(best, key=lambda sale: (apply(price, sale), -sale.priority, _sale_order(sale)))
+        price = apply(price, sale)
+        applied.append(sale)
+    stackable = [sale for sale in sales if sale.stacking == 'stackable']
+    for sale in sorted(stackable, key=lambda sale: (-sale.priority, _sale_order(sale))):
+        price = apply(price, sale)
+        applied.append(sale)
+    return price, applied
+
+
+def resolve_price(price, sales):
+    """``resolve_minor`` for a Decimal price; returns (Decimal price, applied)."""
+    price, applied = resolve_minor(money.to_minor(price), sales)
+    return money.from_minor(price), applied
+
+
+def resolve(jerseys, sales):
+    """Resolve {jersey_id: (price, applied sales)} for a batch of jerseys.
+
+    Candidates are gathered one sale at a time through player, team and
+    league indexes of the batch, so the work grows with the number of
+    matches rather than jerseys x sales.
+    """
+    by_player, by_team, by_league = defaultdict(list), defaultdict(list), defaultdict(list)
+    for jersey in jerseys:
+        by_player[jersey.player_id].append(jersey.id)
+        by_team[jersey.player.team_id].append(jersey.id)
+        by_league[jersey.player.team.league].append(jersey.id)
+
+    candidates = defaultdict(list)
+    for sale in sales:
+        if sale.sale_type == 'ALL':
+            matched = [jersey.id for jersey in jerseys]
+        elif sale.sale_type == 'PLAYER':
+            matched = [jersey_id for key in sale.player_ids for jersey_id in by_player.get(key, ())]
+        elif sale.sale_type == 'TEAM':
+            matched = [jersey_id for key in sale.team_ids for jersey_id in by_team.get(key, ())]
+        elif sale.sale_type == 'LEAGUE':
+            matched = [jersey_id for key in sale.leagues for jersey_id in by_league.get(key, ())]
+        else:
+            matched = []
+        for jersey_id in matched:
+            candidates[jersey_id].append(sale)
+
+    discounts = {id(sale): money.to_minor(sale.discount_value) for sale in sales}
+    resolved = {}
+    for jersey in jerseys:
+        price = money.to_minor(jersey.price)
+        if candidates[jersey.id]:
+            price, applied = resolve_minor(price, candidates[jersey.id], discounts)
+        else:
+            applied = []
+        resolved[jersey.id] = (money.from_minor(price), applied)
+    return resolved
+
+
+def sale_prices(jerseys, sales=None):
+    """Resolve {jersey_id: sale price or None} for many jerseys with one sales query.
+
+    Jerseys should be loaded with select_related('player__team').
+    """
+    jerseys = list(jerseys)
+    if sales is None:
+        sales = active_sales(jerseys=jerseys)
+    return {
+        jersey_id: price if applied else None
+        for jersey_id, (price, applied) in resolve(jerseys, sales).items()
+    }
+
+
+def snapshot_sale_prices(jersey_ids):
+    """{jersey_id: sale price or None} from the JerseyPrice snapshots.
+
+    Catalog reads use this, like the card view and the price filters, so a
+    jersey shows the same sale price however it is listed. Checkout prices
+    live with ``sale_prices``.
+    """
+    prices = dict.fromkeys(jersey_ids)
+    for jersey_id, effective, sale_id in JerseyPrice.objects.filter(jersey_id__in=prices).values_list(
+        'jersey_id', 'effective_price', 'sale_id'
+    ):
+        prices[jersey_id] = effective if sale_id is not None else None
+    return prices
+
+
+def preview_sale(sale, targets, window_days=30, now=None):
+    """Estimate what a proposed, unsaved sale would do.
+
+    Compares prices with and without it, alongside the sales active when it
+    starts, and weighs the difference by units sold over the last
+    ``window_days``. Costs the same handful of queries for any number of jerseys.
+    """
+    now = now or timezone.now()
+    at = max(now, sale.start_date) if sale.start_date else now
+    jerseys = Jersey.objects.select_related('player__team')
+    if sale.sale_type == 'PLAYER':
+        jerseys = jerseys.filter(player_id__in=targets)
+    elif sale.sale_type == 'TEAM':
+        jerseys = jerseys.filter(player__team_id__in=targets)
+    elif sale.sale_type == 'LEAGUE':
+        jerseys = jerseys.filter(player__team__league__in=targets)
+    matched = list(jerseys)
+
+    sale.player_ids = set(targets) if sale.sale_type == 'PLAYER' else set()
+    sale.team_ids = set(targets) if sale.sale_type == 'TEAM' else set()
+    sale.leagues = set(targets) if sale.sale_type == 'LEAGUE' else set()
+    others = [other for other in active_sales(at, jerseys=matched) if other.id != sale.id]
+    current = resolve(matched, others)
+    proposed = resolve(matched, others + [sale])
+
+    units = dict(OrderItem.objects.filter(
+        jersey__in=jerseys,
+        order__created_at__gte=now - timedelta(days=window_days)
+    ).exclude(order__status='cancelled').values('jersey_id').annotate(
+        units=Sum('quantity')
+    ).values_list('jersey_id', 'units'))
+
+    affected = [jersey.id for jersey in matched if proposed[jersey.id][0] != current[jersey.id][0]]
+    revenue_current = money.total((money.to_minor(current[jersey.id][0]), units.get(jersey.id, 0)) for jersey in matched)
+    revenue_proposed = money.total((money.to_minor(proposed[jersey.id][0]), units.get(jersey.id, 0)) for jersey in matched)
+    discount = sum(money.to_minor(current[jersey_id][0] - proposed[jersey_id][0]) for jersey_id in affected)
+
+    return {
+        'jerseys_matched': len(matched),
+        'jerseys_affected': len(affected),
+        'average_discount': money.from_minor(money.divide(discount, len(affected))),
+        'window_days': window_days,
+        'units_sold': sum(units.values()),
+        'revenue_current': money.from_minor(revenue_current),
+        'revenue_proposed': money.from_minor(revenue_proposed),
+        'revenue_impact': money.from_minor(revenue_proposed - revenue_current),
+    }
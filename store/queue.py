@@ -0,0 +1,187 @@
+"""A small durable task queue backed by the ``Task`` table.
+
+Tasks are inserted in the caller's transaction, so a rolled back order never
+leaves work behind, and no worker can see them before that transaction has
+committed. An in-process worker is woken from ``transaction.on_commit``;
+separate worker processes poll. ``python manage.py run_tasks`` runs the pool.
+
+A running task's worker touches ``heartbeat_at`` every
+``TASK_HEARTBEAT_INTERVAL`` seconds, so only tasks whose worker has gone
+quiet for ``TASK_TIMEOUT`` are treated as abandoned, however long they run.
+A task is never claimed more than ``max_attempts`` times.
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+wakeup = threading.Event()
+
+
+def task(name=None, max_attempts=5):
+    """Register a function as a queueable task and give it a ``.delay()``."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[task_name] = (func, max_attempts)
+        func.task_name = task_name
+        func.delay = lambda **payload: enqueue(task_name, **payload)
+        return func
+    return decorator
+
+
+def enqueue(name, countdown=0, **payload):
+    if name not in _registry:
+        raise KeyError(f"Unknown task: {name}")
+    created = Task.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=_registry[name][1],
+        run_after=timezone.now() + timedelta(seconds=countdown)
+    )
+    transaction.on_commit(wakeup.set)
+    return created
+
+
+def enqueue_many(name, payloads, countdown=0):
+    """Queue one task per payload with a single insert."""
+    if name not in _registry:
+        raise KeyError(f"Unknown task: {name}")
+    run_after = timezone.now() + timedelta(seconds=countdown)
+    created = Task.objects.bulk_create([
+        Task(name=name, payload=payload, max_attempts=_registry[name][1], run_after=run_after)
+        for payload in payloads
+    ])
+    transaction.on_commit(wakeup.set)
+    return created
+
+
+def backoff(attempts):
+    base = getattr(settings, 'TASK_RETRY_BACKOFF', 5)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def claim(limit):
+    """Atomically move up to ``limit`` due tasks from queued to running."""
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status='queued',
+        run_after__lte=now,
+        attempts__lt=F('max_attempts')
+    ).order_by('run_after', 'id').values_list('id', flat=True)[:limit]
+    claimed = []
+    for task_id in candidates:
+        # Conditional update, so two workers can never claim the same task
+        if Task.objects.filter(id=task_id, status='queued', attempts__lt=F('max_attempts')).update(
+            status='running',
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1
+        ):
+            claimed.append(task_id)
+    return claimed
+
+
+def _heartbeat(task_id, stop):
+    interval = getattr(settings, 'TASK_HEARTBEAT_INTERVAL', 30)
+    try:
+        while not stop.wait(interval):
+            try:
+                Task.objects.filter(id=task_id, status='running').update(heartbeat_at=timezone.now())
+            except DatabaseError as e:
+                # A missed beat is fine as long as a later one gets through
+                logger.warning(f"Heartbeat for task #{task_id} failed: {str(e)}")
+    finally:
+        connection.close()
+
+
+def run(task_id):
+    close_old_connections()
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(task_id, stop), daemon=True).start()
+    try:
+        task = Task.objects.get(id=task_id)
+        func, _ = _registry[task.name]
+        func(**task.payload)
+    except Exception as e:
+        logger.error(f"Task #{task_id} failed: {str(e)}")
+        task = Task.objects.filter(id=task_id).first()
+        if task is not None:
+            failed = task.attempts >= task.max_attempts
+            Task.objects.filter(id=task_id).update(
+                status='failed' if failed else 'queued',
+                run_after=timezone.now() + backoff(task.attempts),
+                last_error=traceback.format_exc(),
+                finished_at=timezone.now() if failed else None
+            )
+        return False
+    else:
+        Task.objects.filter(id=task_id).update(status='done', finished_at=timezone.now(), last_error='')
+        return True
+    finally:
+        stop.set()
+        close_old_connections()
+
+
+def requeue_stale():
+    """Put back tasks whose worker died while running them.
+
+    Tasks that have used all their attempts are failed instead, so a task
+    with ``max_attempts=1`` never runs twice.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'TASK_TIMEOUT', 300))
+    stale = Task.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed',
+        last_error='Worker stopped responding',
+        finished_at=now
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(status='queued', run_after=now)
+    if failed or requeued:
+        logger.warning(f"Requeued {requeued} and failed {failed} abandoned tasks")
+    return requeued
+
+
+def stats():
+    """Queue depth and latency figures for monitoring."""
+    now = timezone.now()
+    depth = dict(Task.objects.values_list('status').annotate(count=Count('id')))
+    oldest = Task.objects.filter(status='queued', run_after__lte=now).aggregate(
+        oldest=Min('created_at')
+    )['oldest']
+    recent = list(Task.objects.filter(
+        status='done',
+        finished_at__gte=now - timedelta(hours=1)
+    ).values_list('created_at', 'started_at', 'finished_at'))
+
+    latencies = sorted((finished - created).total_seconds() for created, _, finished in recent)
+    run_times = [(finished - started).total_seconds() for _, started, finished in recent]
+
+    def percentile(values, pct):
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(len(values) * pct))]
+
+    return {
+        'depth': {status: depth.get(status, 0) for status, _ in Task.STATUS_CHOICES},
+        'oldest_queued_seconds': (now - oldest).total_seconds() if oldest else 0,
+        'completed_last_hour': len(latencies),
+        'latency_seconds': {
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'max': latencies[-1] if latencies else None,
+        },
+        'average_run_seconds': sum(run_times) / len(run_times) if run_times else None,
+    }
@@ -0,0 +1,110 @@
+"""Admin work queue for return requests and batched approve/reject."""
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from . import changes, inventory, order_states
+from .models import OrderItem, Return
+from .order_history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, fetch_items
+
+ACTIONS = {
+    'approve': ('approved', 'return_approved'),
+    'reject': ('rejected', 'return_rejected'),
+}
+
+
+def queue_page(status='pending', cursor=None, limit=DEFAULT_PAGE_SIZE, request=None):
+    """A page of returns with their orders and items, in two queries."""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    returns = Return.objects.filter(status=status)
+    if cursor:
+        created_at, return_id = decode_cursor(cursor)
+        returns = returns.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=return_id)
+        )
+    returns = list(returns.order_by('-created_at', '-id').values(
+        'id', 'order_id', 'reason', 'status', 'created_at',
+        username=F('user__username'),
+        order_total=F('order__total_price'),
+        order_status=F('order__status'),
+        order_created_at=F('order__created_at'),
+    )[:limit + 1])
+
+    has_more = len(returns) > limit
+    returns = returns[:limit]
+    items_by_order = fetch_items(list({row['order_id'] for row in returns}), request)
+
+    return {
+        'results': [
+            {
+                'id': row['id'],
+                'order': row['order_id'],
+                'user': row['username'],
+                'reason': row['reason'],
+                'status': row['status'],
+                'created_at': row['created_at'],
+                'order_details': {
+                    'id': row['order_id'],
+                    'total_price': row['order_total'],
+                    'status': row['order_status'],
+                    'created_at': row['order_created_at'],
+                    'items': items_by_order[row['order_id']],
+                },
+            }
+            for row in returns
+        ],
+        'next_cursor': encode_cursor(returns[-1]) if has_more else None,
+    }
+
+
+def process_batch(return_ids, action):
+    """Approve or reject many pending returns in one transaction.
+
+    Orders move through the state machine in bulk, and approved returns put
+    their items back into per-size stock. Returns the processed ids and, for
+    the rest, why they were skipped.
+    """
+    if action not in ACTIONS:
+        raise ValueError('Invalid action. Must be either "approve" or "reject"')
+    return_status, order_status = ACTIONS[action]
+    return_ids = set(return_ids)
+
+    with transaction.atomic():
+        rows = list(Return.objects.select_for_update().filter(id__in=return_ids).values_list(
+            'id', 'order_id', 'status'
+        ))
+        found = {return_id for return_id, _, _ in rows}
+        skipped = [{'id': return_id, 'reason': 'Return request not found'} for return_id in return_ids - found]
+        skipped += [
+            {'id': return_id, 'reason': f'Return is already {current}'}
+            for return_id, _, current in rows if current != 'pending'
+        ]
+        pending = [(return_id, order_id) for return_id, order_id, current in rows if current == 'pending']
+
+        result = order_states.bulk_transition({order_id for _, order_id in pending}, order_status)
+        moved = set(result['updated'])
+        order_reasons = {row['id']: row['reason'] for row in result['skipped']}
+        skipped += [
+            {'id': return_id, 'reason': order_reasons[order_id]}
+            for return_id, order_id in pending if order_id not in moved
+        ]
+        processed = [return_id for return_id, order_id in pending if order_id in moved]
+
+        Return.objects.filter(id__in=processed, status='pending').update(
+            status=return_status,
+            updated_at=timezone.now()
+        )
+        changes.record(Return, processed)
+
+        if action == 'approve' and moved:
+            inventory.restock_items(
+                OrderItem.objects.filter(order_id__in=moved).values('jersey_id', 'size').annotate(
+                    quantity=Sum('quantity')
+                )
+            )
+
+    return {
+        'action': action,
+        'processed': sorted(processed),
+        'skipped': sorted(skipped, key=lambda row: row['id']),
+    }
@@ -0,0 +1,142 @@
+"""Review listing, helpful votes and the per-jersey star histogram.
+
+``JerseyRatingSummary`` is adjusted with F() updates whenever a review is
+added, re-rated or deleted (by the Review post_save and post_delete signals),
+so a product page reads its rating breakdown from one row instead of
+aggregating every review.
+"""
+import base64
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from . import changes
+from .models import JerseyRatingSummary, Review, ReviewVote
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+SORTS = {
+    'newest': ('created_at', ('-created_at', '-id')),
+    'helpful': ('helpful_count', ('-helpful_count', '-id')),
+}
+
+
+def encode_cursor(sort, review):
+    key = review[SORTS[sort][0]]
+    value = key.isoformat() if sort == 'newest' else str(key)
+    return base64.urlsafe_b64encode(f"{sort}|{value}|{review['id']}".encode()).decode()
+
+
+def decode_cursor(sort, cursor):
+    try:
+        cursor_sort, value, review_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        if cursor_sort != sort:
+            raise ValueError
+        value = datetime.fromisoformat(value) if sort == 'newest' else int(value)
+        return value, int(review_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def record(jersey_id, added=None, removed=None):
+    """Move one review into ``added`` stars and/or out of ``removed`` stars."""
+    deltas = {}
+    for rating, sign in ((added, 1), (removed, -1)):
+        if rating:
+            field = f'stars_{rating}'
+            deltas[field] = deltas.get(field, 0) + sign
+            deltas['review_count'] = deltas.get('review_count', 0) + sign
+            deltas['rating_total'] = deltas.get('rating_total', 0) + sign * rating
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    # SET expressions see the old row, so the new average is built from the deltas too
+    updates['average_rating'] = Coalesce(
+        Cast(F('rating_total') + deltas.get('rating_total', 0), FloatField()) /
+        NullIf(F('review_count') + deltas.get('review_count', 0), 0),
+        0.0
+    )
+    if JerseyRatingSummary.objects.filter(jersey_id=jersey_id).update(**updates):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        # Nothing to take away from; the jersey has no summary (or is being deleted)
+        return
+    try:
+        with transaction.atomic():
+            JerseyRatingSummary.objects.create(
+                jersey_id=jersey_id,
+                average_rating=deltas['rating_total'] / deltas['review_count'],
+                **deltas
+            )
+    except IntegrityError:
+        # Created concurrently by another review
+        JerseyRatingSummary.objects.filter(jersey_id=jersey_id).update(**updates)
+
+
+def summary(jersey_id):
+    row = JerseyRatingSummary.objects.filter(jersey_id=jersey_id).values(
+        'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5', 'review_count', 'rating_total'
+    ).first()
+    if row is None:
+        return {'average': 0, 'count': 0, 'histogram': {str(stars): 0 for stars in range(1, 6)}}
+    count = row['review_count']
+    return {
+        'average': round(row['rating_total'] / count, 2) if count else 0,
+        'count': count,
+        'histogram': {str(stars): row[f'stars_{stars}'] for stars in range(1, 6)},
+    }
+
+
+def fetch_page(jersey_id, sort='newest', cursor=None, limit=DEFAULT_PAGE_SIZE, user=None):
+    if sort not in SORTS:
+        raise ValueError('Invalid sort. Must be one of: ' + ', '.join(SORTS))
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    key, ordering = SORTS[sort]
+
+    reviews = Review.objects.filter(jersey_id=jersey_id)
+    if cursor:
+        value, review_id = decode_cursor(sort, cursor)
+        reviews = reviews.filter(Q(**{f'{key}__lt': value}) | Q(**{key: value, 'id__lt': review_id}))
+    reviews = list(reviews.order_by(*ordering).values(
+        'id', 'user_id', 'user__username', 'rating', 'comment', 'helpful_count', 'created_at'
+    )[:limit + 1])
+
+    has_more = len(reviews) > limit
+    reviews = reviews[:limit]
+    user_id = user.id if user is not None and user.is_authenticated else None
+
+    return {
+        'results': [
+            {
+                'id': review['id'],
+                'user_name': review['user__username'],
+                'rating': review['rating'],
+                'comment': review['comment'],
+                'helpful_count': review['helpful_count'],
+                'created_at': review['created_at'],
+                'jersey': jersey_id,
+                'is_users_review': review['user_id'] == user_id,
+            }
+            for review in reviews
+        ],
+        'next_cursor': encode_cursor(sort, reviews[-1]) if has_more else None,
+    }
+
+
+def set_helpful(user, review_id, helpful=True):
+    """Add or withdraw the user's helpful vote; returns the new count."""
+    with transaction.atomic():
+        if helpful:
+            _, changed = ReviewVote.objects.get_or_create(user=user, review_id=review_id)
+            delta = 1
+        else:
+            changed, _ = ReviewVote.objects.filter(user=user, review_id=review_id).delete()
+            delta = -1
+        if changed:
+            Review.objects.filter(id=review_id).update(helpful_count=F('helpful_count') + delta)
+            changes.record(Review, [review_id])
+    return Review.objects.values_list('helpful_count', flat=True).get(id=review_id)
@@ -1,7 +1,8 @@
 from rest_framework import serializers
-from .models import Team, Player, Jersey, Customization, Order, Review, Sale, OrderItem, JerseyImage, Return
-from django.db import models
+from .models import Team, Player, Jersey, Customization, Order, Review, Sale, OrderItem, JerseyImage, JerseyRatingSummary, Return, ImportJob
+from django.db import models, transaction
 from .constants import CURRENCY
+from . import money, pricing
 
 class TeamSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,6 +21,37 @@ class JerseyImageSerializer(serializers.ModelSerializer):
         model = JerseyImage
         fields = ['id', 'image', 'is_primary', 'order']
 
+def jersey_context(jerseys, request=None, fields=None):
+    """Serializer context with JerseySerializer's per-jersey lookups done in bulk.
+
+    ``jerseys`` should be a list loaded with select_related('player__team')
+    and prefetch_related('images'). Sale prices, ratings and purchase flags
+    then cost three queries for the whole list instead of several per jersey;
+    with a sparse ``fields`` set only the lookups it needs are made. Sale
+    prices come from the price snapshots, as in the card view.
+    """
+    def wanted(*names):
+        return fields is None or any(name in fields for name in names)
+
+    ids = [jersey.id for jersey in jerseys]
+    context = {'request': request, 'fields': fields}
+    if wanted('sale_price', 'on_sale'):
+        context['sale_prices'] = pricing.snapshot_sale_prices(ids)
+    if wanted('average_rating'):
+        context['ratings'] = dict(JerseyRatingSummary.objects.filter(jersey_id__in=ids).values_list(
+            'jersey_id', 'average_rating'
+        ))
+    if wanted('user_has_purchased'):
+        purchased = set()
+        if request and request.user.is_authenticated:
+            purchased = set(OrderItem.objects.filter(
+                order__user=request.user,
+                order__status='delivered',
+                jersey_id__in=ids
+            ).values_list('jersey_id', flat=True))
+        context['purchased_ids'] = purchased
+    return context
+
 class JerseySerializer(serializers.ModelSerializer):
     player = PlayerSerializer()
     price = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -29,7 +61,7 @@ class JerseySerializer(serializers.ModelSerializer):
     average_rating = serializers.SerializerMethodField()
     user_has_purchased = serializers.SerializerMethodField()
     is_low_stock = serializers.BooleanField(read_only=True)
-    sale_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, required=False)
+    sale_price = serializers.SerializerMethodField()
     on_sale = serializers.SerializerMethodField()
     images = JerseyImageSerializer(many=True, read_only=True)
     primary_image = serializers.SerializerMethodField()
@@ -43,17 +75,34 @@ class JerseySerializer(serializers.ModelSerializer):
             'on_sale'
         ]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Sparse fieldsets: context['fields'] keeps only the named fields
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['price'] = float(instance.price)
-        if instance.sale_price is not None:
-            representation['sale_price'] = float(instance.sale_price)
+        if 'price' in representation:
+            representation['price'] = money.as_float(instance.price)
         return representation
 
+    def get_sale_price(self, obj):
+        sale_prices = self.context.get('sale_prices')
+        if sale_prices is not None and obj.id in sale_prices:
+            sale_price = sale_prices[obj.id]
+            return money.as_float(sale_price)
+        return obj.sale_price
+
     def get_currency(self, obj):
         return CURRENCY
 
     def get_average_rating(self, obj):
+        ratings = self.context.get('ratings')
+        if ratings is not None:
+            return ratings.get(obj.id, 0)
         try:
             return Review.objects.filter(jersey=obj).aggregate(
                 avg_rating=models.Avg('rating')
@@ -65,21 +114,24 @@ class JerseySerializer(serializers.ModelSerializer):
     def get_user_has_purchased(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            try:
-                return Order.objects.filter(
-                    user=request.user,
-                    status='delivered',
-                    items__contains=[{'jersey_id': obj.id}]  # Check in the JSON field
-                ).exists()
-            except Exception as e:
-                print(f"Error checking purchase status: {e}")
-                return False
+            purchased_ids = self.context.get('purchased_ids')
+            if purchased_ids is not None:
+                return obj.id in purchased_ids
+            return OrderItem.objects.filter(
+                order__user=request.user,
+                order__status='delivered',
+                jersey=obj
+            ).exists()
         return False
 
     def get_on_sale(self, obj):
-        return obj.sale_price is not None
+        return self.get_sale_price(obj) is not None
 
     def get_primary_image(self, obj):
+        if 'images' in getattr(obj, '_prefetched_objects_cache', {}):
+            images = list(obj.images.all())
+            image = next((image for image in images if image.is_primary), images[0] if images else None)
+            return image.image.url if image else None
         try:
             return obj.primary_image
         except Exception:
@@ -150,15 +202,20 @@ class AdminOrderSerializer(serializers.ModelSerializer):
 
 class ReviewSerializer(serializers.ModelSerializer):
     user_name = serializers.SerializerMethodField()
+    is_users_review = serializers.SerializerMethodField()
 
     class Meta:
         model = Review
-        fields = ['id', 'user_name', 'rating', 'comment', 'created_at', 'jersey']
-        read_only_fields = ['user_name', 'created_at', 'jersey']
+        fields = ['id', 'user_name', 'rating', 'comment', 'helpful_count', 'created_at', 'jersey', 'is_users_review']
+        read_only_fields = ['user_name', 'helpful_count', 'created_at', 'jersey']
 
     def get_user_name(self, obj):
         return obj.user.username
 
+    def get_is_users_review(self, obj):
+        request = self.context.get('request')
+        return bool(request and request.user.is_authenticated and obj.user_id == request.user.id)
+
     def validate_rating(self, value):
         if not isinstance(value, int) or value < 1 or value > 5:
             raise serializers.ValidationError("Rating must be an integer between 1 and 5")
@@ -170,10 +227,44 @@ class AdminJerseySerializer(serializers.ModelSerializer):
         fields = ['id', 'stock', 'low_stock_threshold']
 
 class SaleSerializer(serializers.ModelSerializer):
+    # Either a list or the comma-separated target_value the admin UI sends
+    targets = serializers.ListField(child=serializers.CharField(), required=False, write_only=True)
+    target_value = serializers.CharField(required=False, allow_blank=True)
+
     class Meta:
         model = Sale
         fields = '__all__'
 
+    def validate(self, data):
+        sale_type = data.get('sale_type', getattr(self.instance, 'sale_type', None))
+        if 'targets' in data or 'target_value' in data or 'sale_type' in data:
+            values = data.pop('targets', None)
+            if values is None:
+                values = data.get('target_value', getattr(self.instance, 'target_value', ''))
+            try:
+                data['targets'] = pricing.parse_targets(sale_type, values)
+            except ValueError as e:
+                raise serializers.ValidationError({'targets': str(e)})
+            if sale_type != 'ALL' and not data['targets']:
+                raise serializers.ValidationError({'targets': 'At least one target is required'})
+        return data
+
+    def create(self, validated_data):
+        targets = validated_data.pop('targets', [])
+        # One transaction, so the sale is repriced once, with its targets
+        with transaction.atomic():
+            sale = super().create(validated_data)
+            pricing.set_sale_targets(sale, targets)
+        return sale
+
+    def update(self, instance, validated_data):
+        targets = validated_data.pop('targets', None)
+        with transaction.atomic():
+            sale = super().update(instance, validated_data)
+            if targets is not None:
+                pricing.set_sale_targets(sale, targets)
+        return sale
+
 class ReturnSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField()
     order_details = OrderSerializer(source='order', read_only=True)
@@ -186,3 +277,13 @@ class ReturnSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    created_by = serializers.StringRelatedField()
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'status', 'created_by', 'total_rows', 'processed_rows', 'jerseys_created',
+            'images_created', 'errors', 'created_at', 'started_at', 'finished_at'
+        ]
@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget, forget_user
+from . import changes, dashboard, price_schedule, reviews, tasks
+from .models import Jersey, Order, OrderItem, Return, Review, Sale, SaleTarget
+from .pricing import bump_pricing_version
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=SaleTarget)
+@receiver(post_delete, sender=SaleTarget)
+@receiver(post_delete, sender=Jersey)
+def invalidate_prices(sender, **kwargs):
+    bump_pricing_version()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # Password changes, deactivation and permission changes must not be
+    # served from a stale cached user
+    forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    forget(instance.key)
+
+
+@receiver(post_init, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    # What the histogram currently counts for this review, if it is saved
+    instance._counted_rating = (instance.jersey_id, instance.rating) if instance.pk else None
+
+
+@receiver(post_save, sender=Review)
+def add_review_rating(sender, instance, **kwargs):
+    counted = instance._counted_rating
+    current = (instance.jersey_id, instance.rating)
+    if counted == current:
+        return
+    if counted and counted[0] == instance.jersey_id:
+        reviews.record(instance.jersey_id, added=instance.rating, removed=counted[1])
+    else:
+        if counted:
+            reviews.record(counted[0], removed=counted[1])
+        reviews.record(instance.jersey_id, added=instance.rating)
+    instance._counted_rating = current
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    reviews.record(instance.jersey_id, removed=instance.rating)
+    # The review row is gone, so readers of the feed could no longer map it
+    # to its jersey; log the jersey's rating change directly
+    changes.record(Jersey, [instance.jersey_id])
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_dashboard(sender, instance, **kwargs):
+    dashboard.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def reprice_sale(sender, instance, **kwargs):
+    price_schedule.reprice_on_commit(sale_id=instance.id)
+
+
+@receiver(post_save, sender=Jersey)
+def reprice_jersey(sender, instance, **kwargs):
+    # Bumps the pricing version only if the jersey's snapshot changed, so
+    # stock-only saves leave cached carts and dashboards alone
+    price_schedule.reprice_on_commit([instance.id])
+
+
+@receiver(post_save, sender=Jersey)
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=Return)
+def log_save(sender, instance, created, **kwargs):
+    changes.record(sender, [instance.pk], 'create' if created else 'update')
+
+
+@receiver(post_delete, sender=Jersey)
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=Return)
+def log_delete(sender, instance, **kwargs):
+    changes.record(sender, [instance.pk], 'delete')
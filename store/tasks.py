@@ -0,0 +1,93 @@
+"""Side effects that run on the task queue instead of the request path."""
+import logging
+
+from django.conf import settings
+from django.core.mail import mail_admins, send_mail
+from django.db.models import F
+
+from . import analytics, importer, price_schedule, pricing
+from .constants import CURRENCY
+from .models import ImportJob, Jersey, Order
+from .queue import enqueue_many, task
+
+logger = logging.getLogger(__name__)
+
+
+@task('orders.send_confirmation')
+def send_order_confirmation(order_id):
+    order = Order.objects.select_related('user').get(id=order_id)
+    lines = [
+        f"{item.quantity}x {item.jersey.player.name} ({item.size}) - {CURRENCY['symbol']}{item.price}"
+        for item in order.items.select_related('jersey__player')
+    ]
+    message = "\n".join([
+        f"Thanks for your order #{order.id}!",
+        "",
+        *lines,
+        "",
+        f"Total: {CURRENCY['symbol']}{order.total_price}",
+    ])
+    if order.user.email:
+        send_mail(f"Order #{order.id} confirmed", message, settings.DEFAULT_FROM_EMAIL, [order.user.email])
+    logger.info(f"Sent confirmation for order #{order.id}")
+
+
+@task('orders.status_changed')
+def notify_order_status(order_id, status):
+    order = Order.objects.select_related('user').get(id=order_id)
+    if order.user.email:
+        send_mail(
+            f"Order #{order.id} is now {order.get_status_display().lower()}",
+            f"Your order #{order.id} status changed to {order.get_status_display()}.",
+            settings.DEFAULT_FROM_EMAIL,
+            [order.user.email]
+        )
+    logger.info(f"Order #{order.id} status changed to {status}")
+
+
+@task('stock.check_alerts')
+def check_stock_alerts(jersey_ids):
+    low_stock = list(Jersey.objects.filter(
+        id__in=jersey_ids,
+        stock__lte=F('low_stock_threshold')
+    ).select_related('player').values_list('id', 'player__name', 'stock'))
+    if not low_stock:
+        return
+    message = "\n".join(
+        f"Jersey {jersey_id} ({player_name}): {stock} left"
+        for jersey_id, player_name, stock in low_stock
+    )
+    logger.warning(f"Low stock after order:\n{message}")
+    mail_admins("Low stock alert", message, fail_silently=True)
+
+
+@task('pricing.sales_changed')
+def reprice_sales(sale_ids):
+    changes = price_schedule.record_sale_change(sale_ids)
+    pricing.bump_pricing_version()
+    logger.info(f"Sales {', '.join(map(str, sale_ids))} changed; repriced {len(changes)} jerseys")
+
+
+@task('analytics.rebuild', max_attempts=1)
+def rebuild_analytics():
+    manifest = analytics.build()
+    logger.info(f"Analytics snapshot rebuilt with {manifest['rows']} order lines")
+
+
+@task('imports.run', max_attempts=1)
+def run_import(job_id):
+    job = importer.run(ImportJob.objects.get(id=job_id))
+    logger.info(f"Import #{job.id} {job.status}: {job.jerseys_created} jerseys, {job.images_created} images")
+
+
+def order_placed(order):
+    """Queue everything that should happen after checkout."""
+    send_order_confirmation.delay(order_id=order.id)
+    check_stock_alerts.delay(jersey_ids=list(order.items.values_list('jersey_id', flat=True).distinct()))
+
+
+def orders_status_changed(order_ids, status):
+    """Queue a status email per order, so one failure retries only its own."""
+    enqueue_many(notify_order_status.task_name, [
+        {'order_id': order_id, 'status': status} for order_id in order_ids
+    ])
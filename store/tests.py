@@ -1,3 +1,646 @@
-from django.test import TestCase
+import random
+import tempfile
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from . import analytics, changes, idempotency, importer, inventory, money, passwords, price_schedule, pricing, reviews, tasks
+from .authentication import CachedUser
+from .models import ChangeCursor, ChangeLog, Customization, IdempotencyKey, ImportJob, Jersey, JerseyPrice, JerseyStock, Order, OrderItem, Player, Return, Review, Sale, StockReservation, Task, Team, Wishlist
+
+CENT = Decimal('0.01')
+
+
+def make_jersey(name='Player', team='Liverpool', league='Premier League', price='90.00', stock=100):
+    team, _ = Team.objects.get_or_create(name=team, league=league, defaults={'logo': 'logo.png'})
+    player = Player.objects.create(name=name, team=team)
+    return Jersey.objects.create(player=player, price=Decimal(price), stock=stock)
+
+
+def make_order(user, lines, status='processing'):
+    """An order of (jersey, quantity) lines at the jerseys' prices."""
+    order = Order.objects.create(user=user, total_price=0, status=status)
+    for jersey, quantity in lines:
+        OrderItem.objects.create(order=order, jersey=jersey, quantity=quantity, price=jersey.price, size='M')
+    return order
+
+
+def random_price(rng):
+    return Decimal(rng.randint(0, 2000000)) / 100
+
+
+def random_sale(rng, sale_id, stacking=None):
+    discount_type = rng.choice(['PERCENTAGE', 'FLAT'])
+    if discount_type == 'PERCENTAGE':
+        value = Decimal(rng.randint(0, 10000)) / 100
+    else:
+        value = Decimal(rng.randint(0, 500000)) / 100
+    return Sale(
+        id=sale_id,
+        sale_type='ALL',
+        discount_type=discount_type,
+        discount_value=value,
+        stacking=stacking or rng.choice(['best', 'exclusive', 'stackable']),
+        priority=rng.randint(0, 3)
+    )
+
+
+def decimal_discount(price, discount_type, value):
+    """The discount done in Decimal, rounded half up to the cent."""
+    if discount_type == 'FLAT':
+        discounted = price - value
+    else:
+        discounted = (price * (100 - value) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+    return max(discounted, Decimal('0.00'))
+
+
+def decimal_apply(price, sales):
+    for sale in sales:
+        price = decimal_discount(price, sale.discount_type, sale.discount_value)
+    return price
+
+
+class MoneyTests(SimpleTestCase):
+    def test_minor_round_trip(self):
+        rng = random.Random(0)
+        for _ in range(1000):
+            price = random_price(rng)
+            self.assertEqual(money.from_minor(money.to_minor(price)), price)
+        self.assertEqual(money.to_minor(Decimal('0.005')), 1)
+        self.assertEqual(money.to_minor(19.99), 1999)
+
+    def test_discount_matches_decimal(self):
+        rng = random.Random(1)
+        for _ in range(5000):
+            price = random_price(rng)
+            sale = random_sale(rng, 1)
+            expected = decimal_discount(price, sale.discount_type, sale.discount_value)
+            actual = money.discount(money.to_minor(price), sale.discount_type, money.to_minor(sale.discount_value))
+            self.assertEqual(money.from_minor(actual), expected, (price, sale.discount_type, sale.discount_value))
+
+    def test_discount_many_matches_discount(self):
+        rng = random.Random(2)
+        for _ in range(200):
+            prices = [money.to_minor(random_price(rng)) for _ in range(50)]
+            sale = random_sale(rng, 1)
+            value = money.to_minor(sale.discount_value)
+            self.assertEqual(
+                money.discount_many(prices, sale.discount_type, value),
+                [money.discount(price, sale.discount_type, value) for price in prices]
+            )
+
+    def test_discount_never_negative(self):
+        self.assertEqual(money.discount(500, 'FLAT', 900), 0)
+        self.assertEqual(money.discount(500, 'PERCENTAGE', 12000), 0)
+        self.assertEqual(money.discount_many([500, 100], 'PERCENTAGE', 10000), [0, 0])
+
+    def test_divide_rounds_half_up(self):
+        self.assertEqual(money.divide(5, 2), 3)
+        self.assertEqual(money.divide(-5, 2), -3)
+        self.assertEqual(money.divide(4, 3), 1)
+        self.assertEqual(money.divide(7, 0), 0)
+
+
+class ResolvePriceTests(SimpleTestCase):
+    def resolve(self, price, sales):
+        minor, applied = pricing.resolve_minor(money.to_minor(price), sales)
+        return money.from_minor(minor), applied
+
+    def test_matches_decimal_for_applied_sales(self):
+        rng = random.Random(3)
+        for _ in range(2000):
+            price = random_price(rng)
+            sales = [random_sale(rng, sale_id) for sale_id in range(1, rng.randint(1, 6))]
+            resolved, applied = self.resolve(price, sales)
+            self.assertEqual(resolved, decimal_apply(price, applied))
+
+    def test_stacking_rules(self):
+        rng = random.Random(4)
+        for _ in range(2000):
+            price = random_price(rng)
+            sales = [random_sale(rng, sale_id) for sale_id in range(1, rng.randint(2, 7))]
+            _, applied = self.resolve(price, sales)
+            exclusive = [sale for sale in sales if sale.stacking == 'exclusive']
+            best = [sale for sale in sales if sale.stacking == 'best']
+            stackable = [sale for sale in sales if sale.stacking == 'stackable']
+
+            if exclusive:
+                # The highest-priority exclusive sale, then the lowest price, then the lowest id
+                top = max(sale.priority for sale in exclusive)
+                candidates = [sale for sale in exclusive if sale.priority == top]
+                expected = min(candidates, key=lambda sale: (decimal_apply(price, [sale]), sale.id))
+                self.assertEqual(applied, [expected])
+                continue
+
+            expected = []
+            if best:
+                # The lowest price, then the highest priority, then the lowest id
+                expected.append(min(best, key=lambda sale: (decimal_apply(price, [sale]), -sale.priority, sale.id)))
+            expected += sorted(stackable, key=lambda sale: (-sale.priority, sale.id))
+            self.assertEqual(applied, expected)
+
+    def test_exclusive_ties_break_on_price_then_id(self):
+        a = Sale(id=1, discount_type='FLAT', discount_value=Decimal('5'), stacking='exclusive', priority=1)
+        b = Sale(id=2, discount_type='FLAT', discount_value=Decimal('10'), stacking='exclusive', priority=1)
+        c = Sale(id=3, discount_type='PERCENTAGE', discount_value=Decimal('10'), stacking='exclusive', priority=1)
+        low = Sale(id=4, discount_type='FLAT', discount_value=Decimal('50'), stacking='exclusive', priority=0)
+        self.assertEqual(self.resolve(Decimal('100'), [a, b, c, low]), (Decimal('90.00'), [b]))
+        self.assertEqual(self.resolve(Decimal('100'), [c, b, low])[1], [b])
+
+    def test_best_ties_break_on_priority_then_id(self):
+        a = Sale(id=1, discount_type='FLAT', discount_value=Decimal('10'), stacking='best', priority=0)
+        b = Sale(id=2, discount_type='PERCENTAGE', discount_value=Decimal('10'), stacking='best', priority=2)
+        c = Sale(id=3, discount_type='FLAT', discount_value=Decimal('10'), stacking='best', priority=2)
+        self.assertEqual(self.resolve(Decimal('100'), [c, a, b]), (Decimal('90.00'), [b]))
+        self.assertEqual(self.resolve(Decimal('100'), [a, c])[1], [c])
+
+    def test_stackable_applies_after_best_in_priority_order(self):
+        best = Sale(id=1, discount_type='PERCENTAGE', discount_value=Decimal('15'), stacking='best', priority=0)
+        flat = Sale(id=2, discount_type='FLAT', discount_value=Decimal('5'), stacking='stackable', priority=0)
+        percent = Sale(id=3, discount_type='PERCENTAGE', discount_value=Decimal('10'), stacking='stackable', priority=1)
+        price, applied = self.resolve(Decimal('50'), [flat, percent, best])
+        self.assertEqual(applied, [best, percent, flat])
+        # 50 -15% = 42.50, -10% = 38.25, -5 = 33.25
+        self.assertEqual(price, Decimal('33.25'))
+
+    def test_unsaved_sale_loses_ties(self):
+        saved = Sale(id=7, discount_type='FLAT', discount_value=Decimal('10'), stacking='best', priority=0)
+        preview = Sale(discount_type='FLAT', discount_value=Decimal('10'), stacking='best', priority=0)
+        self.assertEqual(self.resolve(Decimal('100'), [preview, saved])[1], [saved])
+
+    def test_no_sales(self):
+        self.assertEqual(self.resolve(Decimal('89.99'), []), (Decimal('89.99'), []))
+
+
+@override_settings(CHANGE_FEED_GAP_TIMEOUT=60)
+class ChangeFeedTests(TestCase):
+    def log(self, object_id, **fields):
+        return ChangeLog.objects.create(
+            model='jersey', object_id=object_id, action='update', changed_at=timezone.now(), **fields
+        )
+
+    def test_reads_stop_at_an_open_gap_until_it_fills(self):
+        first, held, last = self.log(1), self.log(2), self.log(3)
+        held_id = held.id
+        held.delete()  # a writer that has not committed yet
+        rows, position = changes.fetch(0, ['jersey'])
+        self.assertEqual([row['id'] for row in rows], [first.id])
+        self.assertEqual(position, first.id)
+
+        self.log(2, id=held_id)
+        rows, position = changes.fetch(position, ['jersey'])
+        self.assertEqual([row['id'] for row in rows], [held_id, last.id])
+
+    def test_gap_is_passed_once_it_has_timed_out(self):
+        first, rolled_back, last = self.log(1), self.log(2), self.log(3)
+        rolled_back.delete()
+        ChangeLog.objects.filter(id=last.id).update(changed_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(changes.frontier(0), last.id)
+
+    def test_consumer_persists_its_frontier(self):
+        seen = []
+        changes.consumer('test', models=['jersey'])(seen.extend)
+        self.addCleanup(changes._consumers.pop, 'test')
+        rows = [self.log(object_id) for object_id in range(3)]
+        self.assertEqual(changes.consume('test'), 3)
+        cursor = ChangeCursor.objects.get(name='test')
+        self.assertEqual((cursor.position, cursor.frontier), (rows[-1].id, rows[-1].id))
+
+        with mock.patch.object(changes, 'frontier', wraps=changes.frontier) as frontier:
+            changes.consume('test')
+        frontier.assert_called_once_with(rows[-1].id, rows[-1].id)
+
+
+class AnalyticsConsumerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(ANALYTICS_DIR=directory.name, CHANGE_FEED_GAP_TIMEOUT=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user('buyer')
+        self.jersey = make_jersey(price='50.00')
+
+    def test_order_changes_update_only_their_lines(self):
+        kept = make_order(self.user, [(self.jersey, 1)])
+        changed = make_order(self.user, [(self.jersey, 2)])
+        analytics.build()
+        changes.consume('analytics')  # the orders above are already in the build
+
+        changed.status = 'cancelled'
+        changed.save()
+        added = make_order(self.user, [(make_jersey('New', team='Arsenal', price='20.00'), 3)])
+        with mock.patch.object(analytics, 'build', wraps=analytics.build) as build:
+            changes.consume('analytics')
+        build.assert_not_called()
+
+        snapshot = analytics.current()
+        self.assertEqual(sorted(snapshot.column('order')), sorted([kept.id, changed.id, added.id]))
+        # The snapshot that was current before the swap stays for readers still loading it
+        def builds():
+            return sorted(path.name for path in analytics.snapshot_dir().iterdir() if path.is_dir())
+
+        self.assertEqual(builds()[-1], snapshot.path.name)
+        analytics.build()
+        self.assertEqual(builds()[0], snapshot.path.name)
+        self.assertEqual(len(builds()), 2)
+        totals = analytics.aggregate(snapshot, 'team')
+        self.assertEqual(
+            {snapshot.label('team', key): value for key, value in totals.items()},
+            {'Liverpool': (1, 5000, 0), 'Arsenal': (3, 6000, 0)}
+        )
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_total_is_priced_on_the_server(self):
+        first, second = make_jersey(price='19.99'), make_jersey('Other', price='45.50')
+        response = self.client.post('/api/checkout/', {
+            'items': [
+                {'jersey_id': first.id, 'quantity': 3, 'size': 'M'},
+                {'jersey_id': second.id, 'quantity': 1, 'size': 'L'},
+            ],
+            'total_price': '0.01'
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.get().total_price, Decimal('105.47'))
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.body = {'items': [{'jersey_id': make_jersey().id, 'quantity': 1, 'size': 'M'}]}
+
+    def checkout(self):
+        return self.client.post('/api/checkout/', self.body, format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+
+    def test_retry_replays_the_first_response(self):
+        first, second = self.checkout(), self.checkout()
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second[idempotency.REPLAY_HEADER], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_unexpected_failure_is_not_replayed(self):
+        with mock.patch.object(tasks, 'order_placed', side_effect=RuntimeError('mail server down')):
+            self.assertEqual(self.checkout().status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(idempotency.REPLAY_HEADER, response)
+
+    def test_abandoned_claim_is_taken_over(self):
+        self.checkout()
+        IdempotencyKey.objects.update(completed=False, created_at=timezone.now() - timedelta(minutes=5))
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(idempotency.REPLAY_HEADER, response)
+        self.assertTrue(IdempotencyKey.objects.get().completed)
+
+
+class PriceSnapshotTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jersey = make_jersey(price='80.00')
+
+    def test_stock_only_save_keeps_the_pricing_version(self):
+        version = pricing.pricing_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jersey.stock = 3
+            self.jersey.save()
+        self.assertEqual(pricing.pricing_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jersey.price = Decimal('70.00')
+            self.jersey.save()
+        self.assertNotEqual(pricing.pricing_version(), version)
+        self.assertEqual(JerseyPrice.objects.get(jersey=self.jersey).effective_price, Decimal('70.00'))
+
+    def test_sale_changes_are_repriced_on_the_worker(self):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sale.objects.create(
+                sale_type='ALL', discount_type='PERCENTAGE', discount_value=Decimal('25'),
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1), is_active=True
+            )
+        self.assertEqual(JerseyPrice.objects.get(jersey=self.jersey).effective_price, Decimal('80.00'))
+        queued = Task.objects.get(name='pricing.sales_changed')
+        self.assertEqual(queued.payload, {'sale_ids': [sale.id]})
+
+        tasks.reprice_sales(**queued.payload)
+        self.assertEqual(JerseyPrice.objects.get(jersey=self.jersey).effective_price, Decimal('60.00'))
+
+    def test_cards_and_sparse_fields_agree_on_sale_price(self):
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sale.objects.create(
+                sale_type='ALL', discount_type='FLAT', discount_value=Decimal('15'),
+                start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1), is_active=True
+            )
+
+        def listed():
+            card = self.client.get('/api/jerseys/?view=card').json()[0]
+            sparse = self.client.get('/api/jerseys/?fields=id,sale_price,on_sale').json()
+            sparse = sparse['results'][0] if isinstance(sparse, dict) else sparse[0]
+            return card['sale_price'], sparse['sale_price'], sparse['on_sale']
+
+        # Until the worker reprices, both read the snapshot taken before the sale
+        self.assertEqual(listed(), (None, None, False))
+        tasks.reprice_sales(sale_ids=[sale.id])
+        self.assertEqual(listed(), (65.0, 65.0, True))
+
+    def test_catalog_reads_do_not_reprice(self):
+        with mock.patch.object(price_schedule, 'run') as run, mock.patch.object(price_schedule, 'refresh') as refresh:
+            self.assertEqual(self.client.get('/api/jerseys/').status_code, 200)
+            self.assertEqual(self.client.get('/api/metadata/').status_code, 200)
+        run.assert_not_called()
+        refresh.assert_not_called()
+
+
+class ImporterTests(TestCase):
+    def run_import(self, manifest):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'manifest.csv'
+        path.write_text('player,team,league,price,stock,sizes,images\n' + manifest)
+        job = ImportJob.objects.create(manifest=str(path), images=directory.name)
+        return importer.run(job, batch_size=2, workers=1)
+
+    def test_rows_are_imported_priced_and_logged(self):
+        job = self.run_import(
+            'Bukayo Saka,Arsenal,Premier League,89.99,,M:10;L:4,\n'
+            'Declan Rice,Arsenal,Premier League,79.99,5,,\n'
+            'Bad Price,Arsenal,Premier League,nan,,,\n'
+        )
+        self.assertEqual((job.status, job.jerseys_created), ('done', 2))
+        self.assertEqual([error['row'] for error in job.errors], [3])
+        saka = Jersey.objects.get(player__name='Bukayo Saka')
+        self.assertEqual(saka.stock, 14)
+        self.assertEqual(dict(JerseyStock.objects.filter(jersey=saka).values_list('size', 'quantity')), {'M': 10, 'L': 4})
+        ids = set(Jersey.objects.values_list('id', flat=True))
+        self.assertEqual(set(JerseyPrice.objects.values_list('jersey_id', flat=True)), ids)
+        self.assertEqual(set(ChangeLog.objects.filter(model='jersey').values_list('object_id', flat=True)), ids)
+
+    def test_failed_batch_leaves_nothing_behind(self):
+        with mock.patch.object(price_schedule, 'refresh', side_effect=RuntimeError('database went away')):
+            job = self.run_import('Bukayo Saka,Arsenal,Premier League,89.99,3,,\n')
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(Jersey.objects.exists())
+        self.assertFalse(ChangeLog.objects.filter(model='jersey').exists())
+
+
+class ReviewHistogramTests(TestCase):
+    def stars(self, jersey):
+        summary = reviews.summary(jersey.id)
+        return [summary['histogram'][str(rating)] for rating in range(1, 6)], summary['average']
+
+    def test_histogram_follows_create_rerate_and_delete(self):
+        jersey, other = make_jersey(), make_jersey('Other')
+        buyer, second = User.objects.create_user('buyer'), User.objects.create_user('second')
+        make_order(buyer, [(jersey, 1)])
+        client = APIClient()
+        client.force_authenticate(buyer)
+        response = client.post(f'/api/jerseys/{jersey.id}/reviews/', {'rating': 4, 'comment': 'Good'}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        Review.objects.create(user=second, jersey=jersey, rating=2, comment='Small')
+        self.assertEqual(self.stars(jersey), ([0, 1, 0, 1, 0], 3.0))
+
+        review = Review.objects.get(user=buyer)
+        review.rating = 5
+        review.save()
+        review.comment = 'Great'
+        review.save()
+        self.assertEqual(self.stars(jersey), ([0, 1, 0, 0, 1], 3.5))
+
+        review.jersey = other
+        review.save()
+        self.assertEqual(self.stars(jersey), ([0, 1, 0, 0, 0], 2.0))
+        self.assertEqual(self.stars(other), ([0, 0, 0, 0, 1], 5.0))
+
+        Review.objects.get(user=second).delete()
+        self.assertEqual(self.stars(jersey), ([0, 0, 0, 0, 0], 0))
+
+
+class OrderStatusTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user('buyer')
+        self.jersey = make_jersey()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+
+    def test_bulk_transition_skips_invalid_moves_and_queues_one_email_per_order(self):
+        shippable = [make_order(self.customer, [(self.jersey, 1)]) for _ in range(3)]
+        delivered = make_order(self.customer, [(self.jersey, 1)], status='delivered')
+        response = self.client.post('/api/admin/orders/bulk-status/', {
+            'order_ids': [order.id for order in shippable] + [delivered.id, 999],
+            'status': 'shipped'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [order.id for order in shippable])
+        self.assertEqual([row['id'] for row in response.data['skipped']], [delivered.id, 999])
+        self.assertEqual(Order.objects.get(id=delivered.id).status, 'delivered')
+
+        queued = Task.objects.filter(name=tasks.notify_order_status.task_name)
+        self.assertEqual(
+            sorted(task.payload['order_id'] for task in queued),
+            [order.id for order in shippable]
+        )
+        self.assertTrue(all(task.payload['status'] == 'shipped' for task in queued))
+
+    def test_customers_may_only_cancel(self):
+        order = make_order(self.customer, [(self.jersey, 1)])
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        url = f'/api/orders/{order.id}/status/'
+        self.assertEqual(client.patch(url, {'status': 'shipped'}, format='json').status_code, 403)
+        self.assertEqual(client.patch(url, {'status': 'cancelled'}, format='json').status_code, 200)
+        self.assertEqual(client.patch(url, {'status': 'processing'}, format='json').status_code, 403)
+        self.assertEqual(Order.objects.get(id=order.id).status, 'cancelled')
+
+
+class CachedUserTests(TestCase):
+    def test_foreign_keys_use_the_cached_id(self):
+        user = User.objects.create_user('buyer')
+        jersey = make_jersey()
+        cached = CachedUser({'id': user.id, 'is_active': True, 'is_staff': False})
+        with CaptureQueriesContext(connection) as queries:
+            order = Order.objects.create(user=cached, total_price=0, status='pending')
+            Wishlist.objects.get_or_create(user=cached, jersey=jersey)
+            self.assertEqual(list(Order.objects.filter(user=cached)), [order])
+            self.assertFalse(Customization.objects.filter(user=cached).exists())
+            self.assertTrue(order.user == cached and cached == user and user == cached)
+        self.assertFalse([query for query in queries if 'auth_user' in query['sql']])
+        self.assertEqual(cached.username, 'buyer')
+
+
+class AsyncEndpointTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+
+    def test_wishlist_is_newest_first(self):
+        user = User.objects.create_user('buyer')
+        token = Token.objects.create(user=user)
+        jerseys = [make_jersey(f'Player {number}') for number in range(3)]
+        for age, jersey in zip([5, 1, 3], jerseys):
+            Wishlist.objects.create(user=user, jersey=jersey)
+            Wishlist.objects.filter(jersey=jersey).update(created_at=timezone.now() - timedelta(minutes=age))
+        response = self.client.get('/api/async/wishlist/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual([row['id'] for row in response.json()], [jerseys[1].id, jerseys[2].id, jerseys[0].id])
+
+    def test_async_and_sync_reads_share_the_anonymous_limit(self):
+        with mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {'anon': '3/min'}):
+            self.assertEqual(self.client.get('/api/metadata/').status_code, 200)
+            self.assertEqual(self.client.get('/api/async/metadata/').status_code, 200)
+            self.assertEqual(self.client.get('/api/async/metadata/').status_code, 200)
+            refused = self.client.get('/api/async/metadata/')
+            self.assertEqual(refused.status_code, 429)
+            self.assertGreater(int(refused['Retry-After']), 0)
+            self.assertEqual(self.client.get('/api/metadata/').status_code, 429)
+
+
+class PasswordTests(TestCase):
+    def setUp(self):
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+
+    def test_signup_then_login(self):
+        signup = self.client.post('/api/signup/', {'username': 'buyer', 'password': 's3cret-pass'})
+        self.assertEqual(signup.status_code, 200)
+        user = User.objects.get(username='buyer')
+        self.assertTrue(user.check_password('s3cret-pass'))
+        self.assertEqual(passwords.authenticate('buyer', 's3cret-pass'), user)
+        self.assertIsNone(passwords.authenticate('buyer', 'wrong'))
+        login = self.client.post('/api/login/', {'username': 'buyer', 'password': 's3cret-pass'})
+        self.assertEqual(login.status_code, 200)
+        self.assertEqual(login.json()['token'], signup.json()['token'])
+
+    def test_busy_pool_refuses_instead_of_queueing(self):
+        with mock.patch.object(passwords, '_slots') as slots:
+            slots.acquire.return_value = False
+            response = self.client.post('/api/login/', {'username': 'buyer', 'password': 'x'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class InventoryTests(TestCase):
+    def setUp(self):
+        self.jersey = make_jersey()
+        inventory.set_size_stock(self.jersey, {'M': 3, 'L': 1})
+        self.buyer = User.objects.create_user('buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def stock(self, size):
+        return JerseyStock.objects.values_list('quantity', 'reserved').get(jersey=self.jersey, size=size)
+
+    def test_holds_block_other_buyers_until_checkout_or_expiry(self):
+        items = [{'jersey_id': self.jersey.id, 'size': 'M', 'quantity': 2}]
+        self.assertEqual(self.client.post('/api/checkout/reserve/', {'items': items}, format='json').status_code, 201)
+        self.assertEqual(self.stock('M'), (3, 2))
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        refused = other.post('/api/checkout/reserve/', {'items': items}, format='json')
+        self.assertEqual((refused.status_code, refused.data['size']), (409, 'M'))
+
+        self.assertEqual(self.client.post('/api/checkout/', {'items': items}, format='json').status_code, 201)
+        self.assertEqual(self.stock('M'), (1, 0))
+        self.assertEqual(Jersey.objects.get(id=self.jersey.id).stock, 2)
+        self.assertEqual(StockReservation.objects.get().status, 'converted')
+
+    def test_expired_holds_are_released(self):
+        inventory.reserve_items(self.buyer, [{'jersey_id': self.jersey.id, 'size': 'L', 'quantity': 1}])
+        self.assertEqual(inventory.release_expired(timezone.now() + inventory.reservation_ttl() * 2), 1)
+        self.assertEqual(self.stock('L'), (1, 0))
+
+    def test_unknown_sizes_and_overselling_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'Invalid size'):
+            inventory.reserve_items(self.buyer, [{'jersey_id': self.jersey.id, 'size': 'XXXXL', 'quantity': 1}])
+        response = self.client.post('/api/checkout/', {
+            'items': [{'jersey_id': self.jersey.id, 'size': 'L', 'quantity': 2}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock('L'), (1, 0))
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('buyer'))
+        self.jersey = make_jersey(price='49.99')
+        now = timezone.now()
+        Sale.objects.create(
+            sale_type='ALL', discount_type='PERCENTAGE', discount_value=Decimal('10'),
+            start_date=now - timedelta(hours=1), end_date=now + timedelta(hours=1), is_active=True
+        )
+
+    def add(self, **item):
+        return self.client.post('/api/cart/items/', {'jersey_id': self.jersey.id, **item}, format='json')
+
+    def test_totals_and_checkout(self):
+        self.assertEqual(self.add(size='M', quantity=2).status_code, 201)
+        summary = self.add(size='L', quantity=1).data
+        # 49.99 - 10% = 44.991, rounded half up to 44.99 per unit
+        self.assertEqual(
+            (summary['item_count'], summary['subtotal'], summary['discount'], summary['total']),
+            (3, Decimal('149.97'), Decimal('15.00'), Decimal('134.97'))
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/checkout/', {}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Order.objects.get().total_price, Decimal('134.97'))
+        self.assertEqual(self.client.get('/api/cart/').data['items'], [])
+
+    def test_invalid_lines_are_rejected(self):
+        self.assertEqual(self.add(size='XXXXL').status_code, 400)
+        self.assertEqual(self.add(type='signed').status_code, 400)
+        self.assertEqual(self.client.get('/api/cart/').data['items'], [])
+
+
+class ReturnTests(TestCase):
+    def setUp(self):
+        self.jersey = make_jersey()
+        inventory.set_size_stock(self.jersey, {'M': 5})
+        self.customer = User.objects.create_user('buyer')
+        self.staff = APIClient()
+        self.staff.force_authenticate(User.objects.create_user('staff', is_staff=True))
+
+    def request_return(self):
+        order = make_order(self.customer, [(self.jersey, 2)], status='delivered')
+        return Return.objects.create(order=order, user=self.customer, reason='Too small')
+
+    def test_approved_returns_restock_and_rejected_do_not(self):
+        approved, rejected = self.request_return(), self.request_return()
+        Order.objects.filter(id__in=[approved.order_id, rejected.order_id]).update(status='return_pending')
+
+        response = self.staff.post('/api/returns/batch/', {'return_ids': [approved.id], 'action': 'approve'}, format='json')
+        self.assertEqual(response.data['processed'], [approved.id])
+        self.staff.post('/api/returns/batch/', {'return_ids': [rejected.id], 'action': 'reject'}, format='json')
+
+        self.assertEqual(JerseyStock.objects.get(jersey=self.jersey, size='M').quantity, 7)
+        self.assertEqual(Order.objects.get(id=approved.order_id).status, 'return_approved')
+        self.assertEqual(Order.objects.get(id=rejected.order_id).status, 'return_rejected')
+
+        again = self.staff.post('/api/returns/batch/', {'return_ids': [approved.id], 'action': 'approve'}, format='json')
+        self.assertEqual(again.data['processed'], [])
+        self.assertEqual(JerseyStock.objects.get(jersey=self.jersey, size='M').quantity, 7)
@@ -0,0 +1,87 @@
+"""Sliding-window rate limits kept in a shared cache.
+
+DRF's stock throttles store a list of request timestamps per client and
+rewrite it on every check. These keep two integer counters per client (this
+window and the previous one) and weight the previous count by how much of it
+still overlaps the sliding window, so each check is O(1) and works in any
+cache that supports ``incr``. Point ``THROTTLE_CACHE`` at a shared backend
+(Redis) when running more than one worker; locmem is the local stand-in.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = time.time()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current = counts.get(current_key, 0)
+        self.previous = counts.get(previous_key, 0)
+        weight = 1 - self.elapsed / self.duration
+        if self.previous * weight + self.current >= self.num_requests:
+            return False
+
+        # add() is a no-op when the counter exists; incr() is atomic in shared caches
+        if not self.cache.add(current_key, 1, self.duration * 2):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, self.duration * 2)
+        return True
+
+    def wait(self):
+        """Seconds until the weighted count drops below the limit again."""
+        if self.current >= self.num_requests:
+            # Has to wait for the next window, where this window's count decays
+            decay = 1 - self.num_requests / max(self.current, 1)
+            return (self.duration - self.elapsed) + self.duration * max(decay, 0)
+        if not self.previous:
+            return self.duration - self.elapsed
+        fraction = 1 - (self.num_requests - self.current) / self.previous
+        return max(math.ceil(fraction * self.duration - self.elapsed), 1)
+
+
+class AnonThrottle(SlidingWindowThrottle, AnonRateThrottle):
+    pass
+
+
+class UserThrottle(SlidingWindowThrottle, UserRateThrottle):
+    pass
+
+
+class ScopedThrottle(SlidingWindowThrottle, ScopedRateThrottle):
+    """Per-endpoint limits, using the view's ``throttle_scope``."""
+    default_scope = None
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None) or self.default_scope
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+
+class LoginThrottle(ScopedThrottle):
+    """Scoped 'login' limit for function views, which cannot set throttle_scope."""
+    default_scope = 'login'
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import TeamViewSet, PlayerViewSet, JerseyViewSet, CustomizationViewSet, login_user, signup_user, dashboard_view, filter_metadata, SaleViewSet
 from .views import CheckoutView, UserOrderView, AdminOrderView, AdminDashboardView, RecommendedJerseysView, WishlistView, FilterMetadataView, OrderViewSet, JerseyStockView
 from . import views
+from . import async_views
 
 router = DefaultRouter()
 router.register('jerseys', JerseyViewSet, basename='jersey')
@@ -14,6 +15,7 @@ router.register(r'admin/sales', SaleViewSet, basename='admin-sales')
 
 urlpatterns = [
     path('jerseys/recommendations/', RecommendedJerseysView.as_view(), name='recommended-jerseys'),
+    path('jerseys/availability/', views.JerseyAvailabilityView.as_view(), name='jersey-availability'),
     path('metadata/', FilterMetadataView.as_view(), name='filter-metadata'),
     path('dashboard/', dashboard_view, name='dashboard'),
     path('', include(router.urls)),
@@ -21,6 +23,13 @@ urlpatterns = [
 
 urlpatterns += [
     path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('checkout/reserve/', views.CheckoutReservationView.as_view(), name='checkout-reserve'),
+]
+
+urlpatterns += [
+    path('cart/', views.CartView.as_view(), name='cart'),
+    path('cart/items/', views.CartItemView.as_view(), name='cart-items'),
+    path('cart/items/<int:item_id>/', views.CartItemView.as_view(), name='cart-item-detail'),
 ]
 
 urlpatterns += [
@@ -28,7 +37,16 @@ urlpatterns += [
     path('admin/dashboard/', views.AdminDashboardView.as_view(), name='admin-dashboard'),
     path('admin/orders/', views.AdminOrderView.as_view(), name='admin-orders'),
     path('admin/orders/<int:pk>/', views.AdminOrderView.as_view(), name='admin-order-detail'),
+    path('admin/orders/bulk-status/', views.AdminBulkOrderStatusView.as_view(), name='admin-order-bulk-status'),
     path('admin/check/', views.admin_check, name='admin-check'),
+    path('admin/tasks/stats/', views.task_queue_stats, name='admin-task-stats'),
+    path('admin/changes/', views.change_feed, name='admin-changes'),
+    path('admin/imports/', views.imports, name='admin-imports'),
+    path('admin/imports/<int:job_id>/', views.import_detail, name='admin-import-detail'),
+    path('admin/analytics/', views.analytics_overview, name='admin-analytics'),
+    path('admin/analytics/revenue/', views.analytics_report, {'report': 'revenue'}, name='admin-analytics-revenue'),
+    path('admin/analytics/best-sellers/', views.analytics_report, {'report': 'best-sellers'}, name='admin-analytics-best-sellers'),
+    path('admin/analytics/returns/', views.analytics_report, {'report': 'returns'}, name='admin-analytics-returns'),
     
     # Stock management routes
     path('jerseys/<int:jersey_id>/stock/', views.JerseyStockView.as_view(), name='jersey-stock-update'),
@@ -37,11 +55,14 @@ urlpatterns += [
 
 urlpatterns += [
     path('wishlist/', WishlistView.as_view(), name='wishlist-add'),
+    path('wishlist/ids/', views.WishlistIdsView.as_view(), name='wishlist-ids'),
+    path('wishlist/bulk/', views.WishlistBulkView.as_view(), name='wishlist-bulk'),
     path('wishlist/<int:jersey_id>/', WishlistView.as_view(), name='wishlist-remove'),
 ]
 
 urlpatterns += [
     path('login/', login_user, name='login'),
+    path('logout/', views.logout_user, name='logout'),
 ]
 
 urlpatterns += [
@@ -53,6 +74,10 @@ urlpatterns += [
         'get': 'list',
         'post': 'create'
     }), name='jersey-reviews'),
+    path('jerseys/<int:jersey_id>/reviews/page/', views.ReviewViewSet.as_view({
+        'get': 'page'
+    }), name='jersey-reviews-page'),
+    path('reviews/<int:review_id>/helpful/', views.ReviewHelpfulView.as_view(), name='review-helpful'),
 ]
 
 urlpatterns += [
@@ -73,4 +98,14 @@ urlpatterns += [
 
 urlpatterns += [
     path('returns/pending/', views.PendingReturnsView.as_view(), name='pending-returns'),
+    path('returns/queue/', views.ReturnQueueView.as_view(), name='returns-queue'),
+    path('returns/batch/', views.ReturnBatchView.as_view(), name='returns-batch'),
+]
+
+# Async read endpoints for ASGI deployments
+urlpatterns += [
+    path('async/metadata/', async_views.filter_metadata, name='async-filter-metadata'),
+    path('async/wishlist/', async_views.wishlist, name='async-wishlist'),
+    path('async/jerseys/<int:jersey_id>/reviews/', async_views.reviews, name='async-jersey-reviews'),
+    path('async/dashboard/', async_views.dashboard, name='async-dashboard'),
 ]
\ No newline at end of file
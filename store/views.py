@@ -4,10 +4,11 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.viewsets import ModelViewSet
-from .models import Team, Player, Jersey, Customization, Order, Wishlist, Review, Sale, OrderItem, Return
-from .serializers import TeamSerializer, PlayerSerializer, JerseySerializer, CustomizationSerializer, UserOrderSerializer, AdminOrderSerializer, OrderSerializer, ReviewSerializer, AdminJerseySerializer, SaleSerializer, ReturnSerializer
+from .models import Team, Player, Jersey, JerseyPrice, Customization, Order, Wishlist, Review, Sale, OrderItem, Return, ImportJob
+from .serializers import TeamSerializer, PlayerSerializer, JerseySerializer, CustomizationSerializer, UserOrderSerializer, AdminOrderSerializer, OrderSerializer, ReviewSerializer, AdminJerseySerializer, SaleSerializer, ReturnSerializer, ImportJobSerializer, jersey_context
 from rest_framework.authtoken.models import Token
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, action, throttle_classes
+from rest_framework.settings import api_settings
 from django.contrib.auth.models import User
 from django.db import models
 from .serializers import JerseySerializer
@@ -23,30 +24,46 @@ from django.core.cache import cache
 from django.db.models import Prefetch
 from django.db.models import Count, Avg, F, Q
 import logging
+import uuid
+import zipfile
+from pathlib import Path
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
-from datetime import timedelta
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from django.db import IntegrityError, transaction
+from datetime import date, timedelta
+from . import cart as cart_service
+from . import analytics, catalog, changes, dashboard, inventory, money, order_history, order_states, passwords, pricing, queue, reviews, tasks, wishlist
+from . import returns as returns_queue
+from .authentication import remember
+from .filters import JerseyFilter
+from .idempotency import idempotent
+from .throttling import LoginThrottle
 
 logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([AllowAny])  # Allow public access
+@throttle_classes(api_settings.DEFAULT_THROTTLE_CLASSES + [LoginThrottle])
 def signup_user(request):
     username = request.data.get('username')
     password = request.data.get('password')
     if User.objects.filter(username=username).exists():
         return Response({'error': 'User already exists'}, status=400)
-    user = User.objects.create_user(username=username, password=password)
+    try:
+        user = passwords.create_user(username, password)
+    except passwords.HashingBusy:
+        return Response({'error': 'Server busy, please retry'}, status=503, headers={'Retry-After': '1'})
     token, created = Token.objects.get_or_create(user=user)
+    remember(token.key, user)
     return Response({'token': token.key})
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(api_settings.DEFAULT_THROTTLE_CLASSES + [LoginThrottle])
 def login_user(request):
     try:
-        # Add debug logging
-        print("Login attempt with data:", request.data)
-        
         username = request.data.get('username')
         password = request.data.get('password')
         
@@ -54,30 +71,40 @@ def login_user(request):
             return Response({
                 'error': 'Username and password are required'
             }, status=400)
-            
-        try:
-            user = User.objects.get(username=username)
-            if user.check_password(password):
-                token, created = Token.objects.get_or_create(user=user)
-                return Response({
-                    'token': token.key,
-                    'is_admin': user.is_staff,
-                    'username': user.username
-                })
-            return Response({
-                'error': 'Invalid password'
-            }, status=400)
-        except User.DoesNotExist:
+
+        # Hashing runs on the bounded password pool, and unknown users get the
+        # same error after the same amount of work as a wrong password
+        user = passwords.authenticate(username, password)
+        if user is None:
             return Response({
-                'error': 'User does not exist'
+                'error': 'Invalid username or password'
             }, status=400)
-            
+
+        token, created = Token.objects.get_or_create(user=user)
+        remember(token.key, user)
+        return Response({
+            'token': token.key,
+            'is_admin': user.is_staff,
+            'username': user.username
+        })
+
+    except passwords.HashingBusy:
+        return Response({
+            'error': 'Server busy, please retry'
+        }, status=503, headers={'Retry-After': '1'})
     except Exception as e:
         print("Login error:", str(e))  # Add server-side error logging
         return Response({
             'error': 'Server error occurred'
         }, status=500)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_user(request):
+    # Deleting the token also evicts it from the authentication caches
+    Token.objects.filter(key=request.auth.key).delete()
+    return Response({'message': 'Logged out successfully'})
+
 class TeamViewSet(ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
@@ -89,34 +116,28 @@ class PlayerViewSet(ModelViewSet):
 class JerseyViewSet(viewsets.ModelViewSet):
     serializer_class = JerseySerializer
     permission_classes = [AllowAny]
-    filter_backends = [SearchFilter, DjangoFilterBackend]
-    search_fields = ['player__name', 'player__team__name', 'player__team__league']
-    filterset_fields = {
-        'player__team__league': ['exact'],
-        'player__team__name': ['exact'],
-    }
+    # ?search= is handled in get_queryset, which also understands search=sale
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = JerseyFilter
 
     def get_queryset(self):
+        # Cards, price filters and sorting read the price snapshots
         queryset = Jersey.objects.select_related(
             'player', 
             'player__team'
         ).prefetch_related(
-            'reviews',
-            'wishlist_items',
             'images'
-        ).annotate(
-            review_count=Count('reviews'),
-            avg_rating=Avg('reviews__rating')
-        )
+        ).order_by('id')
 
-        # Handle rating filter
+        # Handle rating filter; unrated jerseys are kept
         min_rating = self.request.query_params.get('min_rating')
         if min_rating:
             try:
                 min_rating = float(min_rating)
                 queryset = queryset.filter(
-                    models.Q(avg_rating__gte=min_rating) | 
-                    models.Q(avg_rating__isnull=True)
+                    models.Q(rating_summary__average_rating__gte=min_rating) | 
+                    models.Q(rating_summary__isnull=True) |
+                    models.Q(rating_summary__review_count=0)
                 )
             except (ValueError, TypeError):
                 pass
@@ -125,27 +146,7 @@ class JerseyViewSet(viewsets.ModelViewSet):
         search = self.request.query_params.get('search', '').lower()
         if search:
             if search == 'sale':
-                now = timezone.now()
-                active_sales = Sale.objects.filter(
-                    is_active=True,
-                    start_date__lte=now,
-                    end_date__gte=now
-                )
-                if active_sales.exists():
-                    sale_conditions = Q()
-                    for sale in active_sales:
-                        if sale.sale_type == 'ALL':
-                            return queryset
-                        elif sale.sale_type == 'PLAYER':
-                            player_ids = [int(id) for id in sale.target_value.split(',') if id]
-                            sale_conditions |= Q(player_id__in=player_ids)
-                        elif sale.sale_type == 'TEAM':
-                            team_ids = [int(id) for id in sale.target_value.split(',') if id]
-                            sale_conditions |= Q(player__team_id__in=team_ids)
-                        elif sale.sale_type == 'LEAGUE':
-                            leagues = sale.target_value.split(',')
-                            sale_conditions |= Q(player__team__league__in=leagues)
-                    queryset = queryset.filter(sale_conditions)
+                queryset = queryset.filter(pricing.on_sale())
             else:
                 queryset = queryset.filter(
                     models.Q(player__name__icontains=search) |
@@ -155,10 +156,29 @@ class JerseyViewSet(viewsets.ModelViewSet):
 
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        """?view=card for compact grid tiles, ?fields=a,b for a sparse fieldset."""
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.query_params.get('view') == 'card':
+            return Response(catalog.cards(queryset, request))
+        try:
+            fields = catalog.jersey_fields(request.query_params.get('fields'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if fields is not None and not {'images', 'primary_image'} & set(fields):
+            queryset = queryset.prefetch_related(None)
+        jerseys = list(queryset)
+        serializer = self.get_serializer(jerseys, many=True, context=jersey_context(jerseys, request, fields))
+        return Response(serializer.data)
+
     def retrieve(self, request, *args, **kwargs):
+        try:
+            fields = catalog.jersey_fields(request.query_params.get('fields'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         try:
             instance = self.get_object()
-            serializer = self.get_serializer(instance)
+            serializer = self.get_serializer(instance, context=jersey_context([instance], request, fields))
             return Response(serializer.data)
         except Http404:
             return Response(
@@ -166,6 +186,10 @@ class JerseyViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('context', self.get_serializer_context())
+        return self.get_serializer_class()(*args, **kwargs)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
@@ -248,43 +272,18 @@ class CustomizationViewSet(viewsets.ModelViewSet):
 
 class CheckoutView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'checkout'
 
+    @idempotent('checkout')
     def post(self, request):
         try:
             with transaction.atomic():
-                if not request.data.get('items'):
-                    return Response({
-                        'error': 'No items provided'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # Create order
-                order = Order.objects.create(
-                    user=request.user,
-                    total_price=request.data.get('total_price', 0),
-                    status='processing'
-                )
-
-                # Create order items
-                for item in request.data.get('items', []):
-                    try:
-                        # Get the jersey to check its current price
-                        jersey = Jersey.objects.get(id=item['jersey_id'])
-                        # Use sale price if available, otherwise use regular price
-                        price_to_use = jersey.sale_price if jersey.sale_price is not None else jersey.price
-
-                        OrderItem.objects.create(
-                            order=order,
-                            jersey=jersey,
-                            quantity=item['quantity'],
-                            price=price_to_use,  # Use the current price
-                            size=item.get('size', 'M'),
-                            type=item.get('type', 'regular'),
-                            player_name=item.get('player_name', '')
-                        )
-                    except KeyError as e:
-                        raise ValueError(f"Missing required field: {str(e)}")
-                    except Jersey.DoesNotExist:
-                        raise ValueError(f"Jersey with id {item['jersey_id']} not found")
+                if request.data.get('items'):
+                    order = self.create_order_from_items(request)
+                else:
+                    # No items posted: convert the already-priced server-side cart
+                    order = cart_service.checkout(request.user, cart_service.get_cart(request.user))
+                tasks.order_placed(order)
 
                 serializer = OrderSerializer(order)
                 return Response({
@@ -300,15 +299,171 @@ class CheckoutView(APIView):
             logger.error(f"Error creating order: {str(e)}")
             return Response({
                 'error': 'Failed to create order'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def create_order_from_items(self, request):
+        items = request.data.get('items', [])
+        try:
+            jersey_ids = {int(item['jersey_id']) for item in items}
+        except KeyError as e:
+            raise ValueError(f"Missing required field: {str(e)}")
+
+        # Price every line in one pass: one jersey query and one sales query
+        jerseys = Jersey.objects.select_related('player__team').in_bulk(jersey_ids)
+        for jersey_id in jersey_ids:
+            if jersey_id not in jerseys:
+                raise ValueError(f"Jersey with id {jersey_id} not found")
+        sale_prices = pricing.sale_prices(jerseys.values())
+
+        order_items = []
+        for item in items:
+            try:
+                jersey_id = int(item['jersey_id'])
+                quantity = int(item['quantity'])
+                sale_price = sale_prices[jersey_id]
+                if quantity < 1:
+                    raise ValueError(f"Invalid quantity for jersey {jersey_id}")
+                order_items.append(OrderItem(
+                    jersey=jerseys[jersey_id],
+                    quantity=quantity,
+                    price=sale_price if sale_price is not None else jerseys[jersey_id].price,
+                    size=item.get('size', 'M'),
+                    type=item.get('type', 'regular'),
+                    player_name=item.get('player_name', '')
+                ))
+            except KeyError as e:
+                raise ValueError(f"Missing required field: {str(e)}")
+
+        # The total comes from the server-side prices; any client total_price is ignored
+        order = Order.objects.create(
+            user=request.user,
+            total_price=money.from_minor(money.total(
+                (money.to_minor(order_item.price), order_item.quantity) for order_item in order_items
+            )),
+            status='processing'
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+        changes.record(OrderItem, [item.id for item in order_items], 'create')
+
+        # Convert checkout holds (or take stock directly) for the sized lines
+        inventory.commit_order_items(request.user, order, items)
+        return order
+
+class CheckoutReservationView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        """Hold per-size stock for the items of a checkout that is starting."""
+        items = request.data.get('items')
+        if not items:
+            return Response({
+                'error': 'No items provided'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            reservations = inventory.reserve_items(request.user, items)
+        except inventory.InsufficientStock as e:
+            return Response({
+                'error': str(e),
+                'jersey_id': e.jersey_id,
+                'size': e.size
+            }, status=status.HTTP_409_CONFLICT)
+        except (KeyError, TypeError, ValueError) as e:
+            return Response({
+                'error': f'Invalid items: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'reservations': [
+                {
+                    'id': reservation.id,
+                    'jersey_id': reservation.jersey_id,
+                    'size': reservation.size,
+                    'quantity': reservation.quantity
+                }
+                for reservation in reservations
+            ],
+            'expires_at': reservations[0].expires_at if reservations else None
+        }, status=status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        released = inventory.release_holds(request.user)
+        return Response({'released': released})
+
+class JerseyAvailabilityView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """Available units by size for a comma separated list of jersey ids."""
+        try:
+            jersey_ids = [int(id) for id in request.query_params.get('ids', '').split(',') if id]
+        except ValueError:
+            return Response({'error': 'Invalid jersey ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+        availability = inventory.available_by_size(jersey_ids)
+        return Response({
+            str(jersey_id): availability.get(jersey_id, {})
+            for jersey_id in jersey_ids
+        })
+
+class CartView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Authoritative, server-priced summary of the user's cart."""
+        return Response(cart_service.cart_summary(cart_service.get_cart(request.user)))
+
+    def delete(self, request):
+        cart_service.clear(cart_service.get_cart(request.user))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class CartItemView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user_cart = cart_service.get_cart(request.user)
+        try:
+            cart_service.add_item(
+                user_cart,
+                jersey_id=int(request.data['jersey_id']),
+                size=request.data.get('size', 'M'),
+                quantity=int(request.data.get('quantity', 1)),
+                type=request.data.get('type', 'regular'),
+                player_name=request.data.get('player_name', '')
+            )
+        except KeyError:
+            return Response({'error': 'Jersey ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+        except Jersey.DoesNotExist as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(cart_service.cart_summary(user_cart), status=status.HTTP_201_CREATED)
+
+    def patch(self, request, item_id):
+        user_cart = cart_service.get_cart(request.user)
+        try:
+            updated = cart_service.update_item(user_cart, item_id, int(request.data.get('quantity')))
+        except (TypeError, ValueError):
+            return Response({'error': 'Quantity must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not updated:
+            return Response({'error': 'Item not found in cart'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(cart_service.cart_summary(user_cart))
+
+    def delete(self, request, item_id):
+        user_cart = cart_service.get_cart(request.user)
+        if not cart_service.remove_item(user_cart, item_id):
+            return Response({'error': 'Item not found in cart'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(cart_service.cart_summary(user_cart))
+
 # User Order Tracking
 class UserOrderView(APIView):
     permission_classes = [IsAuthenticated]  # Ensure user must be authenticated
 
     def get(self, request):
         # Fetch orders for the currently logged-in user
-        orders = Order.objects.filter(user=request.user)
+        orders = Order.objects.filter(user=request.user).order_by('-created_at', '-id')
         serializer = UserOrderSerializer(orders, many=True)
         return Response(serializer.data)
 
@@ -324,16 +479,46 @@ class AdminOrderView(APIView):
     def patch(self, request, pk):
         try:
             order = Order.objects.get(pk=pk)
-            status = request.data.get('status')
-            if status not in dict(Order.STATUS_CHOICES):
-                return Response({"error": "Invalid status"}, status=400)
+            new_status = request.data.get('status')
+            try:
+                order_states.transition(order, new_status, request.user)
+            except order_states.InvalidTransition as e:
+                return Response({"error": str(e)}, status=400)
 
-            order.status = status
-            order.save()
+            tasks.notify_order_status.delay(order_id=order.id, status=new_status)
             return Response({"message": "Order status updated successfully"})
         except Order.DoesNotExist:
             return Response({"error": "Order not found"}, status=404)
 
+class AdminBulkOrderStatusView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        """Move many orders to one status: {"order_ids": [...], "status": "shipped"}"""
+        order_ids = request.data.get('order_ids')
+        new_status = request.data.get('status')
+        if not isinstance(order_ids, list) or not order_ids:
+            return Response({'error': 'order_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            order_ids = [int(order_id) for order_id in order_ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'order_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                result = order_states.bulk_transition(order_ids, new_status)
+                if result['updated']:
+                    tasks.orders_status_changed(result['updated'], new_status)
+        except order_states.InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'status': new_status,
+            'updated_count': len(result['updated']),
+            'skipped_count': len(result['skipped']),
+            **result
+        })
+
 # Admin Dashboard        
 class AdminDashboardView(APIView):
     permission_classes = [IsAdminUser]
@@ -346,12 +531,12 @@ class AdminDashboardView(APIView):
             total_orders = Order.objects.count()
             logger.info(f"Total orders: {total_orders}")
             
-            total_revenue = Order.objects.aggregate(
+            total_revenue = money.to_minor(Order.objects.aggregate(
                 total=models.Sum('total_price')
-            )['total'] or 0
-            logger.info(f"Total revenue: {total_revenue}")
+            )['total'] or 0)
+            logger.info(f"Total revenue: {money.from_minor(total_revenue)}")
             
-            avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
+            avg_order_value = money.divide(total_revenue, total_orders)
             total_customers = User.objects.filter(is_staff=False).count()
 
             # Get orders by status
@@ -376,8 +561,8 @@ class AdminDashboardView(APIView):
             response_data = {
                 'kpis': {
                     'total_orders': total_orders,
-                    'total_revenue': float(total_revenue),
-                    'average_order_value': float(avg_order_value),
+                    'total_revenue': money.as_float(total_revenue),
+                    'average_order_value': money.as_float(avg_order_value),
                     'total_customers': total_customers,
                     'orders_by_status': {
                         status['status']: status['count'] 
@@ -388,7 +573,7 @@ class AdminDashboardView(APIView):
                     {
                         'id': order.id,
                         'user': order.user.username,
-                        'total_price': float(order.total_price),
+                        'total_price': money.as_float(order.total_price),
                         'status': order.status,
                         'created_at': order.created_at
                     }
@@ -428,11 +613,13 @@ class WishlistView(APIView):
 
     def get(self, request):
         """Get all wishlist items for the logged-in user."""
-        wishlist_items = Wishlist.objects.filter(user=request.user).select_related('jersey')
-        jerseys = [item.jersey for item in wishlist_items]
-        serializer = JerseySerializer(jerseys, many=True, context={'request': request})
+        jerseys = list(Jersey.objects.filter(wishlist_items__user=request.user).select_related(
+            'player__team'
+        ).prefetch_related('images').order_by('-wishlist_items__created_at'))
+        serializer = JerseySerializer(jerseys, many=True, context=jersey_context(jerseys, request))
         return Response(serializer.data)
 
+    @idempotent('wishlist')
     def post(self, request):
         try:
             jersey_id = request.data.get('jersey')
@@ -458,6 +645,8 @@ class WishlistView(APIView):
                 user=request.user,
                 jersey=jersey
             )
+            if created:
+                wishlist.invalidate(request.user.id)
             
             return Response(
                 {
@@ -470,7 +659,7 @@ class WishlistView(APIView):
             print(f"Wishlist error: {str(e)}")  # Debug log
             return Response(
                 {'error': str(e)},
-                status=status.HTTP_400_BAD_REQUEST
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
     def delete(self, request, jersey_id):
@@ -487,6 +676,7 @@ class WishlistView(APIView):
                 )
             
             wishlist_item.delete()
+            wishlist.invalidate(request.user.id)
             return Response(
                 {'message': 'Removed from wishlist successfully'},
                 status=status.HTTP_200_OK
@@ -497,6 +687,39 @@ class WishlistView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class WishlistIdsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """The user's wishlist jersey IDs, for marking hearts on catalog pages."""
+        jersey_ids = wishlist.jersey_ids(request.user.id)
+        etag = wishlist.etag(jersey_ids)
+        # Weak comparison: compressed responses carry the W/ form of the tag
+        if etag in {tag.removeprefix('W/') for tag in parse_etags(request.headers.get('If-None-Match', ''))}:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({'jersey_ids': jersey_ids})
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+class WishlistBulkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @idempotent('wishlist-bulk')
+    def post(self, request):
+        """Add and remove many jerseys at once: {"add": [1, 2], "remove": [3]}"""
+        try:
+            add = [int(jersey_id) for jersey_id in request.data.get('add') or []]
+            remove = [int(jersey_id) for jersey_id in request.data.get('remove') or []]
+        except (TypeError, ValueError):
+            return Response({'error': 'add and remove must be lists of jersey IDs'}, status=status.HTTP_400_BAD_REQUEST)
+        if not add and not remove:
+            return Response({'error': 'Nothing to add or remove'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = wishlist.bulk_update(request.user, add=add, remove=remove)
+        return Response(result)
+
 class FilterMetadataView(APIView):
     permission_classes = [AllowAny]  # Allow public access
     
@@ -504,8 +727,10 @@ class FilterMetadataView(APIView):
         players = Jersey.objects.values_list('player__name', flat=True).distinct()
         leagues = Jersey.objects.values_list('player__team__league', flat=True).distinct()
         teams = Jersey.objects.values_list('player__team__name', flat=True).distinct()
-        min_price = Jersey.objects.order_by('price').first().price
-        max_price = Jersey.objects.order_by('-price').first().price
+        # Effective prices, so the range matches what the price filters see
+        prices = JerseyPrice.objects.values_list('effective_price', flat=True)
+        min_price = prices.order_by('effective_price').first()
+        max_price = prices.order_by('-effective_price').first()
 
         return Response({
             'players': players,
@@ -520,46 +745,14 @@ class FilterMetadataView(APIView):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_view(request):
-    try:
-        if request.user.is_staff:
-            return Response({
-                'redirect': 'admin',
-                'message': 'Please use the admin dashboard endpoint'
-            }, status=status.HTTP_303_SEE_OTHER)
-        
-        # Regular user dashboard
-        # Get recent orders
-        recent_orders = Order.objects.filter(user=request.user).order_by('-created_at')[:5]
-        
-        # Get wishlist items
-        wishlist_items = Wishlist.objects.filter(user=request.user).select_related(
-            'jersey', 
-            'jersey__player', 
-            'jersey__player__team'
-        )
-        
-        # Get recommended jerseys
-        recommended_jerseys = Jersey.objects.select_related(
-            'player', 
-            'player__team'
-        ).all()[:5]
+    if request.user.is_staff:
+        return Response({
+            'redirect': 'admin',
+            'message': 'Please use the admin dashboard endpoint'
+        }, status=status.HTTP_303_SEE_OTHER)
 
-        response_data = {
-            "recent_orders": OrderSerializer(recent_orders, many=True).data,
-            "wishlist": JerseySerializer(
-                [item.jersey for item in wishlist_items], 
-                many=True, 
-                context={'request': request}
-            ).data,
-            "recommendations": JerseySerializer(
-                recommended_jerseys, 
-                many=True, 
-                context={'request': request}
-            ).data,
-        }
-        
-        return Response(response_data)
-        
+    try:
+        return Response(dashboard.build(request.user, request))
     except Exception as e:
         logger.error(f"Dashboard Error: {str(e)}")
         return Response(
@@ -573,14 +766,33 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         jersey_id = self.kwargs.get('jersey_id')
-        queryset = Review.objects.filter(jersey_id=jersey_id).order_by('-created_at')
-        
-        # Add a flag to identify the user's own review
-        if self.request.user.is_authenticated:
-            for review in queryset:
-                review.is_users_review = (review.user == self.request.user)
-        
-        return queryset
+        return Review.objects.filter(jersey_id=jersey_id).select_related('user').order_by('-created_at', '-id')
+
+    def get_permissions(self):
+        if self.action == 'page':
+            return [AllowAny()]
+        return super().get_permissions()
+
+    @action(detail=False, methods=['get'])
+    def page(self, request, jersey_id=None):
+        """Keyset-paged reviews: ?sort=newest|helpful&cursor=...&limit=10
+
+        The first page also carries the jersey's rating summary.
+        """
+        cursor = request.query_params.get('cursor')
+        try:
+            page = reviews.fetch_page(
+                jersey_id,
+                sort=request.query_params.get('sort', 'newest'),
+                cursor=cursor,
+                limit=request.query_params.get('limit', reviews.DEFAULT_PAGE_SIZE),
+                user=request.user
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not cursor:
+            page['summary'] = reviews.summary(jersey_id)
+        return Response(page)
 
     def update(self, request, *args, **kwargs):
         review = self.get_object()
@@ -594,13 +806,9 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(review, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-
-        # Update jersey's average rating
-        jersey = review.jersey
-        avg_rating = Review.objects.filter(jersey=jersey).aggregate(models.Avg('rating'))['rating__avg']
-        jersey.average_rating = avg_rating
-        jersey.save()
+        # The Review signals move the rating in the histogram in the same transaction
+        with transaction.atomic():
+            serializer.save()
 
         return Response(serializer.data)
 
@@ -615,24 +823,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
             )
 
         # Check if user has purchased the jersey
-        orders = Order.objects.filter(
-            user=request.user,
-            status__in=['processing', 'delivered']  # Include both processing and delivered orders
-        )
-
-        has_purchased = False
-        for order in orders:
-            try:
-                items = order.items if isinstance(order.items, list) else []
-                for item in items:
-                    if isinstance(item, dict) and str(item.get('jersey_id', '')) == str(jersey_id):
-                        has_purchased = True
-                        break
-                if has_purchased:
-                    break
-            except Exception as e:
-                print(f"Error checking order items: {e}")
-                continue
+        has_purchased = OrderItem.objects.filter(
+            order__user=request.user,
+            order__status__in=['processing', 'delivered'],  # Include both processing and delivered orders
+            jersey=jersey
+        ).exists()
 
         if not has_purchased:
             return Response(
@@ -641,34 +836,45 @@ class ReviewViewSet(viewsets.ModelViewSet):
             )
 
         # Check if user already reviewed this jersey
-        existing_review = Review.objects.filter(user=request.user, jersey=jersey).first()
-        if existing_review:
+        if Review.objects.filter(user=request.user, jersey=jersey).exists():
             return Response(
                 {"error": "You have already reviewed this jersey"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
         try:
-            # Create the review
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=request.user, jersey=jersey)
-            
-            # Update jersey's average rating
-            jersey_reviews = Review.objects.filter(jersey=jersey)
-            avg_rating = jersey_reviews.aggregate(models.Avg('rating'))['rating__avg']
-            jersey.average_rating = avg_rating
-            jersey.save()
-            
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            print(f"Error creating review: {e}")
+            with transaction.atomic():
+                serializer.save(user=request.user, jersey=jersey)
+        except IntegrityError:
             return Response(
-                {"error": "Failed to create review"},
+                {"error": "You have already reviewed this jersey"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class ReviewHelpfulView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, review_id):
+        return self.vote(request, review_id, helpful=True)
+
+    def delete(self, request, review_id):
+        return self.vote(request, review_id, helpful=False)
+
+    def vote(self, request, review_id, helpful):
+        author_id = Review.objects.filter(id=review_id).values_list('user_id', flat=True).first()
+        if author_id is None:
+            return Response({'error': 'Review not found'}, status=status.HTTP_404_NOT_FOUND)
+        if author_id == request.user.id:
+            return Response({'error': 'You cannot vote on your own review'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'id': review_id,
+            'helpful_count': reviews.set_helpful(request.user, review_id, helpful)
+        })
+
 class OrderStatusView(APIView):
     permission_classes = [IsAuthenticated]
     
@@ -691,35 +897,13 @@ class OrderStatusView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Don't allow modifying delivered orders
-            if order.status == 'delivered':
-                return Response(
-                    {'error': 'Cannot modify delivered orders'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # Regular users can only cancel pending or processing orders
-            if not request.user.is_staff:
-                if new_status != 'cancelled':
-                    return Response(
-                        {'error': 'Users can only cancel orders'}, 
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-                if order.status not in ['pending', 'processing']:
-                    return Response(
-                        {'error': 'Can only cancel pending or processing orders'}, 
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-            
-            # Validate status
-            if new_status not in dict(Order.STATUS_CHOICES):
-                return Response(
-                    {'error': 'Invalid status'}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            order.status = new_status
-            order.save()
+            try:
+                order_states.transition(order, new_status, request.user)
+            except order_states.TransitionNotAllowed as e:
+                return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+            except order_states.InvalidTransition as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            tasks.notify_order_status.delay(order_id=order.id, status=new_status)
             
             return Response(OrderSerializer(order).data)
             
@@ -759,7 +943,9 @@ class OrderViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related(
+            'items'
+        ).order_by('-created_at')
 
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
@@ -767,6 +953,20 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(orders, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Keyset-paged order history: ?cursor=<next_cursor>&limit=20"""
+        try:
+            page = order_history.fetch_page(
+                request.user,
+                cursor=request.query_params.get('cursor'),
+                limit=request.query_params.get('limit', order_history.DEFAULT_PAGE_SIZE),
+                request=request
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page)
+
     def list(self, request, *args, **kwargs):
         # Redirect list to my_orders for regular users
         return self.my_orders(request)
@@ -818,6 +1018,16 @@ class JerseyStockView(APIView):
             
             if serializer.is_valid():
                 serializer.save()
+                sizes = request.data.get('sizes')
+                if sizes:
+                    try:
+                        inventory.set_size_stock(jersey, {
+                            size: int(quantity) for size, quantity in sizes.items()
+                        })
+                    except (AttributeError, TypeError, ValueError) as e:
+                        return Response({'error': str(e)}, status=400)
+                    jersey.refresh_from_db(fields=['stock'])
+                    serializer = AdminJerseySerializer(jersey)
                 return Response({
                     'message': 'Stock updated successfully',
                     'data': serializer.data
@@ -826,6 +1036,116 @@ class JerseyStockView(APIView):
         except Jersey.DoesNotExist:
             return Response({'error': 'Jersey not found'}, status=404)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def task_queue_stats(request):
+    """Background task queue depth and latency for monitoring."""
+    return Response(queue.stats())
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def analytics_overview(request):
+    """Analytics snapshot status; POST queues a rebuild."""
+    if request.method == 'POST':
+        tasks.rebuild_analytics.delay()
+        return Response({'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
+    snapshot = analytics.current()
+    return Response({
+        'built_at': snapshot.manifest['built_at'] if snapshot else None,
+        'rows': snapshot.rows if snapshot else 0,
+        'groupings': analytics.GROUPINGS,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def analytics_report(request, report):
+    """Revenue, best sellers or return rates from the latest analytics snapshot."""
+    snapshot = analytics.current()
+    if snapshot is None:
+        return Response(
+            {'error': 'Analytics snapshot has not been built yet'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    params = request.query_params
+    try:
+        start = date.fromisoformat(params['start']) if params.get('start') else None
+        end = date.fromisoformat(params['end']) if params.get('end') else None
+        if report == 'best-sellers':
+            results = analytics.best_sellers(
+                snapshot,
+                by=params.get('by', 'units'),
+                limit=max(1, min(int(params.get('limit', 10)), 100)),
+                start=start,
+                end=end
+            )
+        elif report == 'returns':
+            results = analytics.return_rates(snapshot, params.get('group_by', 'jersey'), start, end)
+        else:
+            results = analytics.revenue(snapshot, params.get('group_by', 'day'), start, end)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'built_at': snapshot.manifest['built_at'], 'results': results})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def change_feed(request):
+    """Logged row changes after ?since=, oldest first; ?models= narrows the tables."""
+    models_param = request.query_params.get('models')
+    try:
+        since = int(request.query_params.get('since', 0))
+        rows, position = changes.fetch(
+            since,
+            models=models_param.split(',') if models_param else None,
+            limit=request.query_params.get('limit', changes.DEFAULT_BATCH_SIZE)
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': rows, 'next_since': position})
+
+def _save_upload(directory, upload):
+    path = directory / Path(upload.name).name
+    with open(path, 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    return path
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def imports(request):
+    """Recent bulk imports; POST a ``manifest`` (.csv/.jsonl) and optional ``images`` zip to queue one."""
+    if request.method == 'GET':
+        jobs = ImportJob.objects.select_related('created_by').order_by('-created_at')[:20]
+        return Response(ImportJobSerializer(jobs, many=True).data)
+
+    manifest = request.FILES.get('manifest')
+    images = request.FILES.get('images')
+    if manifest is None:
+        return Response({'error': 'A manifest file is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if Path(manifest.name).suffix.lower() not in ('.csv', '.jsonl'):
+        return Response({'error': 'Manifest must be a .csv or .jsonl file'}, status=status.HTTP_400_BAD_REQUEST)
+    if images is not None and not zipfile.is_zipfile(images):
+        return Response({'error': 'Images must be a zip archive'}, status=status.HTTP_400_BAD_REQUEST)
+
+    directory = Path(getattr(settings, 'IMPORT_UPLOAD_DIR', Path(settings.BASE_DIR) / 'imports')) / uuid.uuid4().hex
+    directory.mkdir(parents=True)
+    job = ImportJob.objects.create(
+        created_by=request.user,
+        manifest=str(_save_upload(directory, manifest)),
+        images=str(_save_upload(directory, images)) if images is not None else ''
+    )
+    tasks.run_import.delay(job_id=job.id)
+    return Response(ImportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def import_detail(request, job_id):
+    """Progress and row errors of one bulk import."""
+    try:
+        job = ImportJob.objects.select_related('created_by').get(id=job_id)
+    except ImportJob.DoesNotExist:
+        return Response({'error': 'Import not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ImportJobSerializer(job).data)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def admin_check(request):
@@ -852,9 +1172,25 @@ class SaleViewSet(viewsets.ModelViewSet):
         self.perform_update(serializer)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def preview(self, request):
+        """Jerseys affected and revenue impact of a proposed sale, without saving it."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = dict(serializer.validated_data)
+        targets = data.pop('targets', [])
+        try:
+            window_days = int(request.query_params.get('window_days', 30))
+        except ValueError:
+            return Response({'error': 'window_days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if window_days < 1:
+            return Response({'error': 'window_days must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(pricing.preview_sale(Sale(**data), targets, window_days=window_days))
+
 class OrderReturnView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent('order-return')
     def post(self, request, order_id):
         try:
             order = Order.objects.get(id=order_id)
@@ -896,9 +1232,9 @@ class OrderReturnView(APIView):
             )
             
             if serializer.is_valid():
-                serializer.save()
-                order.status = 'return_pending'
-                order.save()
+                with transaction.atomic():
+                    order_states.transition(order, 'return_pending')
+                    serializer.save()
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -908,44 +1244,76 @@ class OrderReturnView(APIView):
                 {'error': 'Order not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except order_states.InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 class ReturnApprovalView(APIView):
     permission_classes = [IsAdminUser]
 
     def patch(self, request, return_id):
         try:
-            return_request = Return.objects.get(id=return_id)
-            action = request.data.get('action')
+            result = returns_queue.process_batch([return_id], request.data.get('action'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            if action not in ['approve', 'reject']:
-                return Response(
-                    {'error': 'Invalid action. Must be either "approve" or "reject"'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        if result['skipped']:
+            reason = result['skipped'][0]['reason']
+            if reason == 'Return request not found':
+                return Response({'error': reason}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'error': reason}, status=status.HTTP_400_BAD_REQUEST)
 
-            with transaction.atomic():
-                if action == 'approve':
-                    return_request.status = 'approved'
-                    return_request.order.status = 'return_approved'
-                else:
-                    return_request.status = 'rejected'
-                    return_request.order.status = 'return_rejected'
+        return_request = Return.objects.select_related('order__user', 'user').prefetch_related(
+            'order__items'
+        ).get(id=return_id)
+        return Response(ReturnSerializer(return_request).data)
 
-                return_request.save()
-                return_request.order.save()
+class PendingReturnsView(APIView):
+    permission_classes = [IsAdminUser]
 
-            return Response(ReturnSerializer(return_request).data)
+    def get(self, request):
+        returns = Return.objects.filter(status='pending').select_related(
+            'order__user', 'user'
+        ).prefetch_related('order__items')
+        serializer = ReturnSerializer(returns, many=True)
+        return Response(serializer.data)
 
-        except Return.DoesNotExist:
-            return Response(
-                {'error': 'Return request not found'},
-                status=status.HTTP_404_NOT_FOUND
+class ReturnQueueView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """Keyset-paged returns work queue: ?status=pending&cursor=...&limit=20"""
+        return_status = request.query_params.get('status', 'pending')
+        if return_status not in dict(Return.RETURN_STATUS_CHOICES):
+            return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = returns_queue.queue_page(
+                status=return_status,
+                cursor=request.query_params.get('cursor'),
+                limit=request.query_params.get('limit', returns_queue.DEFAULT_PAGE_SIZE),
+                request=request
             )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page)
 
-class PendingReturnsView(APIView):
+class ReturnBatchView(APIView):
     permission_classes = [IsAdminUser]
 
-    def get(self, request):
-        returns = Return.objects.filter(status='pending').select_related('order', 'user')
-        serializer = ReturnSerializer(returns, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+    def post(self, request):
+        """Approve or reject many returns: {"return_ids": [...], "action": "approve"}"""
+        return_ids = request.data.get('return_ids')
+        if not isinstance(return_ids, list) or not return_ids:
+            return Response({'error': 'return_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = returns_queue.process_batch(
+                [int(return_id) for return_id in return_ids],
+                request.data.get('action')
+            )
+        except (TypeError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if result['processed']:
+            tasks.orders_status_changed(
+                list(Return.objects.filter(id__in=result['processed']).values_list('order_id', flat=True)),
+                returns_queue.ACTIONS[result['action']][1]
+            )
+        return Response(result)
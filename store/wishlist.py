@@ -0,0 +1,62 @@
+"""Wishlist membership: a cached set of jersey IDs per user and bulk writes."""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import dashboard
+from .models import Jersey, Wishlist
+
+
+def ids_cache_key(user_id):
+    return f'wishlist:{user_id}:ids'
+
+
+def invalidate(user_id):
+    transaction.on_commit(lambda: cache.delete(ids_cache_key(user_id)))
+    dashboard.invalidate(user_id, 'wishlist', 'recommendations')
+
+
+def jersey_ids(user_id):
+    """Sorted jersey IDs on the user's wishlist, served from the cache when warm."""
+    key = ids_cache_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = sorted(Wishlist.objects.filter(user_id=user_id).values_list('jersey_id', flat=True))
+        cache.set(key, ids, getattr(settings, 'WISHLIST_IDS_TTL', 300))
+    return ids
+
+
+def etag(ids):
+    return '"%s"' % hashlib.sha1(','.join(map(str, ids)).encode()).hexdigest()
+
+
+def bulk_update(user, add=(), remove=()):
+    """Add and remove many jerseys in two statements.
+
+    IDs of jerseys that do not exist are reported back rather than failing
+    the whole request.
+    """
+    add = set(add) - set(remove)
+    remove = set(remove)
+    result = {'added': [], 'removed': [], 'not_found': []}
+
+    with transaction.atomic():
+        if add:
+            existing = set(Jersey.objects.filter(id__in=add).values_list('id', flat=True))
+            already = set(Wishlist.objects.filter(user=user, jersey_id__in=existing).values_list('jersey_id', flat=True))
+            Wishlist.objects.bulk_create(
+                [Wishlist(user=user, jersey_id=jersey_id) for jersey_id in existing - already],
+                ignore_conflicts=True
+            )
+            result['added'] = sorted(existing - already)
+            result['not_found'] = sorted(add - existing)
+        if remove:
+            removed = list(Wishlist.objects.filter(user=user, jersey_id__in=remove).values_list('jersey_id', flat=True))
+            Wishlist.objects.filter(user=user, jersey_id__in=removed).delete()
+            result['removed'] = sorted(removed)
+        if result['added'] or result['removed']:
+            invalidate(user.id)
+
+    return result